@@ -0,0 +1,200 @@
+'''
+Created on 17.10.2026
+
+Read-through cache of the game and player rows of the Battleship database.
+
+The rows of a game and its players are read by almost every request and
+change rarely. :py:class:`RowCache` keeps the latest reads in memory, the
+least recently used first out, and for at most ``ttl`` seconds. The write
+methods of :py:class:`battleship.database.Connection` invalidate the rows
+they change, and the TTL bounds how long a change made by another process
+can go unnoticed.
+
+Programmable Web Project course work by:
+
+@author: arttu
+@author: niko
+@author: timo
+'''
+
+from collections import OrderedDict
+import threading
+import time
+
+from battleship import metrics
+
+# Number of rows kept in memory
+DEFAULT_CACHE_SIZE = 1024
+# Seconds a row is served from memory before it is read again
+DEFAULT_CACHE_TTL = 5.0
+# Seconds a game id is known not to exist
+DEFAULT_NEGATIVE_TTL = 2.0
+
+# Returned by RowCache.get when the key is not cached
+MISSING = object()
+
+
+class RowCache(object):
+    '''
+    A bounded LRU cache with a time to live, shared by the connections of
+    the engines using the same database file.
+
+    The keys are tuples (kind, gameid, ...), e.g. ``('player', '1', '0')``.
+    The kind labels the hits and misses counted in
+    :py:data:`battleship.metrics.CACHE_LOOKUPS`. All the keys of a game are
+    dropped together with :py:meth:`invalidate_game`.
+
+    The cache also remembers the ids of games which do not exist, for a
+    shorter time, so requests for deleted games are answered without
+    reading the database. Invalidating a game forgets that it is missing.
+
+    A value read from the database is only stored if no invalidation
+    happened since the read started: see :py:attr:`generation`. A value can
+    also be stored with the version of its game, read before the value. A
+    lookup asking for another version misses, so a value older than the
+    version sent in an ETag is never served, even if the game was changed
+    by another process or the invalidation has not run yet.
+
+    :param int size: Maximum number of cached rows, and of missing games.
+    :param float ttl: Seconds a row stays valid.
+    :param float negative_ttl: Seconds a game stays known to be missing.
+    '''
+    def __init__(self, size=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL,
+                 negative_ttl=DEFAULT_NEGATIVE_TTL):
+        super(RowCache, self).__init__()
+        self.size = size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        # key -> (expiry time, value, version of the game)
+        self._entries = OrderedDict()
+        # gameid -> keys of the game
+        self._games = {}
+        # gameid -> expiry time, for the games which do not exist
+        self._missing = OrderedDict()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(kind, gameid, *ids):
+        '''
+        Builds a cache key. The ids are compared as strings, because the
+        resources pass the ids of the URL as strings.
+        '''
+        return (kind, str(gameid)) + tuple(str(value) for value in ids)
+
+    def get(self, key, version=None):
+        '''
+        Returns the cached value of a key, or :py:data:`MISSING`.
+
+        :param version: If not None, the value must have been stored with
+            this version of the game, otherwise it is dropped.
+        '''
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] <= now
+                                      or version is not None and entry[2] != version):
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+        metrics.CACHE_LOOKUPS.inc(cache=key[0], result="miss" if entry is None else "hit")
+        return MISSING if entry is None else entry[1]
+
+    def put(self, key, value, generation, version=None):
+        '''
+        Stores a value read from the database.
+
+        :param generation: The :py:attr:`generation` before the value was
+            read. If anything has been invalidated since, the value may be
+            stale and it is not stored.
+        :param version: The version of the game read before the value, or
+            None if it is not known.
+        '''
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value, version)
+            self._entries.move_to_end(key)
+            self._games.setdefault(key[1], set()).add(key)
+            while len(self._entries) > self.size:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        # Called with self._lock held
+        del self._entries[key]
+        keys = self._games.get(key[1])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._games[key[1]]
+
+    def is_missing(self, gameid):
+        '''
+        Returns ``True`` if the game is known not to exist.
+        '''
+        now = time.monotonic()
+        gameid = str(gameid)
+        with self._lock:
+            expiry = self._missing.get(gameid)
+            if expiry is not None and expiry <= now:
+                del self._missing[gameid]
+                expiry = None
+        metrics.CACHE_LOOKUPS.inc(cache="missing-game", result="miss" if expiry is None else "hit")
+        return expiry is not None
+
+    def put_missing(self, gameid, generation):
+        '''
+        Remembers that a game was not found in the database.
+
+        :param generation: The :py:attr:`generation` before the game was
+            looked up, like in :py:meth:`put`.
+        '''
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._set_missing(str(gameid))
+
+    def _set_missing(self, gameid):
+        # Called with self._lock held
+        self._missing[gameid] = time.monotonic() + self.negative_ttl
+        self._missing.move_to_end(gameid)
+        while len(self._missing) > self.size:
+            self._missing.popitem(last=False)
+
+    def invalidate_game(self, gameid, deleted=False):
+        '''
+        Drops the game and all the players of a game, and forgets that the
+        game is missing.
+
+        :param bool deleted: If ``True`` the game has been deleted, and it is
+            remembered as missing instead.
+        '''
+        gameid = str(gameid)
+        with self._lock:
+            self.generation += 1
+            for key in self._games.pop(gameid, ()):
+                del self._entries[key]
+            if deleted:
+                self._set_missing(gameid)
+            else:
+                self._missing.pop(gameid, None)
+
+    def clear(self):
+        '''
+        Drops all the cached rows.
+        '''
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._games.clear()
+            self._missing.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
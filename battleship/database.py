@@ -17,17 +17,138 @@ Based on course exercises code by:
 @author: mika oja
 '''
 
+from collections import namedtuple
 from datetime import datetime
+import logging
 import os
+import queue
+import random
 import re
 import sqlite3
 import time
+import weakref
+
+from battleship import cache
+from battleship import events
 
 
 # Default paths for .db and .sql files to create and populate the database.
 DEFAULT_DB_PATH = 'db/battleship.db'
 DEFAULT_SCHEMA = "db/battleship_schema_dump.sql"
 DEFAULT_DATA_DUMP = "db/battleship_data_dump.sql"
+DEFAULT_MIGRATIONS = "db/migrations"
+
+# Migration scripts are named <version>_<description>.sql
+MIGRATION_FILE = re.compile(r'^(\d+)_\w+\.sql$')
+
+# Number of idle connections kept open by the connection pool of an Engine.
+DEFAULT_POOL_SIZE = 5
+
+# Rows fetched at a time by the iterating queries
+DEFAULT_BATCH_SIZE = 256
+
+# Slow statements are logged here, see SlowQueryLog
+SLOW_QUERY_LOGGER = logging.getLogger('battleship.database.slow')
+
+# PRAGMAs applied once to every new connection. Order matters: the journal
+# mode is switched before the other settings are applied.
+DEFAULT_PRAGMAS = (
+    ('foreign_keys', 'ON'),
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    # Negative values are in KiB, so this is an 8 MiB page cache.
+    ('cache_size', -8000),
+    ('mmap_size', 64 * 1024 * 1024),
+    ('temp_store', 'MEMORY'),
+)
+
+# Statuses of the outcome of Connection.fire_shot
+SHOT_ACCEPTED = 'accepted'
+SHOT_NOT_YOUR_TURN = 'not-your-turn'
+SHOT_GAME_ENDED = 'game-ended'
+SHOT_FAILED = 'failed'
+
+# Results of an accepted shot
+RESULT_MISS = 'miss'
+RESULT_HIT = 'hit'
+RESULT_SUNK = 'sunk'
+
+# Outcome of Connection.fire_shot. turn_number is the turn where the shot was
+# recorded, or the current turn if the shot was not accepted. result is one
+# of the RESULT_* values and hits lists the ships hit by the shot. game_over
+# is True if the shot ended the game, and winner is the id of the last
+# player afloat.
+ShotOutcome = namedtuple('ShotOutcome',
+                         ['status', 'turn_number', 'result', 'hits', 'game_over', 'winner'])
+
+# All the live engines. Used to coordinate engines sharing the same file,
+# e.g. to close pooled connections before the file is removed.
+_ENGINES = weakref.WeakSet()
+
+
+def _engines_for(db_path):
+    '''
+    Returns the live engines which use the database file in db_path.
+    '''
+    path = os.path.abspath(db_path)
+    return [engine for engine in list(_ENGINES)
+            if os.path.abspath(engine.db_path) == path]
+
+
+def ship_cells(ship):
+    '''
+    Returns the (x, y) cells covered by a ship, i.e. the rectangle between
+    its stern and bow.
+
+    :param dict ship: Dictionary with the keys stern_x, stern_y, bow_x and bow_y.
+    :return: A list of (x, y) tuples.
+    '''
+    min_x, max_x = sorted((int(ship['stern_x']), int(ship['bow_x'])))
+    min_y, max_y = sorted((int(ship['stern_y']), int(ship['bow_y'])))
+    return [(x, y) for x in range(min_x, max_x + 1)
+                   for y in range(min_y, max_y + 1)]
+
+
+def next_turn(latest_turn_number, players_who_have_shot, players_in_game, playerid):
+    '''
+    Returns the turn where a player can fire next.
+
+    A player can fire once per turn. When every player of the game has fired
+    in the latest turn, the next turn begins.
+
+    :param int latest_turn_number: The latest turn, None if no turns have
+        been played.
+    :param players_who_have_shot: Ids of the players who have fired in the
+        latest turn.
+    :param players_in_game: Ids of the players of the game.
+    :param int playerid: The id of the player who wants to fire.
+    :return: The turn number, or None if the player has to wait for the
+        other players to fire.
+    '''
+    if latest_turn_number is None:
+        # No shots have been fired yet in this game.
+        return 0
+    players_who_have_shot = set(players_who_have_shot)
+    if playerid not in players_who_have_shot:
+        # This player has not fired this turn.
+        return latest_turn_number
+    if players_who_have_shot >= set(players_in_game):
+        # All players have fired this turn.
+        return latest_turn_number + 1
+    # This player has fired but someone else has not.
+    return None
+
+
+def _file_identity(db_path):
+    '''
+    Returns a tuple identifying the database file on the disk, or None if
+    the file does not exist.
+    '''
+    try:
+        stat = os.stat(db_path)
+    except OSError:
+        return None
+    return (stat.st_dev, stat.st_ino)
 
 
 class Engine(object):
@@ -44,11 +165,39 @@ class Engine(object):
     >>> engine = Engine()
     >>> con = engine.connect()
 
+    Long-lived connections can be borrowed from the connection pool of the
+    engine with :py:meth:`acquire` and given back with :py:meth:`release`.
+
     :param db_path: The path of the database file (always with respect to the
         calling script. If not specified, the Engine will use the file located
         at *db/battleship.db*
+    :param int pool_size: Maximum number of idle connections kept in the
+        connection pool.
+    :param float slow_query_threshold: If given, the statements taking
+        longer than this many seconds are logged with their query plan
+        (see :py:class:`SlowQueryLog`). Off by default.
+    :param float slow_query_sample_rate: Fraction of the slow statements
+        which are logged.
+    :param int row_cache_size: Maximum number of game and player rows kept
+        in the row cache (see :py:class:`battleship.cache.RowCache`). 0 turns
+        the cache off.
+    :param float row_cache_ttl: Seconds a cached row is served before it is
+        read again. Bounds how long the changes made by other processes can
+        go unnoticed.
+
+    The connections of an engine share a :py:class:`events.GameNotifier`,
+    which receives an event after every commited write to a game (see
+    :py:attr:`notifier`).
+
+    The remaining keyword arguments override the PRAGMAs applied to every
+    new connection (see :py:data:`DEFAULT_PRAGMAS`), e.g.
+    ``Engine(synchronous='FULL', mmap_size=0)``. A value of ``None`` leaves
+    the sqlite default in place.
     '''
-    def __init__(self, db_path=None):
+    def __init__(self, db_path=None, pool_size=DEFAULT_POOL_SIZE,
+                 slow_query_threshold=None, slow_query_sample_rate=1.0,
+                 row_cache_size=cache.DEFAULT_CACHE_SIZE, row_cache_ttl=cache.DEFAULT_CACHE_TTL,
+                 **pragmas):
             '''
             '''
 
@@ -57,23 +206,81 @@ class Engine(object):
                 self.db_path = db_path
             else:
                 self.db_path = DEFAULT_DB_PATH
-
-    def connect(self):
+            defaults = dict(DEFAULT_PRAGMAS)
+            unknown = set(pragmas) - set(defaults)
+            if unknown:
+                raise TypeError("Unknown PRAGMAs: %s" % ", ".join(sorted(unknown)))
+            defaults.update(pragmas)
+            self.pragmas = [(name, defaults[name]) for name, _ in DEFAULT_PRAGMAS]
+            self.pool = ConnectionPool(self, pool_size)
+            self.notifier = events.GameNotifier()
+            self.slow_log = None
+            if slow_query_threshold is not None:
+                self.slow_log = SlowQueryLog(slow_query_threshold, slow_query_sample_rate)
+            self.row_cache = None
+            if row_cache_size > 0:
+                # Engines of the same file share the cache, so the writes
+                # of one invalidate the rows read by the others
+                shared = [engine.row_cache for engine in _engines_for(self.db_path)
+                          if engine.row_cache is not None]
+                self.row_cache = shared[0] if shared else cache.RowCache(row_cache_size, row_cache_ttl)
+            _ENGINES.add(self)
+
+    def connect(self, check_same_thread=True):
         '''
         Creates a connection to the database.
 
+        :param bool check_same_thread: If ``False`` the connection can be
+            utilized from other threads than the one which created it.
+        :return: A Connection instance
+        :rtype: Connection
+        '''
+        return Connection(self.db_path, check_same_thread=check_same_thread,
+                          pragmas=self.pragmas, notifier=self.notifier,
+                          slow_log=self.slow_log, row_cache=self.row_cache)
+
+    def acquire(self):
+        '''
+        Borrows a connection from the connection pool. The connection
+        **MUST** be given back with :py:meth:`release` instead of closing it.
+
         :return: A Connection instance
         :rtype: Connection
         '''
-        return Connection(self.db_path)
+        return self.pool.acquire()
+
+    def release(self, connection):
+        '''
+        Gives a connection back to the connection pool, commiting all changes.
+
+        :param Connection connection: Connection returned by :py:meth:`acquire`.
+        '''
+        self.pool.release(connection)
+
+    def clear_cache(self):
+        '''
+        Empties the row caches of all the engines using the same file.
+        Called when the file is modified without a :py:class:`Connection`.
+        '''
+        for engine in _engines_for(self.db_path):
+            if engine.row_cache is not None:
+                engine.row_cache.clear()
 
     def remove_database(self):
         '''
-        Removes the database file from the filesystem.
+        Removes the database file from the filesystem. The pooled connections
+        of all the engines using the same file are closed first.
         '''
+        for engine in _engines_for(self.db_path):
+            engine.pool.dispose()
+        self.clear_cache()
         if os.path.exists(self.db_path):
             # THIS REMOVES THE DATABASE STRUCTURE
             os.remove(self.db_path)
+        # Write-ahead log files must not outlive the database file
+        for suffix in ('-wal', '-shm'):
+            if os.path.exists(self.db_path + suffix):
+                os.remove(self.db_path + suffix)
 
     def clear(self):
         '''
@@ -93,16 +300,21 @@ class Engine(object):
             cur.execute("DELETE FROM ship")
             cur.execute("DELETE FROM turn")
             cur.execute("DELETE FROM shot")
+            cur.execute("DELETE FROM ship_cell")
             # NOTE do we need to delete player, ship, turn and shot,
             # since they have ON DELETE CASCADE?
+        self.clear_cache()
 
     # METHODS TO CREATE AND POPULATE A DATABASE USING DIFFERENT SCRIPTS
-    def create_tables(self, schema=None):
+    def create_tables(self, schema=None, migrations=None):
         '''
-        Create programmatically the tables from a schema file.
+        Create programmatically the tables from a schema file and bring
+        them up to date with :py:meth:`migrate`.
 
         :param schema: path to the .sql schema file. If this parmeter is
             None, then *db/battleship_schema_dump.sql* is utilized.
+        :param migrations: path to the migrations folder. If this parameter
+            is None, then *db/migrations* is utilized.
         '''
         con = sqlite3.connect(self.db_path)
         if schema is None:
@@ -114,6 +326,61 @@ class Engine(object):
                 cur.executescript(sql)
         finally:
             con.close()
+        self.migrate(migrations)
+
+    def get_schema_version(self):
+        '''
+        Returns the schema version of the database, stored in
+        ``PRAGMA user_version``. The base schema is version 0.
+        '''
+        con = sqlite3.connect(self.db_path)
+        try:
+            return con.execute('PRAGMA user_version').fetchone()[0]
+        finally:
+            con.close()
+
+    def migrate(self, migrations=None):
+        '''
+        Applies the numbered migration scripts which are newer than the
+        schema version of the database, in order. Each script runs in its own
+        transaction together with the update of ``PRAGMA user_version``, so
+        a failing script leaves the database at the previous version.
+
+        :param migrations: path to the migrations folder. If this parameter
+            is None, then *db/migrations* is utilized.
+        :return: The schema version after the migrations.
+        :raises sqlite3.Error: if a migration script fails.
+        '''
+        if migrations is None:
+            migrations = DEFAULT_MIGRATIONS
+        scripts = []
+        for filename in os.listdir(migrations):
+            match = MIGRATION_FILE.match(filename)
+            if match:
+                scripts.append((int(match.group(1)), filename))
+        scripts.sort()
+
+        con = sqlite3.connect(self.db_path)
+        try:
+            version = con.execute('PRAGMA user_version').fetchone()[0]
+            for number, filename in scripts:
+                if number <= version:
+                    continue
+                with open(os.path.join(migrations, filename), encoding="utf-8") as f:
+                    sql = f.read()
+                try:
+                    con.executescript('BEGIN;\n%s\nPRAGMA user_version = %d;\nCOMMIT;'
+                                      % (sql, number))
+                except sqlite3.Error as excp:
+                    print("Error in migration %s: %s" % (filename, excp.args[0]))
+                    if con.in_transaction:
+                        con.rollback()
+                    raise excp
+                version = number
+        finally:
+            con.close()
+            self.clear_cache()
+        return version
 
     def populate_tables(self, dump=None):
         '''
@@ -134,6 +401,281 @@ class Engine(object):
             sql = f.read()
             cur = con.cursor()
             cur.executescript(sql)
+        self.clear_cache()
+
+
+class ConnectionPool(object):
+    '''
+    A bounded pool of reusable connections to the database of an Engine.
+
+    Idle connections are kept open between requests and handed out again by
+    :py:meth:`acquire`. A borrowed connection is utilized by one thread at a
+    time, but it can be borrowed later by another thread. At most *size* idle
+    connections are kept, extra connections are closed when released.
+
+    On checkout the connection is health checked, and its state is reset by
+    rolling back any transaction left open. Connections which fail the check,
+    or whose database file has been removed or replaced, are discarded and
+    a new connection is opened instead.
+
+    An instance of this class should not be instantiated directly. Instead
+    use :py:meth:`Engine.acquire` and :py:meth:`Engine.release`.
+
+    :param Engine engine: The engine which opens the connections.
+    :param int size: Maximum number of idle connections.
+    '''
+    def __init__(self, engine, size=DEFAULT_POOL_SIZE):
+        super(ConnectionPool, self).__init__()
+        self.engine = engine
+        self.size = size
+        # LIFO keeps the most recently utilized connections in use.
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def acquire(self):
+        '''
+        Returns a healthy connection, reusing an idle one if possible.
+
+        :return: A Connection instance
+        :rtype: Connection
+        '''
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if self._checkout(connection):
+                return connection
+            self._discard(connection)
+        return self.engine.connect(check_same_thread=False)
+
+    def release(self, connection):
+        '''
+        Commits the changes of a connection and returns it to the pool.
+        The connection is closed instead if the pool is full.
+
+        :param Connection connection: Connection returned by :py:meth:`acquire`.
+        '''
+        try:
+            connection.con.commit()
+        except sqlite3.Error as e:
+            print("Error %s:" % (e.args[0]))
+            self._discard(connection)
+            return
+        #The versions read by a request are not valid for the next one
+        connection.versions.clear()
+        try:
+            self._idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def dispose(self):
+        '''
+        Closes all the idle connections of the pool.
+        '''
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(connection)
+
+    def _checkout(self, connection):
+        '''
+        Health checks a connection and resets its state.
+
+        :return: ``True`` if the connection can be utilized, ``False`` otherwise.
+        '''
+        if connection.file_identity != _file_identity(self.engine.db_path):
+            return False
+        try:
+            if connection.con.in_transaction:
+                connection.con.rollback()
+            connection.con.execute('SELECT 1').fetchone()
+        except sqlite3.Error:
+            return False
+        return True
+
+    def _discard(self, connection):
+        '''
+        Closes a connection without commiting.
+        '''
+        try:
+            connection.con.close()
+        except sqlite3.Error:
+            pass
+
+
+class QueryStats(object):
+    '''
+    Counts the SQL statements executed on a connection and the time spent
+    in them. The statements are counted by the sqlite3 trace callback, so
+    the implicit BEGIN and COMMIT statements are counted as well. The time
+    covers executing and fetching through the cursors and commiting.
+
+    The counters grow until :py:meth:`reset` is called, e.g. at the start
+    of every request.
+    '''
+    def __init__(self):
+        super(QueryStats, self).__init__()
+        self.reset()
+
+    def reset(self):
+        '''
+        Sets all the counters to zero.
+        '''
+        self.statements = 0
+        self.commits = 0
+        self.seconds = 0.0
+
+    def trace(self, statement):
+        '''
+        The trace callback of the connection, called before each statement.
+        The plans explained by the slow-query log are not counted.
+        '''
+        if statement.startswith('EXPLAIN QUERY PLAN'):
+            return
+        self.statements += 1
+        if statement.startswith('COMMIT'):
+            self.commits += 1
+
+
+class SlowQueryLog(object):
+    '''
+    Logs the statements which take longer than *threshold* seconds, with
+    their parameters, their duration and the output of EXPLAIN QUERY PLAN,
+    to the ``battleship.database.slow`` logger. The time of a statement
+    includes fetching its rows.
+
+    Only a *sample_rate* fraction of the slow statements are explained and
+    logged, so a burst of slow statements does not add a plan query to each
+    of them.
+
+    :param float threshold: Duration in seconds from which a statement is slow.
+    :param float sample_rate: Fraction of the slow statements logged, from 0 to 1.
+    '''
+    def __init__(self, threshold, sample_rate=1.0):
+        super(SlowQueryLog, self).__init__()
+        if not 0 <= sample_rate <= 1:
+            raise ValueError("sample_rate must be between 0 and 1")
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+
+    def record(self, con, statement, parameters, seconds):
+        '''
+        Logs a slow statement, if it is sampled.
+
+        :param con: The sqlite3 connection which executed the statement.
+        :param str statement: The SQL statement.
+        :param parameters: The parameters of the statement, or None.
+        :param float seconds: The duration of the statement.
+        '''
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+        plan = self.explain(con, statement, parameters)
+        SLOW_QUERY_LOGGER.warning("Slow query (%.1f ms): %s; parameters: %r; plan: %s",
+                                  seconds * 1000, statement, parameters, plan)
+
+    @staticmethod
+    def explain(con, statement, parameters):
+        '''
+        Returns the query plan of a statement as one line, e.g.
+        ``SEARCH shot USING COVERING INDEX shot_game_turn (game=? AND turn>?)``.
+        '''
+        if parameters is None:
+            return 'unavailable'
+        try:
+            cur = sqlite3.Cursor(con)
+            rows = cur.execute('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+        except sqlite3.Error as excp:
+            return 'unavailable (%s)' % excp.args[0]
+        return ' | '.join(row[3] for row in rows) or 'none'
+
+
+class _TimedCursor(sqlite3.Cursor):
+    '''
+    A cursor which adds the time spent in sqlite to the
+    :py:class:`QueryStats` of its connection, and reports slow statements
+    to the :py:class:`SlowQueryLog` of the connection, if it has one.
+    '''
+    _statement = None
+    _parameters = None
+    _elapsed = 0.0
+    _logged = False
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            connection = self.connection
+            connection.stats.seconds += elapsed
+            slow_log = connection.slow_log
+            if slow_log is not None and not self._logged:
+                self._elapsed += elapsed
+                if self._elapsed >= slow_log.threshold:
+                    # A statement is logged once, however many fetches it takes
+                    self._logged = True
+                    slow_log.record(connection, self._statement, self._parameters, self._elapsed)
+
+    def _begin(self, statement, parameters):
+        self._statement = statement
+        self._parameters = parameters
+        self._elapsed = 0.0
+        self._logged = False
+
+    def execute(self, statement, parameters=()):
+        self._begin(statement, parameters)
+        return self._timed(super(_TimedCursor, self).execute, statement, parameters)
+
+    def executemany(self, statement, seq_of_parameters):
+        # The plan is the same for all the parameters
+        self._begin(statement, None)
+        return self._timed(super(_TimedCursor, self).executemany, statement, seq_of_parameters)
+
+    def executescript(self, script):
+        self._begin(script, None)
+        return self._timed(super(_TimedCursor, self).executescript, script)
+
+    def fetchone(self):
+        return self._timed(super(_TimedCursor, self).fetchone)
+
+    def fetchmany(self, *args):
+        return self._timed(super(_TimedCursor, self).fetchmany, *args)
+
+    def fetchall(self):
+        return self._timed(super(_TimedCursor, self).fetchall)
+
+
+class _InstrumentedConnection(sqlite3.Connection):
+    '''
+    A sqlite3 connection which keeps :py:class:`QueryStats`. Its cursors,
+    including the ones created by the execute shortcuts, are timed.
+    '''
+    def __init__(self, *args, **kwargs):
+        super(_InstrumentedConnection, self).__init__(*args, **kwargs)
+        self.stats = QueryStats()
+        self.slow_log = None
+        self.set_trace_callback(self.stats.trace)
+
+    def cursor(self, factory=_TimedCursor):
+        return super(_InstrumentedConnection, self).cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    def executescript(self, *args):
+        return self.cursor().executescript(*args)
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            return super(_InstrumentedConnection, self).commit()
+        finally:
+            self.stats.seconds += time.perf_counter() - start
 
 
 class Connection(object):
@@ -146,16 +688,116 @@ class Connection(object):
     An instance of this class should not be instantiated directly using the
     constructor. Instead use the :py:meth:`Engine.connect`.
 
+    The connection is configured once when it is opened: rows are returned
+    as :py:class:`sqlite3.Row` and the *pragmas* given by the Engine are
+    applied, so the API methods do not need to set them again.
+
+    The statements executed on the connection are counted in
+    :py:attr:`stats`, a :py:class:`QueryStats` instance.
+
     Use the method :py:meth:`close` in order to close a connection.
     A :py:class:`Connection` **MUST** always be closed once when it is not going to be
     utilized anymore in order to release internal locks.
 
     :param db_path: Location of the database file.
     :type dbpath: str
+    :param bool check_same_thread: If ``False`` the connection can be
+        utilized from other threads than the one which created it.
+    :param pragmas: List of (name, value) PRAGMAs applied to the connection.
+        If None, :py:data:`DEFAULT_PRAGMAS` is utilized.
+    :param notifier: :py:class:`events.GameNotifier` which receives an event
+        after the writes to a game have been commited. If None, no events
+        are published.
+    :param slow_log: :py:class:`SlowQueryLog` which receives the slow
+        statements. If None, slow statements are not logged.
+    :param row_cache: :py:class:`battleship.cache.RowCache` in front of
+        :py:meth:`get_game`, :py:meth:`get_player` and :py:meth:`get_players`.
+        If None, the rows are always read from the database.
+
+    :py:attr:`versions` holds the version of every game read with
+    :py:meth:`get_game_version` on the connection. The cached rows of such a
+    game are only served if they were read at the same version, so a body
+    is never older than the ETag built from the version. The pool empties
+    it when the connection is released.
     '''
-    def __init__(self, db_path):
+    def __init__(self, db_path, check_same_thread=True, pragmas=None, notifier=None,
+                 slow_log=None, row_cache=None):
         super(Connection, self).__init__()
-        self.con = sqlite3.connect(db_path)
+        self.con = sqlite3.connect(db_path, check_same_thread=check_same_thread,
+                                   factory=_InstrumentedConnection)
+        self.stats = self.con.stats
+        self.con.slow_log = slow_log
+        self.file_identity = _file_identity(db_path)
+        self.notifier = notifier
+        self.row_cache = row_cache
+        self.versions = {}
+        self.configure(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+
+    def configure(self, pragmas):
+        '''
+        Initialises the connection: sets the row factory and applies the
+        PRAGMAs. Called once when the connection is opened.
+
+        :param pragmas: List of (name, value) tuples. Values that are None
+            are skipped.
+        :return: ``True`` if all PRAGMAs were applied and ``False`` otherwise.
+        '''
+        self.con.row_factory = sqlite3.Row
+        success = True
+        cur = self.con.cursor()
+        for name, value in pragmas:
+            if value is None:
+                continue
+            try:
+                cur.execute('PRAGMA %s = %s' % (name, value))
+            except sqlite3.Error as excp:
+                print("Error %s:" % excp.args[0])
+                success = False
+        return success
+
+    def _publish(self, gameid, event_type, **data):
+        '''
+        Publishes an event of a game to the notifier. Called after commiting.
+        '''
+        if self.notifier is not None:
+            self.notifier.publish(gameid, event_type, data)
+
+    def _cached(self, key, read):
+        '''
+        Returns a copy of the cached value of *key*, or reads it with *read*
+        and caches it. A missing row is not cached, but a missing game is
+        remembered for a short time, and nothing of it is read meanwhile.
+        If the version of the game has been read, only a value read at that
+        version is served, and a value read now is stored with it.
+        '''
+        if self.row_cache is None:
+            return read()
+        version = self.versions.get(key[1])
+        value = self.row_cache.get(key, version)
+        if value is cache.MISSING:
+            gameid = key[1]
+            if self.row_cache.is_missing(gameid):
+                return None
+            generation = self.row_cache.generation
+            value = read()
+            if value is None:
+                if key[0] == 'game':
+                    self.row_cache.put_missing(gameid, generation)
+                return None
+            #The version was read before the value, the value is at least as new
+            self.row_cache.put(key, value, generation, version)
+        #Callers may modify what they get
+        if isinstance(value, list):
+            return [dict(row) for row in value]
+        return dict(value)
+
+    def _invalidate(self, gameid, deleted=False):
+        '''
+        Drops the cached rows of a game and its players. Called after
+        commiting a change to them. A deleted game is remembered as missing.
+        '''
+        if self.row_cache is not None:
+            self.row_cache.invalidate_game(gameid, deleted=deleted)
 
     def close(self):
         '''
@@ -235,12 +877,12 @@ class Connection(object):
         :return: A dictionary with the game data
             or None if game with the id does not exist.
         '''
-        #Activate foreign key support
-        self.set_foreign_keys_support()
+        return self._cached(cache.RowCache.key('game', gameid), lambda: self._read_game(gameid))
+
+    def _read_game(self, gameid):
         #Create the SQL Query
         query = 'SELECT * FROM game WHERE id = ?'
-        #Cursor and row initialization
-        self.con.row_factory = sqlite3.Row
+        #Cursor initialization
         cur = self.con.cursor()
         #Execute main SQL Statement
         pvalue = (gameid,)
@@ -256,19 +898,17 @@ class Connection(object):
                 'end_time': row['end_time'],
                 'x_size': row['x_size'],
                 'y_size': row['y_size'],
-                'turn_length': row['turn_length']}
+                'turn_length': row['turn_length'],
+                'winner': row['winner']}
 
     def get_games(self):
         '''
         Get all games from database.
         :return: A list with the games, or None if games doesn't exist.
         '''
-        #Activate foreign key support
-        self.set_foreign_keys_support()
         #Create the SQL Query
         query = 'SELECT * FROM game'
-        #Cursor and row initialization
-        self.con.row_factory = sqlite3.Row
+        #Cursor initialization
         cur = self.con.cursor()
         #Execute main SQL Query
         cur.execute(query)
@@ -277,9 +917,145 @@ class Connection(object):
         if rows == []:
             return None
         #Build the return object
-        games = [dict(row) for row in rows]
+        games = [{'id': row['id'],
+                  'start_time': row['start_time'],
+                  'end_time': row['end_time'],
+                  'x_size': row['x_size'],
+                  'y_size': row['y_size'],
+                  'turn_length': row['turn_length'],
+                  'winner': row['winner']} for row in rows]
         return games
 
+    def get_active_games(self, limit=None, after_id=None):
+        '''
+        Get the games which have not ended, ordered by id.
+
+        :param int limit: Maximum number of games returned. Defaults to None,
+            which returns all the games.
+        :param int after_id: Only the games with a greater id are returned.
+            Pass the id of the last game of the previous page to get the next
+            page.
+        :return: A list with the games, empty if there are no games.
+        '''
+        return self._get_games_page('end_time IS NULL', limit, after_id)
+
+    def get_ended_games(self, limit=None, after_id=None):
+        '''
+        Get the games which have ended, ordered by id.
+
+        :param int limit: Maximum number of games returned. Defaults to None,
+            which returns all the games.
+        :param int after_id: Only the games with a greater id are returned.
+            Pass the id of the last game of the previous page to get the next
+            page.
+        :return: A list with the games, empty if there are no games.
+        '''
+        return self._get_games_page('end_time IS NOT NULL', limit, after_id)
+
+    def iter_ended_games(self, after_id=None, batch_size=DEFAULT_BATCH_SIZE):
+        '''
+        Iterates the games which have ended, ordered by id, reading them from
+        the database *batch_size* rows at a time. The connection must not be
+        utilized for anything else until the iteration is over.
+
+        :param int after_id: Only the games with a greater id are returned.
+        :param int batch_size: Number of rows fetched at a time.
+        :return: A generator of dictionaries with the game data.
+        '''
+        return self._iter_games('end_time IS NOT NULL', None, after_id, batch_size)
+
+    def _get_games_page(self, condition, limit, after_id):
+        '''
+        Runs a keyset paginated query of the games matching *condition*.
+        The game_end_time and game_ended indexes answer the queries in id
+        order, so a page costs the same however many games there are.
+        '''
+        return list(self._iter_games(condition, limit, after_id, DEFAULT_BATCH_SIZE))
+
+    def _iter_games(self, condition, limit, after_id, batch_size):
+        '''
+        Generator behind :py:meth:`_get_games_page` and :py:meth:`iter_ended_games`.
+        '''
+        #Create the SQL Query
+        query = 'SELECT * FROM game WHERE ' + condition
+        pvalue = []
+        if after_id is not None:
+            query += ' AND id > ?'
+            pvalue.append(after_id)
+        query += ' ORDER BY id'
+        if limit is not None:
+            query += ' LIMIT ?'
+            pvalue.append(limit)
+        #Cursor initialization
+        cur = self.con.cursor()
+        #Execute main SQL Query
+        cur.execute(query, pvalue)
+        #Build the return objects one batch at a time
+        try:
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    return
+                for row in rows:
+                    yield {'id': row['id'],
+                           'start_time': row['start_time'],
+                           'end_time': row['end_time'],
+                           'x_size': row['x_size'],
+                           'y_size': row['y_size'],
+                           'turn_length': row['turn_length'],
+                           'winner': row['winner']}
+        finally:
+            cur.close()
+
+    def exists_game(self, gameid):
+        '''
+        Checks if a game exists, reading only the primary key. A game which
+        does not exist is remembered for a short time in the row cache.
+
+        :param int gameid: The id of the game.
+        :return: ``True`` if the game exists, ``False`` otherwise.
+        '''
+        if self.row_cache is not None:
+            if self.row_cache.is_missing(gameid):
+                return False
+            generation = self.row_cache.generation
+        #Create the SQL Query
+        query = 'SELECT 1 FROM game WHERE id = ?'
+        #Cursor initialization
+        cur = self.con.cursor()
+        #Execute main SQL Statement
+        cur.execute(query, (gameid,))
+        exists = cur.fetchone() is not None
+        if not exists and self.row_cache is not None:
+            self.row_cache.put_missing(gameid, generation)
+        return exists
+
+    def get_game_version(self, gameid):
+        '''
+        Extracts the version of a game. The version is bumped whenever the
+        game, or a player, ship or shot of the game changes. The version is
+        remembered in :py:attr:`versions`.
+
+        :param int gameid: The id of the game.
+        :return: The version as an integer,
+            or None if game with the id does not exist.
+        '''
+        if self.row_cache is not None and self.row_cache.is_missing(gameid):
+            return None
+        #Create the SQL Query
+        query = 'SELECT version FROM game WHERE id = ?'
+        #Cursor initialization
+        cur = self.con.cursor()
+        #Execute main SQL Statement
+        pvalue = (gameid,)
+        cur.execute(query, pvalue)
+        #Process the response.
+        row = cur.fetchone()
+        if row is None:
+            return None
+        self.versions[str(gameid)] = row['version']
+        return row['version']
+
     def delete_game(self, gameid):
         '''
         Deletes a game with given id from the database.
@@ -289,10 +1065,7 @@ class Connection(object):
         '''
         #Create the SQL Statement
         stmnt = 'DELETE FROM game WHERE id = ?'
-        #Activate foreign key support
-        self.set_foreign_keys_support()
-        #Cursor and row initialization
-        self.con.row_factory = sqlite3.Row
+        #Cursor initialization
         cur = self.con.cursor()
         pvalue = (gameid,)
         try:
@@ -301,6 +1074,9 @@ class Connection(object):
             self.con.commit()
         except sqlite3.Error as e:
             print("Error %s:" % (e.args[0]))
+        if cur.rowcount > 0:
+            self._invalidate(gameid, deleted=True)
+            self._publish(gameid, events.GAME_DELETED)
         return bool(cur.rowcount)
 
     def create_game(self, x_size, y_size, turn_length):
@@ -314,10 +1090,7 @@ class Connection(object):
         #Create the SQL Statement
         stmnt = 'INSERT INTO game (id, start_time, end_time, x_size, y_size, turn_length) \
                  VALUES (?, ?, ?, ?, ?, ?)'
-        #Activate foreign key support
-        self.set_foreign_keys_support()
-        #Cursor and row initialization
-        self.con.row_factory = sqlite3.Row
+        #Cursor initialization
         cur = self.con.cursor()
         #Generate the values for SQL statement
         start_time = str(datetime.today())
@@ -327,38 +1100,50 @@ class Connection(object):
         self.con.commit()
         #Extract the game id
         id = cur.lastrowid
+        #The id may have been remembered as missing
+        self._invalidate(id)
         #Return the game id
         return id if id is not None else None
 
-    def insert_game_end_time(self, gameid):
+    def insert_game_end_time(self, gameid, winner=None):
         '''
         Insert end time for a game. Time cannot be set, if game has already ended.
 
         :param int gameid: The id of the game which ended.
+        :param int winner: The id of the player who won the game, if any.
         :return: End time if success, False if time could not be added.
         '''
-        #Create the SQL Query
-        stmnt = 'UPDATE game SET end_time = ? WHERE id = ? AND end_time is null'
-        #Activate foreign key support
-        self.set_foreign_keys_support()
-        #Cursor and row initialization
-        self.con.row_factory = sqlite3.Row
+        #Cursor initialization
         cur = self.con.cursor()
-        #Generate the values for SQL statement
-        end_time = str(datetime.today())
-        #Execute main SQL Statement
-        pvalue = (end_time, gameid)
         #Execute the statement
         try:
-            cur.execute(stmnt, pvalue)
+            end_time = self._end_game(cur, gameid, winner)
         except sqlite3.Error as e:
             print("Error %s:" % (e.args[0]))
             return False
         self.con.commit()
+        if end_time:
+            self._invalidate(gameid)
+            self._publish(gameid, events.GAME_ENDED, winner=winner)
+        return end_time
+
+    def _end_game(self, cur, gameid, winner):
+        '''
+        Sets the end time and the winner of a game which has not ended.
+
+        :param cur: Cursor utilized to run the statement.
+        :return: End time if success, False if the game had already ended.
+        '''
+        #Create the SQL Query
+        stmnt = 'UPDATE game SET end_time = ?, winner = ? WHERE id = ? AND end_time is null'
+        #Generate the values for SQL statement
+        end_time = str(datetime.today())
+        pvalue = (end_time, winner, gameid)
+        cur.execute(stmnt, pvalue)
         # rowcount is 1 if update was successful, 0 if failed
         success = cur.rowcount
         return end_time if success else False
-		
+
     # Player table API
     def get_player(self, playerid, gameid):
         '''
@@ -369,12 +1154,13 @@ class Connection(object):
         :return: A dictionary with the player data
             or None if player with given id does not exist.
         '''
-        #Activate foreign key support
-        self.set_foreign_keys_support()
+        return self._cached(cache.RowCache.key('player', gameid, playerid),
+                            lambda: self._read_player(playerid, gameid))
+
+    def _read_player(self, playerid, gameid):
         #Create the SQL Query
         query = 'SELECT * FROM player WHERE id = ? AND game = ?'
-        #Cursor and row initialization
-        self.con.row_factory = sqlite3.Row
+        #Cursor initialization
         cur = self.con.cursor()
         #Execute main SQL Query
         pvalue = (playerid, gameid)
@@ -399,10 +1185,7 @@ class Connection(object):
         '''
         #Create the SQL Statement
         stmnt = 'DELETE FROM player WHERE id = ? AND game = ?'
-        #Activate foreign key support
-        self.set_foreign_keys_support()
-        #Cursor and row initialization
-        self.con.row_factory = sqlite3.Row
+        #Cursor initialization
         cur = self.con.cursor()
         pvalue = (playerid, gameid)
         try:
@@ -411,53 +1194,50 @@ class Connection(object):
             self.con.commit()
         except sqlite3.Error as e:
             print("Error %s:" % (e.args[0]))
+        if cur.rowcount > 0:
+            self._invalidate(gameid)
+            self._publish(gameid, events.PLAYER_LEFT, player=playerid)
         return bool(cur.rowcount)
 
     def create_player(self, nickname, gameid):
         '''
-        Creates a new player into the database.
+        Creates a new player into the database. The player id is the next
+        free id of the game, allocated by the INSERT statement itself inside
+        an immediate transaction, so players joining at the same time get
+        different ids.
 
         :param string nickname; The nicknameo of the player.
         :param int gameid: The id of the game player is joining.
         :return: player id if player was created, None otherwise.
         '''
-        #Query to get number of players in the game
-        query1 = 'SELECT * from player WHERE game = ?'
-        #Statement to create the player
+        #Statement to create the player with the next free id of the game
         stmnt = 'INSERT INTO player (id, nickname, game) \
-                 VALUES (?, ?, ?)'
+                 SELECT COALESCE(MAX(id) + 1, 0), ?, ? FROM player WHERE game = ?'
+        #Query to read back the allocated id
+        query = 'SELECT id FROM player WHERE rowid = ?'
 
-        #Activate foreign key support
-        self.set_foreign_keys_support()
-        #Cursor and row initialization
-        self.con.row_factory = sqlite3.Row
+        #Cursor initialization
         cur = self.con.cursor()
-
-        #Get current players of this game and define next playerid
-        pvalue = (gameid,)
-        cur.execute(query1, pvalue)
-        rows = cur.fetchall()
-        playerid = None
-        if rows == []:
-            playerid = 0
-        else:
-            playerids = []
-            for row in rows:
-                playerids.append(row['id'])
-            playerid = max(playerids) + 1
-
-        #Generate the values for SQL statement
-        pvalue = (playerid, nickname, gameid)
         #Execute the statement
         try:
-            cur.execute(stmnt, pvalue)
+            #Lock the database for writing before reading the current ids
+            if self.con.in_transaction:
+                self.con.commit()
+            cur.execute('BEGIN IMMEDIATE')
+            cur.execute(stmnt, (nickname, gameid, gameid))
+            cur.execute(query, (cur.lastrowid,))
+            playerid = cur.fetchone()[0]
+            self.con.commit()
         except sqlite3.Error as e:
             print("Error %s:" % (e.args[0]))
-            return False
-        self.con.commit()
-        
+            if self.con.in_transaction:
+                self.con.rollback()
+            return None
+        self._invalidate(gameid)
+        self._publish(gameid, events.PLAYER_JOINED, player=playerid, nickname=nickname)
+
         #Return the player id
-        return playerid if playerid is not None else None
+        return playerid
 
     def get_players(self, gameid):
         '''
@@ -467,12 +1247,12 @@ class Connection(object):
         :return: A list of  dictionaries with the player datas
             or None if game with given id does not exist.
         '''
-        #Activate foreign key support
-        self.set_foreign_keys_support()
+        return self._cached(cache.RowCache.key('players', gameid), lambda: self._read_players(gameid))
+
+    def _read_players(self, gameid):
         #Create the SQL Query
         query = 'SELECT * FROM player WHERE game = ?'
-        #Cursor and row initialization
-        self.con.row_factory = sqlite3.Row
+        #Cursor initialization
         cur = self.con.cursor()
         #Execute main SQL Query
         pvalue = (gameid,)
@@ -504,12 +1284,9 @@ class Connection(object):
         :return: A dictionary with the ship data
             or None if ship with some of the given ids do not exist.
         '''
-        #Activate foreign key support
-        self.set_foreign_keys_support()
         #Create the SQL Query
         query = 'SELECT * FROM ship WHERE id = ? AND player = ? AND game = ?'
-        #Cursor and row initialization
-        self.con.row_factory = sqlite3.Row
+        #Cursor initialization
         cur = self.con.cursor()
         #Execute main SQL Query
         pvalue = (shipid, playerid, gameid)
@@ -537,12 +1314,9 @@ class Connection(object):
         :return: A list of  dictionaries with the ship datas
             or None if game with given id does not exist.
         '''
-        #Activate foreign key support
-        self.set_foreign_keys_support()
         #Create the SQL Query
         query = 'SELECT * FROM ship WHERE game = ?'
-        #Cursor and row initialization
-        self.con.row_factory = sqlite3.Row
+        #Cursor initialization
         cur = self.con.cursor()
         #Execute main SQL Query
         pvalue = (gameid,)
@@ -564,12 +1338,9 @@ class Connection(object):
         :return: A list of  dictionaries with the ship datas
             or None if game with given id does not exist.
         '''
-        #Activate foreign key support
-        self.set_foreign_keys_support()
         #Create the SQL Query
         query = 'SELECT * FROM ship WHERE game = ? AND player = ?'
-        #Cursor and row initialization
-        self.con.row_factory = sqlite3.Row
+        #Cursor initialization
         cur = self.con.cursor()
         #Execute main SQL Query
         pvalue = (gameid, playerid)
@@ -593,10 +1364,7 @@ class Connection(object):
         '''
         #Create the SQL Statement
         stmnt = 'DELETE FROM ship WHERE id = ? AND player = ? AND game = ?'
-        #Activate foreign key support
-        self.set_foreign_keys_support()
-        #Cursor and row initialization
-        self.con.row_factory = sqlite3.Row
+        #Cursor initialization
         cur = self.con.cursor()
         pvalue = (shipid, playerid, gameid)
         try:
@@ -605,6 +1373,8 @@ class Connection(object):
             self.con.commit()
         except sqlite3.Error as e:
             print("Error %s:" % (e.args[0]))
+        if cur.rowcount > 0:
+            self._publish(gameid, events.SHIP_REMOVED, player=playerid, ship=shipid)
         return bool(cur.rowcount)
 
     def create_ship(self, playerid, gameid, stern_x, stern_y, bow_x, bow_y, ship_type):
@@ -621,32 +1391,61 @@ class Connection(object):
 
         :return: True if ship was created, False otherwise.
         '''
-
-        #Get current ships to define the next ship's id
-        ships = self.get_ships_by_player(gameid, playerid)
-        if ships is None:
-            shipid = 0
-        else:
-            shipid = len(ships)
-
+        ship = {'stern_x': stern_x,
+                'stern_y': stern_y,
+                'bow_x': bow_x,
+                'bow_y': bow_y,
+                'ship_type': ship_type}
+        return self.create_ships(playerid, gameid, [ship]) is not None
+
+    def create_ships(self, playerid, gameid, ships):
+        '''
+        Creates several ships of a player into the database. The ship ids
+        are allocated once and all the ships are inserted in a single
+        transaction: either every ship is created or none.
+
+        :param int playerid: The id of the player who owns the ships.
+        :param int gameid: The id of the game ships belong to.
+        :param list ships: List of dictionaries with the keys stern_x,
+            stern_y, bow_x, bow_y and ship_type.
+        :return: A list with the ids of the new ships in the same order
+            as *ships*, or None if the ships could not be created.
+        '''
+        #Query to get the next free ship id of the player
+        query = 'SELECT COALESCE(MAX(id) + 1, 0) FROM ship WHERE game = ? AND player = ?'
         #Create the SQL Statement
         stmnt = 'INSERT INTO ship (id, player, game, stern_x, stern_y, bow_x, bow_y, ship_type) \
                  VALUES (?, ?, ?, ?, ?, ?, ?, ?)'
-        #Activate foreign key support
-        self.set_foreign_keys_support()
-        #Cursor and row initialization
-        self.con.row_factory = sqlite3.Row
+        stmnt_cell = 'INSERT INTO ship_cell (game, x, y, player, ship) \
+                      VALUES (?, ?, ?, ?, ?)'
+        #Cursor initialization
         cur = self.con.cursor()
-        #Generate the values for SQL statement
-        pvalue = (shipid, playerid, gameid, stern_x, stern_y, bow_x, bow_y, ship_type)
-        #Execute the statement
         try:
-            cur.execute(stmnt, pvalue)
-        except sqlite3.Error as e:
+            if self.con.in_transaction:
+                self.con.commit()
+            cur.execute('BEGIN IMMEDIATE')
+            cur.execute(query, (gameid, playerid))
+            first_id = cur.fetchone()[0]
+            shipids = list(range(first_id, first_id + len(ships)))
+            #Generate the values for SQL statement
+            pvalues = [(shipid, playerid, gameid,
+                        ship['stern_x'], ship['stern_y'],
+                        ship['bow_x'], ship['bow_y'], ship['ship_type'])
+                       for shipid, ship in zip(shipids, ships)]
+            cur.executemany(stmnt, pvalues)
+            #Index the cells covered by the ships for shot evaluation
+            cells = [(gameid, x, y, playerid, shipid)
+                     for shipid, ship in zip(shipids, ships)
+                     for x, y in ship_cells(ship)]
+            cur.executemany(stmnt_cell, cells)
+            self.con.commit()
+        except (sqlite3.Error, KeyError, TypeError, ValueError) as e:
             print("Error %s:" % (e.args[0]))
-            return False
-        self.con.commit()
-        return True
+            if self.con.in_transaction:
+                self.con.rollback()
+            return None
+        self._publish(gameid, events.SHIPS_PLACED, player=playerid, ships=shipids)
+        return shipids
 
     # Turn API
     def get_turns_by_player(self, playerid, gameid):
@@ -657,12 +1456,9 @@ class Connection(object):
         :param int gameid: The id of the game which turns are returned.
         :return: A list with the turns, or None if either ID doesn't exist.
         '''
-        #Activate foreign key support
-        self.set_foreign_keys_support()
         #Create the SQL Query
         query = 'SELECT * FROM turn WHERE player = ? AND game = ?'
-        #Cursor and row initialization
-        self.con.row_factory = sqlite3.Row
+        #Cursor initialization
         cur = self.con.cursor()
         #Execute main SQL Query
         pvalue = (playerid, gameid)
@@ -689,12 +1485,9 @@ class Connection(object):
         :param int gameid: The id of the game which turns are returned.
         :return: A list with the turns, or None if ID doesn't exist.
         '''
-        #Activate foreign key support
-        self.set_foreign_keys_support()
         #Create the SQL Query
         query = 'SELECT * FROM turn WHERE game = ?'
-        #Cursor and row initialization
-        self.con.row_factory = sqlite3.Row
+        #Cursor initialization
         cur = self.con.cursor()
         #Execute main SQL Query
         pvalue = (gameid,)
@@ -721,12 +1514,9 @@ class Connection(object):
         :param int gameid: The id of the game which turns are returned.
         :return: A list with the turn, or None if ID doesn't exist.
         '''
-        #Activate foreign key support
-        self.set_foreign_keys_support()
         #Create the SQL Query
         query = 'SELECT * FROM turn WHERE game = ? AND turn_number = (SELECT MAX(turn_number) FROM turn WHERE game = ?)'
-        #Cursor and row initialization
-        self.con.row_factory = sqlite3.Row
+        #Cursor initialization
         cur = self.con.cursor()
         #Execute main SQL Query
         pvalue = (gameid, gameid,)
@@ -759,10 +1549,7 @@ class Connection(object):
         #Create the SQL Statement
         stmnt = 'INSERT INTO turn (turn_number, player, game) \
                  VALUES (?, ?, ?)'
-        #Activate foreign key support
-        self.set_foreign_keys_support()
-        #Cursor and row initialization
-        self.con.row_factory = sqlite3.Row
+        #Cursor initialization
         cur = self.con.cursor()
         #Generate the values for SQL statement
         start_time = str(datetime.today())
@@ -777,29 +1564,65 @@ class Connection(object):
         return True
 
    # Shot API
-    def get_shots(self, gameid):
+    def get_shots(self, gameid, since_turn=None, playerid=None):
         '''
-        Get all shots of a game.
+        Get all shots of a game, ordered by turn and player.
+
+        The shots can be limited to the turns starting from since_turn and
+        to the shots of a single player. Both filters are answered from the
+        shot_game_turn and shot_game_player indexes.
+
         :param int gameid: The id of the game which shots are returned.
-        :return: A list with the shots, or None if ID doesn't exist.
+        :param int since_turn: Only the shots of this turn and the turns after
+            it are returned. Defaults to None, which returns all turns.
+        :param int playerid: Only the shots of this player are returned.
+            Defaults to None, which returns the shots of every player.
+        :return: A list with the shots, or None if ID doesn't exist or no
+            shots match the filters.
+        '''
+        shots = list(self.iter_shots(gameid, since_turn, playerid))
+        if shots == []:
+            return None
+        return shots
+
+    def iter_shots(self, gameid, since_turn=None, playerid=None, batch_size=DEFAULT_BATCH_SIZE):
+        '''
+        Iterates the shots of a game like :py:meth:`get_shots`, reading them
+        from the database *batch_size* rows at a time, so the whole game is
+        never held in memory. The connection must not be utilized for
+        anything else until the iteration is over.
+
+        :param int gameid: The id of the game which shots are returned.
+        :param int since_turn: Only the shots of this turn and the turns after
+            it are returned.
+        :param int playerid: Only the shots of this player are returned.
+        :param int batch_size: Number of rows fetched at a time.
+        :return: A generator of dictionaries with the shot data.
         '''
-        #Activate foreign key support
-        self.set_foreign_keys_support()
         #Create the SQL Query
         query = 'SELECT * FROM shot WHERE game = ?'
-        #Cursor and row initialization
-        self.con.row_factory = sqlite3.Row
+        pvalue = [gameid]
+        if playerid is not None:
+            query += ' AND player = ?'
+            pvalue.append(playerid)
+        if since_turn is not None:
+            query += ' AND turn >= ?'
+            pvalue.append(since_turn)
+        query += ' ORDER BY turn, player'
+        #Cursor initialization
         cur = self.con.cursor()
         #Execute main SQL Query
-        pvalue = (gameid,)
         cur.execute(query, pvalue)
-        #Process the response.
-        rows = cur.fetchall()
-        if rows == []:
-            return None
-        #Build the return object
-        shots = [dict(row) for row in rows]
-        return shots
+        #Build the return objects one batch at a time
+        try:
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    return
+                for row in rows:
+                    yield dict(row)
+        finally:
+            cur.close()
 
     def get_shots_by_player(self, playerid, gameid):
         '''
@@ -808,12 +1631,9 @@ class Connection(object):
         :param int playerid: The id of the player whose shots are returned.
         :return: A list with the shots, or None if ID doesn't exist.
         '''
-        #Activate foreign key support
-        self.set_foreign_keys_support()
         #Create the SQL Query
         query = 'SELECT * FROM shot WHERE game = ? AND player = ?'
-        #Cursor and row initialization
-        self.con.row_factory = sqlite3.Row
+        #Cursor initialization
         cur = self.con.cursor()
         #Execute main SQL Query
         pvalue = (gameid, playerid)
@@ -833,12 +1653,9 @@ class Connection(object):
         :param int turn: The turn number.
         :return: A list with the shots, or None if ID doesn't exist.
         '''
-        #Activate foreign key support
-        self.set_foreign_keys_support()
         #Create the SQL Query
         query = 'SELECT * FROM shot WHERE game = ? AND turn = ?'
-        #Cursor and row initialization
-        self.con.row_factory = sqlite3.Row
+        #Cursor initialization
         cur = self.con.cursor()
         #Execute main SQL Query
         pvalue = (gameid, turn)
@@ -866,10 +1683,7 @@ class Connection(object):
         #Create the SQL Statement
         stmnt = 'INSERT INTO shot (turn, player, game, x, y, shot_type) \
                  VALUES (?, ?, ?, ?, ?, ?)'
-        #Activate foreign key support
-        self.set_foreign_keys_support()
-        #Cursor and row initialization
-        self.con.row_factory = sqlite3.Row
+        #Cursor initialization
         cur = self.con.cursor()
         #Generate the values for SQL statement
         pvalue = (turn, playerid, gameid, x, y, shot_type)
@@ -880,4 +1694,304 @@ class Connection(object):
             print("Error %s:" % (e.args[0]))
             return False
         self.con.commit()
+        self._publish(gameid, events.SHOT_FIRED, turn=turn, player=playerid,
+                      x=x, y=y, shot_type=shot_type, result=None, hits=[])
         return True
+
+    def fire_shot(self, playerid, gameid, x, y, shot_type):
+        '''
+        Fires a shot into a game. Resolves the turn the shot belongs to,
+        evaluates the shot against the ships of the other players and creates
+        both the turn and the shot inside a single immediate transaction, so
+        concurrent shooters see a consistent turn state.
+
+        A player can fire once per turn. When every player of the game has
+        fired in the latest turn, the shot opens the next turn.
+
+        The shot hits every ship of the other players covering the cell
+        (x, y). A ship is sunk when the shot hits its last intact cell. The
+        result of the shot is stored with it.
+
+        When the shot sinks the last ship of the last but one player afloat,
+        the game is ended and the remaining player is stored as the winner.
+        Players who have not placed their ships yet count as afloat.
+
+        After commiting, a shot-fired event is published, followed by
+        game-ended if the game ended or turn-advanced if every player has now
+        fired in the turn.
+
+        :param int playerid; The id of the player who fires the shot.
+        :param int gameid: The id of the game where the shot is fired.
+        :param int x: The x-coordinate of the shot.
+        :param int y: The y-coordinate of the shot.
+        :param shot_type: Customizable type of the shot (e.g. single or area-of-effect).
+        :return: A :py:class:`ShotOutcome`. Its status is SHOT_ACCEPTED if the
+            shot was created, SHOT_NOT_YOUR_TURN if the player has to wait for
+            the other players, SHOT_GAME_ENDED if the game has ended and
+            SHOT_FAILED if the database rejected it.
+        '''
+        #Create the SQL Statements
+        stmnt_turn = 'INSERT INTO turn (turn_number, player, game) \
+                      VALUES (?, ?, ?)'
+        stmnt_shot = 'INSERT INTO shot (turn, player, game, x, y, shot_type, result) \
+                      VALUES (?, ?, ?, ?, ?, ?, ?)'
+        query_waiting = 'SELECT COUNT(*) FROM player WHERE game = ? AND id NOT IN \
+                         (SELECT player FROM shot WHERE game = ? AND turn = ?)'
+        #Cursor initialization
+        cur = self.con.cursor()
+        try:
+            #Lock the database for writing before reading the turn state
+            if self.con.in_transaction:
+                self.con.commit()
+            cur.execute('BEGIN IMMEDIATE')
+            cur.execute('SELECT end_time FROM game WHERE id = ?', (gameid,))
+            row = cur.fetchone()
+            if row is not None and row['end_time'] is not None:
+                self.con.rollback()
+                return ShotOutcome(SHOT_GAME_ENDED, None, None, [], False, None)
+            latest_turn_number, turn_number = self._resolve_turn(cur, playerid, gameid)
+            if turn_number is None:
+                self.con.rollback()
+                return ShotOutcome(SHOT_NOT_YOUR_TURN, latest_turn_number, None, [], False, None)
+            cur.execute(stmnt_turn, (turn_number, playerid, gameid))
+            hits = self._evaluate_shot(cur, playerid, gameid, x, y)
+            if any(hit['sunk'] for hit in hits):
+                result = RESULT_SUNK
+            elif hits:
+                result = RESULT_HIT
+            else:
+                result = RESULT_MISS
+            cur.execute(stmnt_shot, (turn_number, playerid, gameid, x, y, shot_type, result))
+            game_over, winner = False, None
+            if result == RESULT_SUNK:
+                game_over, winner = self._check_game_over(cur, gameid)
+            #The turn is complete once every player has fired in it
+            cur.execute(query_waiting, (gameid, gameid, turn_number))
+            turn_complete = cur.fetchone()[0] == 0
+            self.con.commit()
+        except sqlite3.Error as e:
+            print("Error %s:" % (e.args[0]))
+            if self.con.in_transaction:
+                self.con.rollback()
+            return ShotOutcome(SHOT_FAILED, None, None, [], False, None)
+        self._publish(gameid, events.SHOT_FIRED, turn=turn_number, player=playerid,
+                      x=x, y=y, shot_type=shot_type, result=result, hits=hits)
+        if game_over:
+            self._invalidate(gameid)
+            self._publish(gameid, events.GAME_ENDED, winner=winner)
+        elif turn_complete:
+            self._publish(gameid, events.TURN_ADVANCED, turn=turn_number + 1)
+        return ShotOutcome(SHOT_ACCEPTED, turn_number, result, hits, game_over, winner)
+
+    def write_shots(self, shots):
+        '''
+        Stores shots which have already been evaluated elsewhere, e.g. by
+        :py:class:`battleship.gamestate.GameState`, inside a single immediate
+        transaction. No events are published.
+
+        :param list shots: Dictionaries with the keys game, turn, player, x,
+            y, shot_type and result of the shot, hit_cells with the
+            (player, ship) tuples of the ship cells the shot hit for the
+            first time, and end_time and winner, which are set if the shot
+            ended the game.
+        :return: ``True`` if all the shots were stored, ``False`` otherwise,
+            in which case none of them were stored.
+        '''
+        #Create the SQL Statements
+        stmnt_turn = 'INSERT INTO turn (turn_number, player, game) VALUES (?, ?, ?)'
+        stmnt_hit = 'UPDATE ship_cell SET hit = 1 \
+                     WHERE game = ? AND x = ? AND y = ? AND player = ? AND ship = ?'
+        stmnt_shot = 'INSERT INTO shot (turn, player, game, x, y, shot_type, result) \
+                      VALUES (?, ?, ?, ?, ?, ?, ?)'
+        stmnt_end = 'UPDATE game SET end_time = ?, winner = ? WHERE id = ? AND end_time is null'
+        #Cursor initialization
+        cur = self.con.cursor()
+        try:
+            if self.con.in_transaction:
+                self.con.commit()
+            cur.execute('BEGIN IMMEDIATE')
+            for shot in shots:
+                cur.execute(stmnt_turn, (shot['turn'], shot['player'], shot['game']))
+                for player, ship in shot['hit_cells']:
+                    cur.execute(stmnt_hit, (shot['game'], shot['x'], shot['y'], player, ship))
+                cur.execute(stmnt_shot, (shot['turn'], shot['player'], shot['game'], shot['x'],
+                                         shot['y'], shot['shot_type'], shot['result']))
+                if shot['end_time'] is not None:
+                    cur.execute(stmnt_end, (shot['end_time'], shot['winner'], shot['game']))
+            self.con.commit()
+        except sqlite3.Error as e:
+            print("Error %s:" % (e.args[0]))
+            if self.con.in_transaction:
+                self.con.rollback()
+            return False
+        for shot in shots:
+            if shot['end_time'] is not None:
+                self._invalidate(shot['game'])
+        return True
+
+    def _evaluate_shot(self, cur, playerid, gameid, x, y):
+        '''
+        Marks the cells of the other players' ships at (x, y) as hit.
+
+        :param cur: Cursor utilized to run the statements.
+        :return: A list of dictionaries with the keys player, ship and sunk,
+            one for each ship hit.
+        '''
+        query_cells = 'SELECT player, ship, hit FROM ship_cell \
+                       WHERE game = ? AND x = ? AND y = ? AND player != ?'
+        stmnt_hit = 'UPDATE ship_cell SET hit = 1 \
+                     WHERE game = ? AND x = ? AND y = ? AND player = ? AND ship = ?'
+        query_intact = 'SELECT COUNT(*) FROM ship_cell \
+                        WHERE game = ? AND player = ? AND ship = ? AND hit = 0'
+        cur.execute(query_cells, (gameid, x, y, playerid))
+        hits = []
+        for row in cur.fetchall():
+            sunk = False
+            if not row['hit']:
+                cur.execute(stmnt_hit, (gameid, x, y, row['player'], row['ship']))
+                cur.execute(query_intact, (gameid, row['player'], row['ship']))
+                sunk = cur.fetchone()[0] == 0
+            hits.append({'player': row['player'],
+                         'ship': row['ship'],
+                         'sunk': sunk})
+        return hits
+
+    def _check_game_over(self, cur, gameid):
+        '''
+        Ends the game if at most one player has intact ship cells left.
+        A player who has not placed any ships yet is still afloat.
+
+        :param cur: Cursor utilized to run the statements.
+        :return: A tuple (game_over, winner). winner is the id of the last
+            player afloat, or None if nobody is left.
+        '''
+        #cells_left is 0 also before the ships are placed
+        query_afloat = 'SELECT id FROM player WHERE game = ? AND (cells_left > 0 OR NOT EXISTS \
+                        (SELECT 1 FROM ship_cell WHERE game = player.game AND player = player.id)) \
+                        LIMIT 2'
+        cur.execute(query_afloat, (gameid,))
+        afloat = [row['id'] for row in cur.fetchall()]
+        if len(afloat) > 1:
+            return False, None
+        winner = afloat[0] if afloat else None
+        self._end_game(cur, gameid, winner)
+        return True, winner
+
+    def _resolve_turn(self, cur, playerid, gameid):
+        '''
+        Resolves the turn where a player can fire next.
+
+        :param cur: Cursor utilized to run the queries.
+        :param int playerid: The id of the player.
+        :param int gameid: The id of the game.
+        :return: A tuple (latest_turn_number, turn_number). latest_turn_number
+            is None if no turns have been played. turn_number is None if the
+            player has to wait for the other players to fire.
+        '''
+        cur.execute('SELECT MAX(turn_number) FROM turn WHERE game = ?', (gameid,))
+        latest_turn_number = cur.fetchone()[0]
+        if latest_turn_number is None:
+            # No shots have been fired yet in this game.
+            return None, 0
+        cur.execute('SELECT player FROM shot WHERE game = ? AND turn = ?',
+                    (gameid, latest_turn_number))
+        players_who_have_shot = [row[0] for row in cur.fetchall()]
+        if playerid not in players_who_have_shot:
+            # This player has not fired this turn.
+            return latest_turn_number, latest_turn_number
+        cur.execute('SELECT id FROM player WHERE game = ?', (gameid,))
+        players_in_game = [row[0] for row in cur.fetchall()]
+        return latest_turn_number, next_turn(latest_turn_number, players_who_have_shot,
+                                             players_in_game, playerid)
+
+    # Game state API
+    def get_game_snapshot(self, gameid, with_cells=False):
+        '''
+        Reads everything about a game inside a single read transaction, so
+        the parts of the snapshot are consistent with each other.
+
+        :param int gameid: The id of the game.
+        :param bool with_cells: If ``True`` the ship cells of the game are
+            read as well.
+        :return: A dictionary with the keys game, players, ships, shots, turn
+            and version, or None if game with the id does not exist. game is
+            the dictionary returned by :py:meth:`get_game`. players, ships and
+            shots are lists of dictionaries with all the columns of the rows.
+            turn is a dictionary with the latest turn_number (None if no
+            turns have been played) and the list of players who have fired
+            in it. version is the version of the game. With *with_cells* the
+            key cells holds the ship cells ordered by x, y, player and ship.
+        '''
+        #Cursor initialization
+        cur = self.con.cursor()
+        try:
+            if self.con.in_transaction:
+                self.con.commit()
+            cur.execute('BEGIN')
+            cur.execute('SELECT * FROM game WHERE id = ?', (gameid,))
+            row = cur.fetchone()
+            if row is None:
+                return None
+            game = {'id': row['id'],
+                    'start_time': row['start_time'],
+                    'end_time': row['end_time'],
+                    'x_size': row['x_size'],
+                    'y_size': row['y_size'],
+                    'turn_length': row['turn_length'],
+                    'winner': row['winner']}
+            cur.execute('SELECT * FROM player WHERE game = ? ORDER BY id', (gameid,))
+            players = [dict(row) for row in cur.fetchall()]
+            cur.execute('SELECT * FROM ship WHERE game = ? ORDER BY player, id', (gameid,))
+            ships = [dict(row) for row in cur.fetchall()]
+            cur.execute('SELECT * FROM shot WHERE game = ? ORDER BY turn, player', (gameid,))
+            shots = [dict(row) for row in cur.fetchall()]
+            cur.execute('SELECT MAX(turn_number) FROM turn WHERE game = ?', (gameid,))
+            turn_number = cur.fetchone()[0]
+            cells = None
+            if with_cells:
+                cur.execute('SELECT x, y, player, ship, hit FROM ship_cell WHERE game = ? \
+                             ORDER BY x, y, player, ship', (gameid,))
+                cells = [dict(row) for row in cur.fetchall()]
+        finally:
+            if self.con.in_transaction:
+                self.con.commit()
+        fired = [shot['player'] for shot in shots if shot['turn'] == turn_number]
+        snapshot = {'game': game,
+                    'players': players,
+                    'ships': ships,
+                    'shots': shots,
+                    'turn': {'turn_number': turn_number, 'fired': fired},
+                    'version': row['version']}
+        if with_cells:
+            snapshot['cells'] = cells
+        return snapshot
+
+    def get_turn_status(self, playerid, gameid):
+        '''
+        Reads whether a player can fire, inside a single read transaction.
+
+        :param int playerid: The id of the player.
+        :param int gameid: The id of the game.
+        :return: A dictionary with the keys turn_number, can_fire, end_time
+            and winner, or None if game with the id does not exist.
+            turn_number is the turn where the player can fire next, None if
+            the player has to wait for the other players to fire.
+        '''
+        #Cursor initialization
+        cur = self.con.cursor()
+        try:
+            if self.con.in_transaction:
+                self.con.commit()
+            cur.execute('BEGIN')
+            cur.execute('SELECT end_time, winner FROM game WHERE id = ?', (gameid,))
+            row = cur.fetchone()
+            if row is None:
+                return None
+            _, turn_number = self._resolve_turn(cur, playerid, gameid)
+        finally:
+            if self.con.in_transaction:
+                self.con.commit()
+        return {'turn_number': turn_number,
+                'can_fire': row['end_time'] is None and turn_number is not None,
+                'end_time': row['end_time'],
+                'winner': row['winner']}
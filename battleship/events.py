@@ -0,0 +1,207 @@
+'''
+Created on 17.10.2026
+
+In-process notifications of changes in the games.
+
+The write methods of :py:class:`battleship.database.Connection` publish an
+event to the notifier of their Engine after commiting. Requests waiting for
+a change in a game are woken up without polling the database, and event
+streams read the recent events of a game from its buffer.
+
+Programmable Web Project course work by:
+
+@author: arttu
+@author: niko
+@author: timo
+'''
+
+from collections import OrderedDict, deque, namedtuple
+import threading
+import time
+
+# Number of recent events kept for every game
+EVENT_BUFFER_SIZE = 100
+# Maximum number of games with buffered events
+MAX_GAMES = 1024
+# Seconds the events of an ended or deleted game are kept after its last event
+FINISHED_GAME_TTL = 60.0
+
+# Event types
+PLAYER_JOINED = 'player-joined'
+PLAYER_LEFT = 'player-left'
+SHIPS_PLACED = 'ships-placed'
+SHIP_REMOVED = 'ship-removed'
+SHOT_FIRED = 'shot-fired'
+TURN_ADVANCED = 'turn-advanced'
+GAME_ENDED = 'game-ended'
+GAME_DELETED = 'game-deleted'
+
+# The id of an event is the sequence number of the game after it
+Event = namedtuple('Event', ['id', 'type', 'data'])
+
+
+class GameNotifier(object):
+    '''
+    Wakes up threads waiting for a change in a game, and keeps the latest
+    :py:data:`EVENT_BUFFER_SIZE` events of every game.
+
+    Every game has a sequence number which grows by one on each
+    :py:meth:`publish`. A waiter reads the sequence with :py:meth:`sequence`
+    before reading the state of the game from the database, and then waits
+    until the sequence differs from it. A change commited between the read
+    and the wait is therefore never missed.
+
+    The events and the sequence of a game are forgotten when nobody waits
+    for the game anymore and either the game has ended or been deleted
+    :py:data:`FINISHED_GAME_TTL` seconds ago, or more than *max_games*
+    games have changed since it did. A waiter of a forgotten game returns
+    at once, and a stream resuming from it gets an incomplete answer from
+    :py:meth:`events_since`.
+
+    :py:meth:`close` wakes up all the waiters when the server stops.
+
+    The notifications only reach the threads of the same process.
+    '''
+    def __init__(self, buffer_size=EVENT_BUFFER_SIZE, max_games=MAX_GAMES,
+                 finished_ttl=FINISHED_GAME_TTL):
+        super(GameNotifier, self).__init__()
+        self.buffer_size = buffer_size
+        self.max_games = max_games
+        self.finished_ttl = finished_ttl
+        self._lock = threading.Lock()
+        # The least recently changed game first
+        self._sequences = OrderedDict()
+        self._buffers = {}
+        self._conditions = {}
+        self._waiting = {}
+        # gameid -> time of the game-ended or game-deleted event
+        self._finished = OrderedDict()
+        self.closed = False
+
+    @staticmethod
+    def _key(gameid):
+        # The id arrives both as an int and as a string from the url.
+        return str(gameid)
+
+    def sequence(self, gameid):
+        '''
+        Returns the current sequence number of a game.
+
+        :param gameid: The id of the game.
+        :return: The sequence number, 0 if the game has never changed.
+        '''
+        with self._lock:
+            return self._sequences.get(self._key(gameid), 0)
+
+    def publish(self, gameid, event_type, data=None):
+        '''
+        Stores an event of a game and wakes up the threads waiting for it.
+
+        :param gameid: The id of the game.
+        :param str event_type: One of the event types of this module.
+        :param dict data: Details of the event, serializable as JSON.
+        :return: The id of the event.
+        '''
+        key = self._key(gameid)
+        now = time.monotonic()
+        with self._lock:
+            sequence = self._sequences[key] = self._sequences.get(key, 0) + 1
+            self._sequences.move_to_end(key)
+            # The id of a deleted game is given out again
+            self._finished.pop(key, None)
+            if event_type in (GAME_ENDED, GAME_DELETED):
+                self._finished[key] = now
+            buffer = self._buffers.get(key)
+            if buffer is None:
+                buffer = self._buffers[key] = deque(maxlen=self.buffer_size)
+            buffer.append(Event(sequence, event_type, data or {}))
+            condition = self._conditions.get(key)
+            if condition is not None:
+                condition.notify_all()
+            self._prune(now)
+        return sequence
+
+    def close(self):
+        '''
+        Wakes up all the waiting threads and makes the later waits return
+        at once, so the requests waiting for a change can finish.
+        '''
+        with self._lock:
+            self.closed = True
+            for condition in self._conditions.values():
+                condition.notify_all()
+
+    def _prune(self, now):
+        # Called with self._lock held. Games with waiters are kept.
+        for key, finished in list(self._finished.items()):
+            if finished + self.finished_ttl > now:
+                break
+            if key not in self._waiting:
+                self._forget(key)
+        if len(self._sequences) > self.max_games:
+            for key in list(self._sequences):
+                if len(self._sequences) <= self.max_games:
+                    break
+                if key not in self._waiting:
+                    self._forget(key)
+
+    def _forget(self, key):
+        # Called with self._lock held
+        del self._sequences[key]
+        self._buffers.pop(key, None)
+        self._finished.pop(key, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sequences)
+
+    def events_since(self, gameid, last_id):
+        '''
+        Returns the buffered events of a game published after *last_id*.
+
+        :param gameid: The id of the game.
+        :param int last_id: The id of the latest event already seen.
+        :return: A tuple (events, complete). complete is False if events
+            after *last_id* have already been dropped from the buffer, or if
+            *last_id* is unknown to this process.
+        '''
+        key = self._key(gameid)
+        with self._lock:
+            sequence = self._sequences.get(key, 0)
+            buffer = self._buffers.get(key, ())
+            events = [event for event in buffer if event.id > last_id]
+        oldest = events[0].id if events else sequence + 1
+        complete = last_id <= sequence and oldest == last_id + 1
+        return events, complete
+
+    def wait(self, gameid, sequence, timeout):
+        '''
+        Blocks until the sequence number of a game differs from *sequence*,
+        the timeout expires or the notifier is closed.
+
+        :param gameid: The id of the game.
+        :param int sequence: The sequence number read earlier.
+        :param float timeout: Maximum time to wait in seconds.
+        :return: The current sequence number.
+        '''
+        key = self._key(gameid)
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            condition = self._conditions.get(key)
+            if condition is None:
+                condition = self._conditions[key] = threading.Condition(self._lock)
+            self._waiting[key] = self._waiting.get(key, 0) + 1
+            try:
+                while self._sequences.get(key, 0) == sequence and not self.closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    condition.wait(remaining)
+            finally:
+                self._waiting[key] -= 1
+                if self._waiting[key] == 0:
+                    # Nobody waits for the game anymore.
+                    del self._waiting[key]
+                    del self._conditions[key]
+                    self._prune(time.monotonic())
+            return self._sequences.get(key, 0)
@@ -0,0 +1,509 @@
+'''
+Created on 17.10.2026
+
+In-memory state of the games being played, with write-behind persistence.
+
+The :py:class:`GameStateStore` of a process keeps the players, ship cells,
+shots and current turn of the active games in memory. Reads of a hot game
+are answered without touching the database, and shots are evaluated in
+memory and written to the database by a background thread, at most
+``max_lag`` seconds later. The shot which ends a game is written before
+the request returns, and the remaining writes are flushed on shutdown.
+A shot which cannot be written stays queued and is tried again. If it
+still fails after :py:data:`MAX_WRITE_ATTEMPTS` attempts, it is logged as
+lost and its game is dropped from memory, so the game is read again from
+the database.
+
+The store assumes that every shot of its games is fired through it, so
+it is only consistent when a single process serves the API. Other writes
+to a game, such as players joining or ships being placed, go to the
+database directly after :py:meth:`GameStateStore.release` has written the
+pending shots of the game and dropped it from memory.
+
+Programmable Web Project course work by:
+
+@author: arttu
+@author: niko
+@author: timo
+'''
+
+from collections import OrderedDict
+from datetime import datetime
+import bisect
+import logging
+import threading
+import time
+
+from battleship import database
+from battleship import events
+from battleship import metrics
+
+# Longest time in seconds between accepting a shot and writing it
+DEFAULT_MAX_LAG = 0.5
+# Number of games kept in memory
+DEFAULT_CAPACITY = 1000
+# Pending shots which trigger a write without waiting for max_lag
+MAX_PENDING = 500
+# Times a shot is written before it is given up
+MAX_WRITE_ATTEMPTS = 5
+# Seconds between the attempts to write a shot
+RETRY_DELAY = 0.5
+
+LOGGER = logging.getLogger('battleship.gamestate')
+
+
+class GameState(object):
+    '''
+    The state of one active game, built from
+    :py:meth:`battleship.database.Connection.get_game_snapshot`. The methods
+    mirror the ones of :py:class:`battleship.database.Connection` and return
+    the same structures. The instance is shared by the threads of the
+    process and guards itself with a lock.
+
+    :param dict snapshot: A snapshot read with ``with_cells=True``.
+    '''
+    def __init__(self, snapshot):
+        super(GameState, self).__init__()
+        self.lock = threading.Lock()
+        self.game = snapshot['game']
+        self.players = OrderedDict((player['id'], player) for player in snapshot['players'])
+        self.ships = snapshot['ships']
+        self.shots = snapshot['shots']
+        self.turn_number = snapshot['turn']['turn_number']
+        self.fired = set(snapshot['turn']['fired'])
+        # (x, y) -> cells covering the square, ordered by player and ship
+        self.cells = {}
+        # (player, ship) -> number of intact cells
+        self.intact = {}
+        for cell in snapshot['cells']:
+            self.cells.setdefault((cell['x'], cell['y']), []).append(cell)
+            key = (cell['player'], cell['ship'])
+            self.intact[key] = self.intact.get(key, 0) + (0 if cell['hit'] else 1)
+        self.db_version = snapshot['version']
+        # Changes made in memory since the game was read
+        self.changes = 0
+        # Set when the game is dropped from the store
+        self.released = False
+
+    @property
+    def version(self):
+        '''
+        Version of the game for ETags: the version read from the database
+        and the number of changes made in memory since.
+        '''
+        return "%s.%s" % (self.db_version, self.changes)
+
+    def get_player(self, playerid):
+        '''
+        Returns a player of the game like
+        :py:meth:`battleship.database.Connection.get_player`, or None.
+        '''
+        playerid = _id(playerid)
+        with self.lock:
+            player = self.players.get(playerid)
+            if player is None:
+                return None
+            return {'id': player['id'], 'nickname': player['nickname'], 'game': player['game']}
+
+    def get_game_snapshot(self):
+        '''
+        Returns the game in the format of
+        :py:meth:`battleship.database.Connection.get_game_snapshot`.
+        '''
+        with self.lock:
+            return {'game': dict(self.game),
+                    'players': [dict(player) for player in self.players.values()],
+                    'ships': [dict(ship) for ship in self.ships],
+                    'shots': [dict(shot) for shot in self.shots],
+                    'turn': {'turn_number': self.turn_number,
+                             'fired': [shot['player'] for shot in self.shots
+                                       if shot['turn'] == self.turn_number]},
+                    'version': self.db_version}
+
+    def get_turn_status(self, playerid):
+        '''
+        Returns the turn status of a player in the format of
+        :py:meth:`battleship.database.Connection.get_turn_status`.
+        '''
+        playerid = _id(playerid)
+        with self.lock:
+            turn_number = database.next_turn(self.turn_number, self.fired,
+                                             list(self.players), playerid)
+            return {'turn_number': turn_number,
+                    'can_fire': self.game['end_time'] is None and turn_number is not None,
+                    'end_time': self.game['end_time'],
+                    'winner': self.game['winner']}
+
+    def get_shots(self, since_turn=None, playerid=None):
+        '''
+        Returns the shots of the game like
+        :py:meth:`battleship.database.Connection.get_shots`.
+        '''
+        if playerid is not None:
+            playerid = _id(playerid)
+        with self.lock:
+            shots = [dict(shot) for shot in self.shots
+                     if (since_turn is None or shot['turn'] >= since_turn)
+                     and (playerid is None or shot['player'] == playerid)]
+        return shots or None
+
+    def fire_shot(self, playerid, x, y, shot_type, enqueue=None):
+        '''
+        Fires a shot like :py:meth:`battleship.database.Connection.fire_shot`,
+        without writing it.
+
+        :param enqueue: Called with the record of an accepted shot before the
+            lock of the state is released, so the game cannot be released
+            and read again from the database without the shot.
+        :return: A tuple (outcome, record, turn_complete). record is the
+            shot to pass to :py:meth:`battleship.database.Connection.write_shots`,
+            None if the shot was not accepted. outcome is None if the game
+            has been released and must be read again.
+        '''
+        playerid = _id(playerid)
+        x, y = _square(x, y)
+        with self.lock:
+            if self.released:
+                return None, None, False
+            if self.game['end_time'] is not None:
+                return database.ShotOutcome(database.SHOT_GAME_ENDED, None, None, [], False, None), None, False
+            if playerid not in self.players:
+                return database.ShotOutcome(database.SHOT_FAILED, None, None, [], False, None), None, False
+            turn_number = database.next_turn(self.turn_number, self.fired, list(self.players), playerid)
+            if turn_number is None:
+                return database.ShotOutcome(database.SHOT_NOT_YOUR_TURN, self.turn_number,
+                                            None, [], False, None), None, False
+
+            hits = []
+            hit_cells = []
+            for cell in self.cells.get((x, y), ()):
+                if cell['player'] == playerid:
+                    continue
+                key = (cell['player'], cell['ship'])
+                sunk = False
+                if not cell['hit']:
+                    cell['hit'] = 1
+                    hit_cells.append(key)
+                    self.intact[key] -= 1
+                    self.players[cell['player']]['cells_left'] -= 1
+                    sunk = self.intact[key] == 0
+                hits.append({'player': cell['player'], 'ship': cell['ship'], 'sunk': sunk})
+            if any(hit['sunk'] for hit in hits):
+                result = database.RESULT_SUNK
+            elif hits:
+                result = database.RESULT_HIT
+            else:
+                result = database.RESULT_MISS
+
+            shot = {'turn': turn_number, 'player': playerid, 'game': self.game['id'],
+                    'x': x, 'y': y, 'shot_type': shot_type, 'result': result}
+            position = bisect.bisect([(s['turn'], s['player']) for s in self.shots],
+                                     (turn_number, playerid))
+            self.shots.insert(position, shot)
+            if turn_number != self.turn_number:
+                self.turn_number = turn_number
+                self.fired = set()
+            self.fired.add(playerid)
+
+            game_over, winner, end_time = False, None, None
+            if result == database.RESULT_SUNK:
+                #Players without ships have not placed them yet
+                placed = set(player for player, _ in self.intact)
+                afloat = [player['id'] for player in self.players.values()
+                          if player['cells_left'] > 0 or player['id'] not in placed]
+                if len(afloat) <= 1:
+                    game_over = True
+                    winner = afloat[0] if afloat else None
+                    end_time = str(datetime.today())
+                    self.game['end_time'] = end_time
+                    self.game['winner'] = winner
+            turn_complete = len(self.fired) == len(self.players)
+            self.changes += 1
+            record = dict(shot, hit_cells=hit_cells, end_time=end_time, winner=winner)
+            if enqueue is not None:
+                enqueue(record)
+
+        outcome = database.ShotOutcome(database.SHOT_ACCEPTED, turn_number, result, hits, game_over, winner)
+        return outcome, record, turn_complete
+
+
+def _id(value):
+    # The ids of the URL and of the request body may be strings
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+def _square(x, y):
+    # sqlite compares a number sent as a string to the INTEGER columns as a number
+    try:
+        return int(x), int(y)
+    except (TypeError, ValueError):
+        return x, y
+
+
+class GameStateStore(object):
+    '''
+    Keeps the :py:class:`GameState` of up to *capacity* active games, least
+    recently used first out, and writes their shots to the database in the
+    background.
+
+    :param engine: The :py:class:`battleship.database.Engine` of the
+        database. Its notifier receives the events of the shots.
+    :param float max_lag: Longest time in seconds between accepting a shot
+        and writing it to the database.
+    :param int capacity: Maximum number of games kept in memory.
+    '''
+    def __init__(self, engine, max_lag=DEFAULT_MAX_LAG, capacity=DEFAULT_CAPACITY):
+        super(GameStateStore, self).__init__()
+        self.engine = engine
+        self.max_lag = max_lag
+        self.capacity = capacity
+        self._games = OrderedDict()
+        # Games known to have ended, which are never loaded again
+        self._ended = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        # Shots waiting to be written, and their number for every game
+        self._pending = []
+        self._pending_games = {}
+        self._oldest = None
+        # Held while writing, so the shots are written in order
+        self._flush_lock = threading.Lock()
+        self._con = None
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_behind, name="gamestate-writer")
+        self._writer.daemon = True
+        self._writer.start()
+
+    @staticmethod
+    def _key(gameid):
+        return str(gameid)
+
+    def peek(self, gameid):
+        '''
+        Returns the state of a game if it is in memory, without reading the
+        database. If the game is not in memory, its pending shots are
+        written first, so the database is up to date for the caller.
+
+        :return: A :py:class:`GameState` or None.
+        '''
+        key = self._key(gameid)
+        with self._lock:
+            state = self._games.get(key)
+            pending = key in self._pending_games
+        if state is None and pending:
+            self.flush()
+        return state
+
+    def get(self, gameid, con):
+        '''
+        Returns the state of an active game, reading it with *con* if it is
+        not in memory.
+
+        :param gameid: The id of the game.
+        :param con: A :py:class:`battleship.database.Connection`.
+        :return: A :py:class:`GameState`, or None if the game does not exist
+            or has ended.
+        '''
+        key = self._key(gameid)
+        with self._lock:
+            state = self._games.get(key)
+            if state is not None:
+                self._games.move_to_end(key)
+                return state
+            if key in self._ended:
+                return None
+            pending = key in self._pending_games
+        if pending:
+            # Shots of a released game must be in the database before reading it
+            self.flush()
+        elif not con.exists_game(gameid):
+            # Unknown ids are answered by the negative cache of the connection
+            return None
+        snapshot = con.get_game_snapshot(gameid, with_cells=True)
+        if snapshot is None:
+            return None
+        if snapshot['game']['end_time'] is not None:
+            self._remember_ended(key)
+            return None
+        state = GameState(snapshot)
+        with self._lock:
+            existing = self._games.get(key)
+            if existing is not None:
+                # Another thread read the game at the same time
+                return existing
+            self._games[key] = state
+            evicted = self._evict()
+        for old in evicted:
+            with old.lock:
+                old.released = True
+        return state
+
+    def _remember_ended(self, key):
+        with self._lock:
+            if len(self._ended) >= self.capacity * 10:
+                self._ended.clear()
+            self._ended.add(key)
+
+    def _evict(self):
+        # Called with self._lock held. Games with pending shots are kept.
+        evicted = []
+        for key in list(self._games):
+            if len(self._games) <= self.capacity:
+                break
+            if key not in self._pending_games:
+                evicted.append(self._games.pop(key))
+        return evicted
+
+    def fire_shot(self, playerid, gameid, x, y, shot_type, con):
+        '''
+        Fires a shot into an active game in memory and queues it for writing.
+        Publishes the same events as
+        :py:meth:`battleship.database.Connection.fire_shot`. The shot which
+        ends the game is written before returning, and the game is dropped.
+
+        :return: A :py:class:`battleship.database.ShotOutcome`, or None if the
+            game does not exist or has ended, in which case the caller fires
+            the shot through the database.
+        '''
+        while True:
+            state = self.get(gameid, con)
+            if state is None:
+                return None
+            outcome, record, turn_complete = state.fire_shot(playerid, x, y, shot_type,
+                                                             enqueue=self._enqueue)
+            if outcome is not None:
+                break
+        if record is None:
+            return outcome
+        if outcome.game_over:
+            self._remember_ended(self._key(gameid))
+            self.release(gameid)
+        notifier = self.engine.notifier
+        notifier.publish(gameid, events.SHOT_FIRED, dict(
+            turn=outcome.turn_number, player=playerid, x=x, y=y, shot_type=shot_type,
+            result=outcome.result, hits=outcome.hits))
+        if outcome.game_over:
+            notifier.publish(gameid, events.GAME_ENDED, dict(winner=outcome.winner))
+        elif turn_complete:
+            notifier.publish(gameid, events.TURN_ADVANCED, dict(turn=outcome.turn_number + 1))
+        return outcome
+
+    def release(self, gameid):
+        '''
+        Drops a game from memory after writing its pending shots. Called
+        before the game is modified through the database.
+        '''
+        key = self._key(gameid)
+        with self._lock:
+            state = self._games.pop(key, None)
+        if state is not None:
+            # Waits for a shot in progress: its record is queued before the
+            # state lock is released, so the flush below writes it
+            with state.lock:
+                state.released = True
+        self.flush()
+
+    def _enqueue(self, record):
+        # Called with the lock of the GameState held: the state lock is
+        # always taken before self._lock, never after it
+        key = self._key(record['game'])
+        with self._lock:
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.append(record)
+            self._pending_games[key] = self._pending_games.get(key, 0) + 1
+            if len(self._pending) == 1 or len(self._pending) >= MAX_PENDING:
+                self._wakeup.notify()
+
+    def flush(self):
+        '''
+        Writes all the pending shots to the database. The shots which cannot
+        be written are queued again, in front of the newer ones, and tried
+        again after :py:data:`RETRY_DELAY` seconds. Their games stay in
+        memory meanwhile. A shot which fails :py:data:`MAX_WRITE_ATTEMPTS`
+        times is logged and dropped with its game, so the game is read again
+        from the database.
+        '''
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return
+            if self._con is None:
+                self._con = self.engine.connect(check_same_thread=False)
+            failed = []
+            if not self._con.write_shots(batch):
+                # Write the shots one by one to keep the ones which succeed
+                failed = [record for record in batch if not self._con.write_shots([record])]
+            retried, lost = [], []
+            for record in failed:
+                record['failures'] = record.get('failures', 0) + 1
+                if record['failures'] < MAX_WRITE_ATTEMPTS:
+                    retried.append(record)
+                else:
+                    lost.append(record)
+            dropped = []
+            with self._lock:
+                queued = set(id(record) for record in retried)
+                for record in batch:
+                    if id(record) in queued:
+                        continue
+                    key = self._key(record['game'])
+                    self._pending_games[key] -= 1
+                    if self._pending_games[key] == 0:
+                        del self._pending_games[key]
+                if retried:
+                    self._pending[:0] = retried
+                    # The writer tries again after RETRY_DELAY
+                    self._oldest = time.monotonic() + RETRY_DELAY - self.max_lag
+                    self._wakeup.notify()
+                for record in lost:
+                    state = self._games.pop(self._key(record['game']), None)
+                    if state is not None:
+                        dropped.append(state)
+            for state in dropped:
+                with state.lock:
+                    state.released = True
+            if retried:
+                metrics.GAMESTATE_WRITE_FAILURES.inc(len(retried), result="retried")
+                LOGGER.warning("%d shots were not stored, trying again", len(retried))
+            for record in lost:
+                metrics.GAMESTATE_WRITE_FAILURES.inc(result="lost")
+                LOGGER.error("Shot of player %s in turn %s of game %s was not stored after %d "
+                             "attempts, reading the game again from the database",
+                             record['player'], record['turn'], record['game'], record['failures'])
+
+    def _write_behind(self):
+        while True:
+            with self._lock:
+                while not self._pending and not self._closed:
+                    self._wakeup.wait()
+                if self._closed:
+                    return
+                remaining = self._oldest + self.max_lag - time.monotonic()
+                if remaining > 0 and len(self._pending) < MAX_PENDING:
+                    self._wakeup.wait(remaining)
+            self.flush()
+
+    def close(self):
+        '''
+        Stops the background writer and writes the pending shots. Called on
+        shutdown.
+        '''
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify()
+        self._writer.join()
+        self.flush()
+        for _ in range(MAX_WRITE_ATTEMPTS - 1):
+            with self._lock:
+                if not self._pending:
+                    break
+            time.sleep(RETRY_DELAY)
+            self.flush()
+        with self._flush_lock:
+            if self._con is not None:
+                self._con.close()
+                self._con = None
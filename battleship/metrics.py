@@ -0,0 +1,368 @@
+'''
+Created on 17.10.2026
+
+Metrics of the Battleship API, exposed in the Prometheus text format.
+
+The request hooks of :py:mod:`battleship.resources` record the latency of
+every request and the SQL statements it executed, labelled with the
+endpoint and the HTTP method. The row cache of :py:mod:`battleship.cache`
+counts its hits and misses. The metrics are read at /metrics.
+
+The production server runs several worker processes, each with its own
+metrics. With :py:meth:`Registry.enable_multiprocess` every worker writes
+its values to a file of a shared directory, and /metrics adds up the files
+of all the workers, including the ones which have exited, so the counters
+never go down between scrapes.
+
+Programmable Web Project course work by:
+
+@author: arttu
+@author: niko
+@author: timo
+'''
+
+from bisect import bisect_left
+import json
+import os
+import threading
+import time
+
+# Media type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds of the histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+# Seconds between the writes of the metrics of a worker process
+MULTIPROCESS_WRITE_INTERVAL = 1.0
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra=None):
+    pairs = ['%s="%s"' % (name, _escape(value)) for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append('%s="%s"' % extra)
+    return "{%s}" % ",".join(pairs) if pairs else ""
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter(object):
+    '''
+    A counter which only grows, with a value for every combination of
+    label values.
+
+    :param str name: Name of the metric.
+    :param str description: Help text of the metric.
+    :param labelnames: Names of the labels.
+    '''
+    kind = "counter"
+
+    def __init__(self, name, description, labelnames=()):
+        super(Counter, self).__init__()
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        '''
+        Increments the counter of the given label values.
+        '''
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        '''
+        Returns the value of the counter of the given label values.
+        '''
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def export(self):
+        '''
+        Returns a copy of the values, by the tuples of label values.
+        '''
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(values, other):
+        '''
+        Adds the exported values *other* to *values*.
+        '''
+        for key, value in other.items():
+            values[key] = values.get(key, 0) + value
+
+    def samples(self, values=None):
+        '''
+        Returns the lines of the metric in the text format.
+
+        :param values: Exported values to render instead of the own values.
+        '''
+        values = sorted((self.export() if values is None else values).items())
+        return ["%s%s %s" % (self.name, _format_labels(self.labelnames, key), _format_value(value))
+                for key, value in values]
+
+
+class Histogram(object):
+    '''
+    A histogram of observed values, with the count and the sum of the
+    observations, for every combination of label values.
+
+    :param str name: Name of the metric.
+    :param str description: Help text of the metric.
+    :param labelnames: Names of the labels.
+    :param buckets: Sorted upper bounds of the buckets. The +Inf bucket is
+        added automatically.
+    '''
+    kind = "histogram"
+
+    def __init__(self, name, description, labelnames=(), buckets=LATENCY_BUCKETS):
+        super(Histogram, self).__init__()
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._lock = threading.Lock()
+        # label values -> [bucket counts, sum]
+        self._values = {}
+
+    def observe(self, value, **labels):
+        '''
+        Records an observation for the given label values.
+        '''
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def count(self, **labels):
+        '''
+        Returns the number of observations of the given label values.
+        '''
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            return sum(entry[0]) if entry else 0
+
+    def total(self, **labels):
+        '''
+        Returns the sum of the observations of the given label values.
+        '''
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            return entry[1] if entry else 0
+
+    def export(self):
+        '''
+        Returns a copy of the values: [bucket counts, sum] by the tuples of
+        label values.
+        '''
+        with self._lock:
+            return {key: [list(counts), total] for key, (counts, total) in self._values.items()}
+
+    @staticmethod
+    def merge(values, other):
+        '''
+        Adds the exported values *other* to *values*.
+        '''
+        for key, (counts, total) in other.items():
+            entry = values.get(key)
+            if entry is None:
+                values[key] = [list(counts), total]
+            else:
+                entry[0] = [mine + theirs for mine, theirs in zip(entry[0], counts)]
+                entry[1] += total
+
+    def samples(self, values=None):
+        '''
+        Returns the lines of the metric in the text format. The buckets
+        are cumulative.
+
+        :param values: Exported values to render instead of the own values.
+        '''
+        values = sorted((self.export() if values is None else values).items())
+        lines = []
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append("%s_bucket%s %d" % (self.name, labels, cumulative))
+            labels = _format_labels(self.labelnames, key)
+            lines.append("%s_sum%s %s" % (self.name, labels, _format_value(total)))
+            lines.append("%s_count%s %d" % (self.name, labels, cumulative))
+        return lines
+
+
+class Registry(object):
+    '''
+    A collection of metrics rendered together.
+    '''
+    def __init__(self):
+        super(Registry, self).__init__()
+        self.metrics = []
+        self.directory = None
+        self.interval = MULTIPROCESS_WRITE_INTERVAL
+        self._writer_pid = None
+        self._write_lock = threading.Lock()
+
+    def register(self, metric):
+        '''
+        Adds a metric to the registry and returns it.
+        '''
+        self.metrics.append(metric)
+        return metric
+
+    def enable_multiprocess(self, directory, interval=MULTIPROCESS_WRITE_INTERVAL):
+        '''
+        Shares the metrics of the worker processes through *directory*.
+        Every process writes its values to ``<pid>.json`` there every
+        *interval* seconds, and :py:meth:`render` adds up all the files.
+        The directory must be empty when the server starts.
+        '''
+        self.directory = directory
+        self.interval = interval
+
+    def start_writer(self):
+        '''
+        Starts the thread writing the metrics of this process, once in
+        every process. Called on every request, because the workers are
+        forked after the registry has been set up.
+        '''
+        if self.directory is None or self._writer_pid == os.getpid():
+            return
+        with self._write_lock:
+            if self._writer_pid == os.getpid():
+                return
+            self._writer_pid = os.getpid()
+            writer = threading.Thread(target=self._write_periodically, name="metrics-writer")
+            writer.daemon = True
+            writer.start()
+
+    def _write_periodically(self):
+        while True:
+            time.sleep(self.interval)
+            self.write()
+
+    def write(self):
+        '''
+        Writes the values of this process to the shared directory. The file
+        is replaced atomically, so a reader never sees it half written.
+        '''
+        if self.directory is None:
+            return
+        values = {metric.name: [[list(key), value] for key, value in metric.export().items()]
+                  for metric in self.metrics}
+        path = os.path.join(self.directory, "%d.json" % os.getpid())
+        with self._write_lock:
+            try:
+                with open(path + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump(values, f)
+                os.replace(path + ".tmp", path)
+            except OSError as e:
+                print("Error %s:" % e.args[-1])
+
+    def collect(self):
+        '''
+        Returns the exported values of every metric, added up over the
+        files of all the processes, by metric name.
+        '''
+        if self.directory is None:
+            return {metric.name: metric.export() for metric in self.metrics}
+        # Only the files are read, so a value never goes back to an older one
+        self.write()
+        collected = {metric.name: {} for metric in self.metrics}
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                    values = json.load(f)
+            except (OSError, ValueError) as e:
+                print("Error %s:" % e.args[-1])
+                continue
+            for metric in self.metrics:
+                metric.merge(collected[metric.name],
+                             {tuple(key): value for key, value in values.get(metric.name, ())})
+        return collected
+
+    def render(self):
+        '''
+        Returns all the metrics in the Prometheus text exposition format.
+        '''
+        collected = self.collect()
+        lines = []
+        for metric in self.metrics:
+            lines.append("# HELP %s %s" % (metric.name, metric.description))
+            lines.append("# TYPE %s %s" % (metric.name, metric.kind))
+            lines.extend(metric.samples(collected[metric.name]))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_LABELS = ("endpoint", "method")
+
+REQUESTS = REGISTRY.register(Counter(
+    "battleship_requests_total",
+    "Requests served, by endpoint, method and status code.",
+    REQUEST_LABELS + ("status",)))
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    "battleship_request_duration_seconds",
+    "Time spent serving a request, including a streamed body.",
+    REQUEST_LABELS))
+REQUEST_STATEMENTS = REGISTRY.register(Histogram(
+    "battleship_request_sql_statements",
+    "SQL statements executed per request, including BEGIN and COMMIT.",
+    REQUEST_LABELS, buckets=COUNT_BUCKETS))
+REQUEST_COMMITS = REGISTRY.register(Histogram(
+    "battleship_request_sql_commits",
+    "Transactions commited per request.",
+    REQUEST_LABELS, buckets=COUNT_BUCKETS))
+REQUEST_SQL_TIME = REGISTRY.register(Histogram(
+    "battleship_request_sql_duration_seconds",
+    "Time spent in sqlite per request.",
+    REQUEST_LABELS))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "battleship_cache_lookups_total",
+    "Lookups of the game and player row cache, by cached row and hit or miss.",
+    ("cache", "result")))
+GAMESTATE_WRITE_FAILURES = REGISTRY.register(Counter(
+    "battleship_gamestate_write_failures_total",
+    "Shots of the in-memory games which could not be written, retried or lost.",
+    ("result",)))
+
+
+def observe_request(endpoint, method, status, seconds, stats):
+    '''
+    Records a finished request.
+
+    :param str endpoint: The endpoint which served the request.
+    :param str method: The HTTP method.
+    :param int status: The status code of the response.
+    :param float seconds: The duration of the request.
+    :param stats: The :py:class:`battleship.database.QueryStats` of the
+        connection of the request, or None if it utilized no connection.
+    '''
+    REGISTRY.start_writer()
+    REQUESTS.inc(endpoint=endpoint, method=method, status=status)
+    REQUEST_LATENCY.observe(seconds, endpoint=endpoint, method=method)
+    if stats is not None:
+        REQUEST_STATEMENTS.observe(stats.statements, endpoint=endpoint, method=method)
+        REQUEST_COMMITS.observe(stats.commits, endpoint=endpoint, method=method)
+        REQUEST_SQL_TIME.observe(stats.seconds, endpoint=endpoint, method=method)
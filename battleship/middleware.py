@@ -0,0 +1,180 @@
+'''
+Created on 17.10.2026
+
+WSGI middleware wrapped around the Battleship application in main.py.
+
+Programmable Web Project course work by:
+
+@author: arttu
+@author: niko
+@author: timo
+'''
+
+import re
+import zlib
+
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_accept_header
+
+# Responses smaller than this many bytes are sent uncompressed
+COMPRESS_MIN_SIZE = 500
+# zlib compression level, from 1 (fastest) to 9 (smallest)
+COMPRESS_LEVEL = 6
+
+# Content codings in the order of preference, with their zlib window bits
+ENCODINGS = (
+    ("gzip", 16 + zlib.MAX_WBITS),
+    ("deflate", zlib.MAX_WBITS),
+)
+
+# Media types worth compressing. Event streams are left alone, because
+# every event must reach the client as soon as it is written.
+COMPRESSIBLE_TYPES = (
+    "application/vnd.mason+json",
+    "application/json",
+    "application/schema+json",
+    "application/javascript",
+    "text/html",
+    "text/css",
+    "text/plain",
+)
+
+
+class CompressionMiddleware(object):
+    '''
+    Compresses the responses of a WSGI application with gzip or deflate,
+    as negotiated with the Accept-Encoding header of the request.
+
+    Only the media types of :py:data:`COMPRESSIBLE_TYPES` are compressed,
+    and only if the body has at least *min_size* bytes. A streamed response
+    without Content-Length is compressed chunk by chunk, and every chunk is
+    flushed to the client as it is produced.
+
+    A compressed representation gets an ETag of its own: the name of the
+    encoding is appended to the ETag of the application, and removed again
+    from If-None-Match before the application sees it.
+
+    :param app: The WSGI application to wrap.
+    :param int min_size: Smallest body in bytes which is compressed.
+    :param int level: zlib compression level, from 1 to 9.
+    '''
+    def __init__(self, app, min_size=COMPRESS_MIN_SIZE, level=COMPRESS_LEVEL):
+        super(CompressionMiddleware, self).__init__()
+        if not 1 <= level <= 9:
+            raise ValueError("level must be between 1 and 9")
+        self.app = app
+        self.min_size = min_size
+        self.level = level
+
+    def __call__(self, environ, start_response):
+        encoding = self.negotiate(environ.get("HTTP_ACCEPT_ENCODING"))
+        if encoding is None:
+            return self.app(environ, start_response)
+        name, wbits = encoding
+        # The client may hold a compressed representation
+        if_none_match = environ.get("HTTP_IF_NONE_MATCH")
+        revalidating = False
+        if if_none_match:
+            stripped = re.sub(r'-%s"' % name, '"', if_none_match)
+            revalidating = stripped != if_none_match
+            environ["HTTP_IF_NONE_MATCH"] = stripped
+
+        response = {}
+        def capture(status, headers, exc_info=None):
+            response["status"] = status
+            response["headers"] = headers
+            response["exc_info"] = exc_info
+        app_iter = self.app(environ, capture)
+
+        status = response["status"]
+        headers = Headers(response["headers"])
+        code = int(status.split(None, 1)[0])
+        if code == 304:
+            # A 304 has no Content-Type: it stands for the cached representation
+            if revalidating:
+                tag_etag(headers, name)
+                add_vary(headers, "Accept-Encoding")
+            start_response(status, headers.to_wsgi_list(), response["exc_info"])
+            return app_iter
+        mimetype = headers.get("Content-Type", "").split(";")[0].strip()
+        if mimetype not in COMPRESSIBLE_TYPES:
+            start_response(status, response["headers"], response["exc_info"])
+            return app_iter
+        add_vary(headers, "Accept-Encoding")
+
+        length = headers.get("Content-Length", type=int)
+        compress = code not in (204, 206) \
+            and environ.get("REQUEST_METHOD") != "HEAD" \
+            and "Content-Encoding" not in headers \
+            and (length is None or length >= self.min_size)
+        if not compress:
+            start_response(status, headers.to_wsgi_list(), response["exc_info"])
+            return app_iter
+
+        tag_etag(headers, name)
+        headers["Content-Encoding"] = name
+        if length is None:
+            start_response(status, headers.to_wsgi_list(), response["exc_info"])
+            return self.compress_stream(app_iter, wbits)
+
+        #The whole body is known: compress it at once
+        try:
+            body = b"".join(app_iter)
+        finally:
+            if hasattr(app_iter, "close"):
+                app_iter.close()
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, wbits)
+        data = compressor.compress(body) + compressor.flush()
+        headers["Content-Length"] = str(len(data))
+        start_response(status, headers.to_wsgi_list(), response["exc_info"])
+        return [data]
+
+    def compress_stream(self, app_iter, wbits):
+        '''
+        Compresses the chunks of a streamed body as they are produced.
+        '''
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, wbits)
+        try:
+            for chunk in app_iter:
+                if chunk:
+                    yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            yield compressor.flush()
+        finally:
+            # Lets the application tear down its request
+            if hasattr(app_iter, "close"):
+                app_iter.close()
+
+    @staticmethod
+    def negotiate(accept_encoding):
+        '''
+        Picks the content coding of the response.
+
+        :param str accept_encoding: The Accept-Encoding header of the request.
+        :return: A tuple (name, wbits) of :py:data:`ENCODINGS`, or None if
+            the response is sent uncompressed.
+        '''
+        if not accept_encoding:
+            return None
+        best = parse_accept_header(accept_encoding).best_match([name for name, _ in ENCODINGS])
+        for encoding in ENCODINGS:
+            if encoding[0] == best:
+                return encoding
+        return None
+
+
+def add_vary(headers, field):
+    '''
+    Adds a header field to the Vary header, keeping the existing fields.
+    '''
+    vary = [value.strip() for value in headers.get("Vary", "").split(",") if value.strip()]
+    if field not in vary:
+        vary.append(field)
+    headers["Vary"] = ", ".join(vary)
+
+def tag_etag(headers, encoding):
+    '''
+    Appends the name of a content coding to the ETag of a response.
+    '''
+    etag = headers.get("ETag")
+    if etag and etag.endswith('"'):
+        headers["ETag"] = etag[:-1] + "-" + encoding + '"'
@@ -6,22 +6,43 @@ Modified on 06.04.2018
 @author: niko
 '''
 import json
+import math
+import re
+import time
 
+from functools import wraps
 from urllib.parse import unquote
 
-from flask import Flask, request, Response, g, _request_ctx_stack, redirect, send_from_directory
+from flask import Flask, request, Response, g, _request_ctx_stack, redirect, send_from_directory, stream_with_context
 from flask_restful import Resource, Api, abort
 from werkzeug.exceptions import NotFound,  UnsupportedMediaType
+from werkzeug.http import parse_options_header
+from werkzeug.urls import url_quote
+
+try:
+    import msgpack
+except ImportError:
+    # The binary encoding is optional, JSON is used without it
+    msgpack = None
 
 from battleship.utils import RegexConverter
 from battleship import database
+from battleship import events
+from battleship import metrics
 
 MASON = "application/vnd.mason+json"
 JSON = "application/json"
+MSGPACK = "application/msgpack"
+MSGPACK_TYPES = (MSGPACK, "application/x-msgpack")
+LEAN_PROFILE = "lean"
+LEAN = JSON+";profile="+LEAN_PROFILE
+EVENT_STREAM = "text/event-stream"
 BATTLESHIP_GAME_PROFILE = "/profiles/game-profile/"
 BATTLESHIP_PLAYER_PROFILE = "/profiles/player-profile/"
 BATTLESHIP_SHIP_PROFILE = "/profiles/ship-profile/"
 BATTLESHIP_SHOT_PROFILE = "/profiles/shot-profile/"
+BATTLESHIP_STATE_PROFILE = "/profiles/state-profile/"
+BATTLESHIP_TURN_PROFILE = "/profiles/turn-profile/"
 ERROR_PROFILE = "/profiles/error-profile/"
 
 APIARY_PROJECT = "https://battleship.docs.apiary.io"
@@ -30,15 +51,90 @@ APIARY_RELS_URL = APIARY_PROJECT+"/#reference/link-relations/"
 
 LINK_RELATIONS_URL = "/battleship/link-relations/"
 
+# Longest time in seconds a request waits for the turn of a player
+MAX_TURN_WAIT = 60
+# Seconds between keep-alive comments in an idle event stream
+SSE_KEEPALIVE = 15
+# Number of games on a page of Games and History, and the largest allowed
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# Number of items serialized into one chunk of a streamed collection
+STREAM_CHUNK_ITEMS = 100
+# Number of cells of the longest ship which can be placed
+MAX_SHIP_LENGTH = 5
+
 app = Flask(__name__, static_folder="static", static_url_path="/.")
-app.debug = True
-app.config.update({"Engine": database.Engine()})
+# Debug mode is switched on by the development server in main.py.
+# TURN_POLL_INTERVAL is the longest time in seconds a waiting Turn request
+# trusts the in-process notifier. When several worker processes share the
+# database, a shot fired in another process is only seen by polling.
+# GameStore is an optional gamestate.GameStateStore serving the active games
+# from memory.
+# EVENT_RESUME tells whether Last-Event-ID can be trusted. The event ids
+# are numbered by every worker process on its own, so with several workers
+# a resumed stream starts with a reset event instead.
+app.config.update({"Engine": database.Engine(), "TURN_POLL_INTERVAL": None, "GameStore": None,
+                   "EVENT_RESUME": True})
 api = Api(app)
 
+# Variables of a route rule, e.g. <gameid> or <int:gameid>
+URL_VARIABLE = re.compile(r"<(?:[^<>:]+:)?([^<>]+)>")
+
+class _UrlValues(dict):
+    '''
+    Values of url_template. Keeps the missing variables as placeholders.
+    '''
+    def __missing__(self, key):
+        return "{%s}" % key
+
 class MasonObject(dict):
     '''
     Parent class for resources. Adds attributes.
+
+    Collections with many items build the item controls with
+    :py:meth:`url_template` and shared control blocks instead of
+    :py:meth:`add_control` and api.url_for. The url templates are compiled
+    once from the url map with :py:meth:`compile_url_templates`, so an item
+    url costs one string substitution. Shared control blocks are never
+    modified after they are created.
     '''
+    # Format strings of the endpoint urls, e.g. "/battleship/api/games/{gameid}/"
+    url_templates = {}
+
+    @classmethod
+    def compile_url_templates(cls, url_map):
+        '''
+        Converts the rules of a url map into format strings.
+        '''
+        for rule in url_map.iter_rules():
+            cls.url_templates[rule.endpoint] = URL_VARIABLE.sub(r"{\1}", rule.rule)
+
+    @classmethod
+    def url_template(cls, endpoint, **values):
+        '''
+        Fills in the given variables of the url template of an endpoint.
+        The other variables are left in place, to be filled in per item
+        with str.format.
+
+        :Example:
+
+        >>> player_url = MasonObject.url_template("player", gameid=0)
+        >>> player_url.format(playerid=1)
+        '/battleship/api/games/0/players/1/'
+        '''
+        for name, value in values.items():
+            if not isinstance(value, int):
+                values[name] = url_quote(value, safe="")
+        return request.script_root + cls.url_templates[endpoint].format_map(_UrlValues(values))
+
+    @classmethod
+    def url(cls, endpoint, **values):
+        '''
+        Builds the url of an endpoint from its compiled template.
+        Gives the same result as api.url_for without query parameters.
+        '''
+        return cls.url_template(endpoint, **values)
+
     def add_error(self, title, details):
         self["@error"] = {
             "@message": title,
@@ -91,14 +187,14 @@ class MasonObject(dict):
             "method": "DELETE"
         }
 
-    def _game_schema(self):
-        schema = {
-            "x_size": "Number of columns on the map",
-            "y_size": "Number of rows on the map",
-            "turn_length": "Time in seconds players have to play one turn"
-        }
+    GAME_SCHEMA = {
+        "x_size": "Number of columns on the map",
+        "y_size": "Number of rows on the map",
+        "turn_length": "Time in seconds players have to play one turn"
+    }
 
-        return schema
+    def _game_schema(self):
+        return self.GAME_SCHEMA
 
     def add_control_create_player(self, gameid):
         if "@controls" not in self:
@@ -122,12 +218,12 @@ class MasonObject(dict):
             "method": "DELETE"
         }
 
-    def _player_schema(self):
-        schema = {
-            "nickname": "Player's name. Defaults to Anonymous Landlubber, if missing."
-        }
+    PLAYER_SCHEMA = {
+        "nickname": "Player's name. Defaults to Anonymous Landlubber, if missing."
+    }
 
-        return schema
+    def _player_schema(self):
+        return self.PLAYER_SCHEMA
 
     def add_control_place_ship(self, gameid):
         if "@controls" not in self:
@@ -141,17 +237,17 @@ class MasonObject(dict):
             "schema": self._ship_schema()
         }
 
-    def _ship_schema(self):
-        schema = {
-            "playerid": "ID of the player who owns the ship",
-            "stern_x": "Column of ships stern.",
-            "stern_y": "Row of ships stern.",
-            "bow_x": "Column of ships bow.",
-            "bow_y": "Row of ships bow.",
-            "ship_type": "Ship type can be defined by the application."
-        }
+    SHIP_SCHEMA = {
+        "playerid": "ID of the player who owns the ship",
+        "stern_x": "Column of ships stern.",
+        "stern_y": "Row of ships stern.",
+        "bow_x": "Column of ships bow.",
+        "bow_y": "Row of ships bow.",
+        "ship_type": "Ship type can be defined by the application."
+    }
 
-        return schema
+    def _ship_schema(self):
+        return self.SHIP_SCHEMA
 
     def add_control_fire_shot(self, gameid):
         if "@controls" not in self:
@@ -165,15 +261,27 @@ class MasonObject(dict):
             "schema": self._shot_schema()
         }
 
+    SHOT_SCHEMA = {
+        "playerid": "Player who is firing.",
+        "x": "Column where shot is fired.",
+        "y": "Row where shot is fired.",
+        "shot_type": "Shot type can be defined by the application."
+    }
+
     def _shot_schema(self):
-        schema = {
-            "playerid": "Player who is firing.",
-            "x": "Column where shot is fired.",
-            "y": "Row where shot is fired.",
-            "shot_type": "Shot type can be defined by the application."
-        }
+        return self.SHOT_SCHEMA
+
+# Fields of the collection items in the lean representation
+GAME_FIELDS = ("id", "start_time", "end_time", "x_size", "y_size", "turn_length", "winner")
+PLAYER_FIELDS = ("id", "nickname")
+SHIP_FIELDS = ("id", "player", "stern_x", "stern_y", "bow_x", "bow_y", "ship_type")
+SHOT_FIELDS = ("turn", "player", "x", "y", "shot_type", "result")
 
-        return schema
+# Shared profile controls of the collection items
+GAME_PROFILE_CONTROL = {"href": BATTLESHIP_GAME_PROFILE}
+PLAYER_PROFILE_CONTROL = {"href": BATTLESHIP_PLAYER_PROFILE}
+SHIP_PROFILE_CONTROL = {"href": BATTLESHIP_SHIP_PROFILE}
+SHOT_PROFILE_CONTROL = {"href": BATTLESHIP_SHOT_PROFILE}
 
 # ERROR HANDLERS
 def create_error_response(status_code, title, message=None):
@@ -203,13 +311,244 @@ def unknown_error(error):
 
 @app.before_request
 def connect_db():
-    g.con = app.config["Engine"].connect()
+    g.request_start = time.perf_counter()
+    g.con = app.config["Engine"].acquire()
+    # Count only the statements of this request
+    g.con.stats.reset()
 
 # HOOKS
+@app.after_request
+def remember_status(response):
+    g.status = response.status_code
+    return response
+
 @app.teardown_request
 def close_connection(exc):
+    if hasattr(g, "request_start"):
+        # A streamed body has been sent by now
+        endpoint = request.url_rule.endpoint if request.url_rule else "unmatched"
+        status = g.get("status", 500 if exc is not None else 200)
+        metrics.observe_request(endpoint, request.method, status,
+            time.perf_counter() - g.request_start, g.con.stats if hasattr(g, "con") else None)
     if hasattr(g, "con"):
-        g.con.close()
+        app.config["Engine"].release(g.con)
+
+def game_etag(method):
+    '''
+    Decorator for the GET methods of game scoped resources. The version of
+    the game is sent as a strong ETag. If the ETag matches If-None-Match,
+    304 Not Modified is returned after a single lookup of the version,
+    without running the method.
+    '''
+    @wraps(method)
+    def wrapper(self, gameid, **kwargs):
+        store = app.config["GameStore"]
+        state = store.peek(gameid) if store is not None else None
+        version = state.version if state is not None else g.con.get_game_version(gameid)
+        if version is None:
+            # The method reports the missing game
+            return method(self, gameid=gameid, **kwargs)
+        etag = "%s-%s" % (gameid, version)
+        # Every representation has its own strong ETag
+        if lean_requested():
+            etag += "-" + LEAN_PROFILE
+        if msgpack_requested():
+            etag += "-msgpack"
+        if stream_requested():
+            etag += "-stream"
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = method(self, gameid=gameid, **kwargs)
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        response.vary.add("Accept")
+        return response
+    return wrapper
+
+def lean_requested():
+    '''
+    Tells whether the client asked for the lean representation, with
+    ?lean=1 or with Accept: application/json; profile=lean.
+    The lean representation has no hypermedia controls or namespaces.
+    '''
+    if request.args.get("lean") in ("1", "true"):
+        return True
+    for value, quality in request.accept_mimetypes:
+        mimetype, options = parse_options_header(value)
+        if (mimetype == JSON or mimetype in MSGPACK_TYPES) \
+                and options.get("profile") == LEAN_PROFILE and quality > 0:
+            return True
+    return False
+
+def msgpack_requested():
+    '''
+    Tells whether the response is encoded with MessagePack: the client
+    prefers application/msgpack over the JSON types in Accept, and the
+    msgpack package is installed.
+    '''
+    if msgpack is None:
+        return False
+    # On a tie the first type wins, so */* keeps getting JSON
+    best = request.accept_mimetypes.best_match((MASON, JSON) + MSGPACK_TYPES)
+    return best in MSGPACK_TYPES
+
+def hot_game(gameid):
+    '''
+    Returns the in-memory state of an active game from the GameStore,
+    reading it from the database if it is not in memory yet. Returns None
+    without a GameStore, or if the game does not exist or has ended: the
+    caller reads the database then.
+    '''
+    store = app.config["GameStore"]
+    if store is None:
+        return None
+    return store.get(gameid, g.con)
+
+def release_game(gameid):
+    '''
+    Writes the pending shots of a game and drops it from the GameStore.
+    Called before a game is modified through the database.
+    '''
+    store = app.config["GameStore"]
+    if store is not None:
+        store.release(gameid)
+
+def stream_requested():
+    '''
+    Tells whether a collection is streamed, with ?stream=1. Only the Mason
+    representation in JSON is streamed: the lean and MessagePack
+    representations are built in memory as before.
+    '''
+    return request.args.get("stream") in ("1", "true") \
+        and not lean_requested() and not msgpack_requested()
+
+def streamed_collection(items, finish, profile):
+    '''
+    Returns a response which serializes a collection envelope while the
+    items are read from the database, so the whole collection is never held
+    in memory. The items come first in the body; *finish* is called with the
+    last item (None if there were no items) and returns the rest of the
+    envelope, such as the namespaces and the controls.
+
+    :param items: An iterable of the item dictionaries.
+    :param finish: A function returning the envelope without the items.
+    :param str profile: The profile of the Mason media type.
+    '''
+    def generate():
+        yield '{"items": ['
+        last = None
+        batch = []
+        for item in items:
+            if last is not None:
+                batch.append(",")
+            batch.append(json.dumps(item))
+            last = item
+            if len(batch) >= STREAM_CHUNK_ITEMS:
+                yield "".join(batch)
+                batch = []
+        if batch:
+            yield "".join(batch)
+        tail = finish(last)
+        if tail:
+            yield "], " + json.dumps(tail)[1:]
+        else:
+            yield "]}"
+    # The request context, and g.con with it, lives until the last chunk
+    return Response(stream_with_context(generate()), 200, mimetype=MASON+";"+profile)
+
+def encoded_response(body, mimetype, status):
+    '''
+    Encodes a body as JSON, or as MessagePack if the client asked for it.
+    The MessagePack media type keeps the parameters of *mimetype*.
+    '''
+    if msgpack_requested():
+        params = mimetype.partition(";")[2]
+        data = msgpack.packb(body, use_bin_type=True)
+        mimetype = MSGPACK+";"+params if params else MSGPACK
+    else:
+        data = json.dumps(body)
+    response = Response(data, status, mimetype=mimetype)
+    response.vary.add("Accept")
+    return response
+
+def mason_response(envelope, profile, status=200):
+    '''
+    Serializes an envelope into a response. For a lean request the
+    hypermedia keys of the envelope are left out.
+    '''
+    if lean_requested():
+        return lean_response({key: value for key, value in envelope.items() if key[0] != "@"}, status)
+    return encoded_response(envelope, MASON+";"+profile, status)
+
+def lean_response(body, status=200):
+    '''
+    Serializes a lean representation into a response.
+    '''
+    return encoded_response(body, LEAN, status)
+
+def lean_collection(fields, rows, **cursors):
+    '''
+    Builds the lean representation of a collection: the names of the fields
+    once, and every row as an array of the values in the same order.
+    '''
+    body = {"fields": fields, "items": [[row[field] for field in fields] for row in rows]}
+    body.update(cursors)
+    return body
+
+def page_arguments():
+    '''
+    Reads the keyset pagination query parameters limit and after.
+
+    :return: A tuple (limit, after). after is None on the first page.
+    :raises ValueError: If the parameters are not numbers or limit is
+        not between 1 and MAX_PAGE_SIZE.
+    '''
+    limit = int(request.args.get("limit", DEFAULT_PAGE_SIZE))
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        raise ValueError("limit out of range")
+    after = request.args.get("after")
+    if after is not None:
+        after = int(after)
+    return limit, after
+
+def add_game_items(envelope, resource, games_db, limit, after):
+    '''
+    Adds a page of games to a collection envelope, with the self control and
+    the next control pointing to the following page, if there is one.
+    games_db holds up to limit + 1 games: the extra game only tells that
+    there is a next page.
+    '''
+    page = {}
+    if "limit" in request.args:
+        page["limit"] = limit
+    if after is not None:
+        page["after"] = after
+    envelope.add_control("self", href=api.url_for(resource, **page))
+    if len(games_db) > limit:
+        games_db = games_db[:limit]
+        page["after"] = games_db[-1]["id"]
+        envelope.add_control("next", href=api.url_for(resource, **page))
+
+    items = envelope["items"] = []
+    game_url = MasonObject.url_template("game")
+
+    for game in games_db:
+        item = MasonObject(id=game["id"])
+        item["@controls"] = {
+            "self": {"href": game_url.format(gameid=game["id"])},
+            "profile": GAME_PROFILE_CONTROL
+        }
+        items.append(item)
+
+def lean_games_page(games_db, limit):
+    '''
+    Returns a page of games in the lean representation. after is the
+    cursor of the next page, None on the last page.
+    '''
+    after = games_db[limit - 1]["id"] if len(games_db) > limit else None
+    return lean_response(lean_collection(GAME_FIELDS, games_db[:limit], after=after))
 
 # RESOURCES
 class Games(Resource):
@@ -218,34 +557,39 @@ class Games(Resource):
     '''
     def get(self):
         '''
-        Get all Games which have not ended.
+        Get the Games which have not ended, one page at a time in id order.
 
-        INPUT PARAMETERS:
-            None
+        QUERY PARAMETERS:
+            :param int limit: Number of games on the page, DEFAULT_PAGE_SIZE by default.
+            :param int after: Return the games after this game id.
 
         RESPONSE ENTITY BODY:
             * Media type: Mason
             https://github.com/JornWildt/Mason
             * Profile: Battleship_Game
             /profiles/game-profile
+            The control next points to the next page, if there is one.
+
+        RESPONSE STATUS CODE
+            * Return status code 200 if the games were retrieved succesfully.
+            * Return status code 400 if limit or after is not valid.
         '''
-        games_db = g.con.get_games()
+        try:
+            limit, after = page_arguments()
+        except ValueError:
+            return create_error_response(400, "Wrong request format",
+                "limit must be between 1 and %d and after must be a number!" % MAX_PAGE_SIZE)
+
+        games_db = g.con.get_active_games(limit=limit + 1, after_id=after)
+        if lean_requested():
+            return lean_games_page(games_db, limit)
 
         envelope = MasonObject()
         envelope.add_namespace("battleship", LINK_RELATIONS_URL)
-        envelope.add_control("self", href=api.url_for(Games))
+        add_game_items(envelope, Games, games_db, limit, after)
         envelope.add_control_create_game()
 
-        items = envelope["items"] = []
-
-        for game in games_db:
-            if game["end_time"] == None:
-                item = MasonObject(id=game["id"])
-                item.add_control("self", href=api.url_for(Game, gameid=game["id"]))
-                item.add_control("profile", href=BATTLESHIP_GAME_PROFILE)
-                items.append(item)
-
-        return Response(json.dumps(envelope), 200, mimetype=MASON+";"+BATTLESHIP_GAME_PROFILE)
+        return mason_response(envelope, BATTLESHIP_GAME_PROFILE)
 
     def post(self):
         '''
@@ -300,9 +644,11 @@ class Game(Resource):
     '''
     Game resource implementation.
     '''
+    @game_etag
     def get(self, gameid):
         '''
-        Get id, start time, end time, map size and turn length of a single game.
+        Get id, start time, end time, map size, turn length and winner of a single game.
+        The server ends the game and sets the winner when only one player has ships afloat.
 
         INPUT PARAMETERS:
             :param int gameid: ID of the game.
@@ -325,7 +671,8 @@ class Game(Resource):
             end_time=game_db["end_time"],
             x_size=game_db["x_size"],
             y_size=game_db["y_size"],
-            turn_length=game_db["turn_length"]
+            turn_length=game_db["turn_length"],
+            winner=game_db["winner"]
         )
         envelope.add_namespace("battleship", LINK_RELATIONS_URL)
         envelope.add_control("profile", href=BATTLESHIP_GAME_PROFILE)
@@ -334,10 +681,11 @@ class Game(Resource):
         envelope.add_control("players", href=api.url_for(Players, gameid=gameid))
         envelope.add_control("shots", href=api.url_for(Shots, gameid=gameid))
         envelope.add_control("ships", href=api.url_for(Ships, gameid=gameid))
+        envelope.add_control("events", href=api.url_for(Events, gameid=gameid))
         envelope.add_control_end_game(gameid=gameid)
         envelope.add_control_delete_game(gameid=gameid)
 
-        return Response(json.dumps(envelope), 200, mimetype=MASON+";"+BATTLESHIP_GAME_PROFILE)
+        return mason_response(envelope, BATTLESHIP_GAME_PROFILE)
 
     def patch(self, gameid):
         '''
@@ -352,14 +700,13 @@ class Game(Resource):
             * Return status code 404 if the game was not found in the database.
             * Return status code 409 if the game has already ended.
         '''
-        game_db = g.con.get_game(gameid)
-
-        if not game_db:
+        if not g.con.exists_game(gameid):
             abort(404, message="Vegetarian! There is no game with id %s!" % gameid,
                 resource_type="Game",
                 resource_url=request.path,
                 resource_id=gameid)
 
+        release_game(gameid)
         if g.con.insert_game_end_time(gameid):
             url = api.url_for(Game, gameid=gameid)
             return Response(status=204)
@@ -380,6 +727,7 @@ class Game(Resource):
             * Return status code 204 if game was deleted succesfully.
             * Return status code 404 if the game was not found in the database.
         '''
+        release_game(gameid)
         if g.con.delete_game(gameid):
             return Response(status=204)
         else:
@@ -391,38 +739,75 @@ class History(Resource):
     '''
     def get(self):
         '''
-        Get IDs of all Games which have ended.
+        Get IDs of the Games which have ended, one page at a time in id order.
 
-        INPUT PARAMETERS:
-            None
+        QUERY PARAMETERS:
+            :param int limit: Number of games on the page, DEFAULT_PAGE_SIZE by default.
+            :param int after: Return the games after this game id.
+            :param bool stream: With 1, every game after the cursor is
+                streamed in one response, and limit is ignored.
 
         RESPONSE ENTITY BODY:
             * Media type: Mason
             https://github.com/JornWildt/Mason
             * Profile: Battleship_History
             /profiles/history-profile
+            The control next points to the next page, if there is one.
+            A streamed response has no next control.
+
+        RESPONSE STATUS CODE
+            * Return status code 200 if the games were retrieved succesfully.
+            * Return status code 400 if limit or after is not valid.
         '''
-        games_db = g.con.get_games()
+        try:
+            limit, after = page_arguments()
+        except ValueError:
+            return create_error_response(400, "Wrong request format",
+                "limit must be between 1 and %d and after must be a number!" % MAX_PAGE_SIZE)
+
+        if stream_requested():
+            return stream_history(after)
+
+        games_db = g.con.get_ended_games(limit=limit + 1, after_id=after)
+        if lean_requested():
+            return lean_games_page(games_db, limit)
 
         envelope = MasonObject()
         envelope.add_namespace("battleship", LINK_RELATIONS_URL)
-        envelope.add_control("self", href=api.url_for(History))
+        add_game_items(envelope, History, games_db, limit, after)
 
-        items = envelope["items"] = []
+        return mason_response(envelope, BATTLESHIP_GAME_PROFILE)
+
+def stream_history(after):
+    '''
+    Streams every ended game after the game id *after* as a History
+    collection.
+    '''
+    game_url = MasonObject.url_template("game")
 
-        for game in games_db:
-            if game["end_time"] != None:
-                item = MasonObject(id=game["id"])
-                item.add_control("self", href=api.url_for(Game, gameid=game["id"]))
-                item.add_control("profile", href=BATTLESHIP_GAME_PROFILE)
-                items.append(item)
+    def items():
+        for game in g.con.iter_ended_games(after_id=after):
+            yield {"id": game["id"], "@controls": {
+                "self": {"href": game_url.format(gameid=game["id"])},
+                "profile": GAME_PROFILE_CONTROL
+            }}
 
-        return Response(json.dumps(envelope), 200, mimetype=MASON+";"+BATTLESHIP_GAME_PROFILE)
+    def finish(last):
+        envelope = MasonObject()
+        envelope.add_namespace("battleship", LINK_RELATIONS_URL)
+        page = {"stream": 1}
+        if after is not None:
+            page["after"] = after
+        envelope.add_control("self", href=api.url_for(History, **page))
+        return envelope
+
+    return streamed_collection(items(), finish, BATTLESHIP_GAME_PROFILE)
 
 class Players(Resource):
     '''
     Player resource implementation.
     '''
+    @game_etag
     def get(self, gameid):
         '''
         Get all Players in a Game.
@@ -443,9 +828,7 @@ class Players(Resource):
             * Profile: Battleship_Player
             /profiles/player-profile
         '''
-        game_db = g.con.get_game(gameid)
-
-        if not game_db:
+        if not g.con.exists_game(gameid):
             abort(404, message="There is no game with id %s" % gameid,
                 resource_type="Game",
                 resource_url=request.path,
@@ -456,6 +839,9 @@ class Players(Resource):
         if players_db is None:
             players_db = []
 
+        if lean_requested():
+            return lean_response(lean_collection(PLAYER_FIELDS, players_db))
+
         envelope = MasonObject()
         envelope.add_namespace("battleship", LINK_RELATIONS_URL)
         envelope.add_control("self", href=api.url_for(Players, gameid=gameid))
@@ -463,6 +849,8 @@ class Players(Resource):
         envelope.add_control_create_player(gameid=gameid)
 
         items = envelope["items"] = []
+        game_control = envelope["@controls"]["game"]
+        player_url = MasonObject.url_template("player", gameid=gameid)
 
         for player in players_db:
             item = MasonObject(
@@ -470,12 +858,14 @@ class Players(Resource):
                 nickname=player["nickname"],
                 game=player["game"]
             )
-            item.add_control("self", href=api.url_for(Player, playerid=player["id"], gameid=gameid))
-            item.add_control("profile", href=BATTLESHIP_PLAYER_PROFILE)
-            item.add_control("game", href=api.url_for(Game, gameid=gameid))
+            item["@controls"] = {
+                "self": {"href": player_url.format(playerid=player["id"])},
+                "profile": PLAYER_PROFILE_CONTROL,
+                "game": game_control
+            }
             items.append(item)
 
-        return Response(json.dumps(envelope), 200, mimetype=MASON+";"+BATTLESHIP_PLAYER_PROFILE)
+        return mason_response(envelope, BATTLESHIP_PLAYER_PROFILE)
     
     def post(self, gameid):
         '''
@@ -529,6 +919,7 @@ class Players(Resource):
         if nickname == "":
             nickname = "Anonymous landlubber"
 
+        release_game(gameid)
         playerid = g.con.create_player(nickname, gameid)
         if playerid is None:
             return create_error_response(500, "Problem with the database",
@@ -541,6 +932,7 @@ class Player(Resource):
     '''
     Player resource iplementation.
     '''
+    @game_etag
     def get(self, playerid, gameid):
         '''
         Get id, nickname of a player.
@@ -572,11 +964,13 @@ class Player(Resource):
         envelope.add_control("profile", href=BATTLESHIP_PLAYER_PROFILE)
         envelope.add_control("collection", href=api.url_for(Players, gameid=gameid))
         envelope.add_control("game", href=api.url_for(Game, gameid=gameid))
+        envelope.add_control("state", href=api.url_for(State, gameid=gameid, player=playerid))
+        envelope.add_control("turn", href=api.url_for(Turn, gameid=gameid, player=playerid, wait=MAX_TURN_WAIT))
         envelope.add_control_delete_player(gameid=gameid, playerid=playerid)
         envelope.add_control_fire_shot(gameid=gameid)
         envelope.add_control_place_ship(gameid=gameid)
 
-        return Response(json.dumps(envelope), 200, mimetype=MASON+";"+BATTLESHIP_PLAYER_PROFILE)
+        return mason_response(envelope, BATTLESHIP_PLAYER_PROFILE)
 
     def delete(self, playerid, gameid):
         '''
@@ -600,6 +994,7 @@ class Player(Resource):
         if game_db["end_time"] != None:
             abort(400, message="Cannot delete player from game that has ended!")
 
+        release_game(gameid)
         if g.con.delete_player(playerid, gameid):
             return Response(status=204)
         else:
@@ -609,6 +1004,7 @@ class Ships(Resource):
     '''
     Ships resource implementation.
     '''
+    @game_etag
     def get(self, gameid):
         '''
         Get list of ships in a game.
@@ -622,9 +1018,7 @@ class Ships(Resource):
             * Return status code 404 if the player or the game was not found in the database
                 or the player has no ships.
         '''
-        game_db = g.con.get_game(gameid)
-
-        if not game_db:
+        if not g.con.exists_game(gameid):
             abort(404, message="There is no game with id %s" % gameid,
                 resource_type="Game",
                 resource_url=request.path,
@@ -635,12 +1029,17 @@ class Ships(Resource):
         if ships_db is None:
             ships_db = []
 
+        if lean_requested():
+            return lean_response(lean_collection(SHIP_FIELDS, ships_db))
+
         envelope = MasonObject()
         envelope.add_namespace("battleship", LINK_RELATIONS_URL)
         envelope.add_control("self", href=api.url_for(Ships, gameid=gameid))
         envelope.add_control("game", href=api.url_for(Game, gameid=gameid))
 
         items = envelope["items"] = []
+        self_control = envelope["@controls"]["self"]
+        player_url = MasonObject.url_template("player", gameid=gameid)
 
         for ship in ships_db:
             item = MasonObject(
@@ -653,17 +1052,20 @@ class Ships(Resource):
                 bow_y=ship["bow_y"],
                 ship_type=ship["ship_type"]
             )
-            item.add_control("self", href=api.url_for(Ships, gameid=gameid))
-            item.add_control("profile", href=BATTLESHIP_SHIP_PROFILE)
-            item.add_control("player", href=api.url_for(Player, gameid=gameid, playerid=ship["player"]))
+            item["@controls"] = {
+                "self": self_control,
+                "profile": SHIP_PROFILE_CONTROL,
+                "player": {"href": player_url.format(playerid=ship["player"])}
+            }
             items.append(item)
 
-        return Response(json.dumps(envelope), 200, mimetype=MASON+";"+BATTLESHIP_SHIP_PROFILE)
+        return mason_response(envelope, BATTLESHIP_SHIP_PROFILE)
 
     def post(self, gameid):
         '''
         Place a ship for a player in a game.
-        TODO add logic to place all / multiple ships etc.
+        The body can also be a JSON array of ships of the same player, which
+        are all placed at once.
 
         INPUT PARAMETERS:
             :param int playerid: Players id.
@@ -677,7 +1079,10 @@ class Ships(Resource):
             * Return status code 204 if ship was created succesfully.
             * Return status code 415 if the request is not JSON or the request format is incorrect.
             * Return status code 402 if the game has ended.
-            * Return status code 400 if parameters are missing.
+            * Return status code 400 if parameters are missing,
+                the ships of an array belong to different players,
+                or a ship is not a straight line of at most MAX_SHIP_LENGTH
+                cells with integer coordinates inside the board.
             * Return status code 500 if the ship could not be created in the database.
         '''
         if JSON != request.headers.get("Content-Type", ""):
@@ -697,39 +1102,120 @@ class Ships(Resource):
         if not request_body:
             return create_error_response(415, "Unsupported Media Type", "Use a JSON compatible format")
 
+        if not isinstance(request_body, list):
+            request_body = [request_body]
+
+        ships = []
         try:
-            playerid=request_body["playerid"]
-            stern_x=request_body["stern_x"]
-            stern_y=request_body["stern_y"]
-            bow_x=request_body["bow_x"]
-            bow_y=request_body["bow_y"]
-            ship_type=request_body["ship_type"]
-        except KeyError:
+            for ship in request_body:
+                ships.append({
+                    "playerid": ship["playerid"],
+                    "stern_x": ship["stern_x"],
+                    "stern_y": ship["stern_y"],
+                    "bow_x": ship["bow_x"],
+                    "bow_y": ship["bow_y"],
+                    "ship_type": ship["ship_type"]
+                })
+        except (KeyError, TypeError):
             return create_error_response(400, "Wrong request format", "Include all parameters in the request!")
 
-        if g.con.create_ship(playerid, gameid, stern_x, stern_y, bow_x, bow_y, ship_type):
+        playerids = set(ship["playerid"] for ship in ships)
+        if len(playerids) != 1:
+            return create_error_response(400, "Wrong request format", "Place ships of one player at a time!")
+
+        #Invalid ships are rejected before the database is locked for writing
+        for ship in ships:
+            error = ship_placement_error(ship, game_db)
+            if error is not None:
+                return create_error_response(400, "Invalid ship position", error)
+
+        release_game(gameid)
+        if g.con.create_ships(playerids.pop(), gameid, ships) is not None:
             return Response(status=204)
         else:
             return create_error_response(500, "Problem with the database",
                 "Thousand thundering typhoons! Cannot access the database!")
 
+def ship_placement_error(ship, game):
+    '''
+    Checks the position of a ship before it is placed.
+
+    :param dict ship: Dictionary with the keys stern_x, stern_y, bow_x and bow_y.
+    :param dict game: The game the ship is placed into.
+    :return: A message telling what is wrong, or None if the ship is valid.
+    '''
+    coordinates = (ship["stern_x"], ship["stern_y"], ship["bow_x"], ship["bow_y"])
+    if not all(isinstance(value, int) and not isinstance(value, bool) for value in coordinates):
+        return "Ship coordinates must be integers!"
+    stern_x, stern_y, bow_x, bow_y = coordinates
+    if not (0 <= stern_x < game["x_size"] and 0 <= bow_x < game["x_size"]
+            and 0 <= stern_y < game["y_size"] and 0 <= bow_y < game["y_size"]):
+        return "Ship must be inside the %sx%s board!" % (game["x_size"], game["y_size"])
+    if stern_x != bow_x and stern_y != bow_y:
+        return "Ship must be a horizontal or vertical line!"
+    if max(abs(stern_x - bow_x), abs(stern_y - bow_y)) + 1 > MAX_SHIP_LENGTH:
+        return "Ship can be at most %d cells long!" % MAX_SHIP_LENGTH
+    return None
+
+def shot_position_error(x, y, game):
+    '''
+    Checks the target of a shot before it is fired.
+
+    :param x: The x-coordinate of the shot.
+    :param y: The y-coordinate of the shot.
+    :param dict game: The game the shot is fired into.
+    :return: A message telling what is wrong, or None if the target is valid.
+    '''
+    if not all(isinstance(value, int) and not isinstance(value, bool) for value in (x, y)):
+        return "Shot coordinates must be integers!"
+    if not (0 <= x < game["x_size"] and 0 <= y < game["y_size"]):
+        return "Shot must be inside the %sx%s board!" % (game["x_size"], game["y_size"])
+    return None
+
 class Shots(Resource):
     '''
     Shots resource implementation.
     '''
+    @game_etag
     def get(self, gameid):
         '''
-        Get list of shots fired in a game.
+        Get list of shots fired in a game, ordered by turn and player.
 
         INPUT PARAMETERS:
             :param int gameid: ID of the game.
 
+        QUERY PARAMETERS:
+            :param int since_turn: Return only the shots of this turn and the turns after it.
+            :param int player: Return only the shots of this player.
+            :param bool stream: With 1, the shots are serialized while they
+                are read from the database. The items come before the controls.
+
+        RESPONSE ENTITY BODY:
+            * Media type: Mason
+                https://github.com/JornWildt/Mason
+            * Profile: Battleship_Shot
+                /profiles/shot-profile
+            The control next points to the shots fired since the latest turn
+            in the response. The latest turn is included again, because the
+            other players may not have fired in it yet.
+
         RESPONSE STATUS CODE
             * Return status code 200 if shots were retrieved succesfully.
-            * Return status code 404 if the game was not found in the database
-                or the game has no shots fired.
+            * Return status code 400 if since_turn or player is not a number.
+            * Return status code 404 if the game was not found in the database.
         '''
-        game_db = g.con.get_game(gameid)
+        try:
+            since_turn = request.args.get("since_turn")
+            if since_turn is not None:
+                since_turn = int(since_turn)
+            playerid = request.args.get("player")
+            if playerid is not None:
+                playerid = int(playerid)
+        except ValueError:
+            return create_error_response(400, "Wrong request format", "since_turn and player must be numbers!")
+
+        state = hot_game(gameid)
+        game_db = state.game if state is not None else g.con.get_game(gameid)
 
         if not game_db:
             abort(404, message="There is no game with id %s" % gameid,
@@ -737,32 +1223,64 @@ class Shots(Resource):
                 resource_url=request.path,
                 resource_id=gameid)
 
-        shots_db = g.con.get_shots(gameid)
+        filters = {}
+        if since_turn is not None:
+            filters["since_turn"] = since_turn
+        if playerid is not None:
+            filters["player"] = playerid
+
+        def shots_envelope(last_shot):
+            envelope = MasonObject()
+            envelope.add_namespace("battleship", LINK_RELATIONS_URL)
+            # The client continues from the latest turn it has seen
+            next_filters = dict(filters)
+            if last_shot is not None:
+                next_filters["since_turn"] = last_shot["turn"]
+            envelope.add_control("self", href=api.url_for(Shots, gameid=gameid, **filters))
+            envelope.add_control("next", href=api.url_for(Shots, gameid=gameid, **next_filters))
+            envelope.add_control("game", href=api.url_for(Game, gameid=gameid))
+            return envelope
+
+        item_controls = {
+            "self": {"href": MasonObject.url("shots", gameid=gameid)},
+            "profile": SHOT_PROFILE_CONTROL
+        }
+
+        def shot_items(shots_db):
+            for shot in shots_db:
+                item = MasonObject(
+                    turn=shot["turn"],
+                    player=shot["player"],
+                    game=shot["game"],
+                    x=shot["x"],
+                    y=shot["y"],
+                    shot_type=shot["shot_type"],
+                    result=shot["result"]
+                )
+                item["@controls"] = item_controls
+                yield item
+
+        if state is not None:
+            shots_db = state.get_shots(since_turn=since_turn, playerid=playerid)
+        elif stream_requested():
+            shots_db = g.con.iter_shots(gameid, since_turn=since_turn, playerid=playerid)
+        else:
+            shots_db = g.con.get_shots(gameid, since_turn=since_turn, playerid=playerid)
+
+        if stream_requested():
+            return streamed_collection(shot_items(shots_db or []), shots_envelope, BATTLESHIP_SHOT_PROFILE)
 
         if shots_db is None:
             shots_db = []
 
-        envelope = MasonObject()
-        envelope.add_namespace("battleship", LINK_RELATIONS_URL)
-        envelope.add_control("self", href=api.url_for(Shots, gameid=gameid))
-        envelope.add_control("game", href=api.url_for(Game, gameid=gameid))
-
-        items = envelope["items"] = []
+        if lean_requested():
+            return lean_response(lean_collection(SHOT_FIELDS, shots_db,
+                since_turn=shots_db[-1]["turn"] if shots_db else since_turn))
 
-        for shot in shots_db:
-            item = MasonObject(
-                turn=shot["turn"],
-                player=shot["player"],
-                game=shot["game"],
-                x=shot["x"],
-                y=shot["y"],
-                shot_type=shot["shot_type"]
-            )
-            item.add_control("self", href=api.url_for(Shots, gameid=gameid))
-            item.add_control("profile", href=BATTLESHIP_SHOT_PROFILE)
-            items.append(item)
+        envelope = shots_envelope(shots_db[-1] if shots_db else None)
+        envelope["items"] = list(shot_items(shots_db))
 
-        return Response(json.dumps(envelope), 200, mimetype=MASON+";"+BATTLESHIP_SHOT_PROFILE)
+        return mason_response(envelope, BATTLESHIP_SHOT_PROFILE)
 
     def post(self, gameid):
         '''
@@ -774,21 +1292,33 @@ class Shots(Resource):
             :param int y: Column where the shot is fired.
             :param str shot_type: Shot type can be used to introduce shot specific gameplay mechanics.
 
+        RESPONSE ENTITY BODY:
+            * Media type: Mason
+                https://github.com/JornWildt/Mason
+            * Profile: Battleship_Shot
+                /profiles/shot-profile
+            The turn of the shot and its result: miss, hit or sunk. The list
+            hits contains the player, the id and the sunk status of every
+            ship hit by the shot. game_over is true if the shot ended the
+            game, and winner is the id of the last player afloat.
+
         RESPONSE STATUS CODE
-            * Return status code 204 if shot was fired succesfully.
+            * Return status code 200 if shot was fired succesfully.
             * Return status code 415 if the request is not JSON or the request format is incorrect.
             * Return status code 404 if the game or player were not found in the database.
             * Return status code 403 if not users turn
             * Return status code 400 if game has ended
             * Return status code 400 if parameters are missing.
+            * Return status code 400 if x or y is not an integer inside the board.
             * Return status code 500 if the shot or turn could not be created in the database.
         '''
         # Check content type
         if JSON != request.headers.get("Content-Type", ""):
             abort(415)
 
-        # Check game exists
-        game_db = g.con.get_game(gameid)
+        # Check game exists. An active game may be served from memory.
+        state = hot_game(gameid)
+        game_db = state.game if state is not None else g.con.get_game(gameid)
         if not game_db:
             abort(404, message="There is no game with id %s" % gameid,
                 resource_type="Game",
@@ -811,8 +1341,16 @@ class Shots(Resource):
         except KeyError:
             return create_error_response(400, "Wrong request format", "Include all parameters in the request!")
 
+        # Check the target is on the board, a stray shot would use up the turn
+        error = shot_position_error(x, y, game_db)
+        if error is not None:
+            return create_error_response(400, "Invalid shot position", error)
+
         # Check player exists
-        player_db = g.con.get_player(playerid, gameid)
+        if state is not None:
+            player_db = state.get_player(playerid)
+        else:
+            player_db = g.con.get_player(playerid, gameid)
         if not player_db:
             abort(404, message="There is no player with id %s" % playerid,
                 resource_type="Player",
@@ -820,46 +1358,312 @@ class Shots(Resource):
                 resource_id=playerid)
 
         # Shoot!
-        latest_turn = g.con.get_current_turn(gameid)
+        outcome = None
+        if state is not None:
+            outcome = app.config["GameStore"].fire_shot(playerid, gameid, x, y, shot_type, g.con)
+        if outcome is None:
+            outcome = g.con.fire_shot(playerid=playerid, gameid=gameid, x=x, y=y, shot_type=shot_type)
+
+        if outcome.status == database.SHOT_NOT_YOUR_TURN: # This player has fired but someone else has not. Wait.
+            return create_error_response(403, "Forbidden", "Not this player's turn.")
+        elif outcome.status == database.SHOT_GAME_ENDED: # Someone else fired the last shot.
+            abort(400, message="Cannot fire shot to game that has ended!")
+        elif outcome.status != database.SHOT_ACCEPTED:
+            return create_error_response(500, "Problem with the database.",
+                "Thousand thundering typhoons! Cannot access the database!")
 
-        if not latest_turn: # No shots have been fired yet in this game.
-            success = g.con.create_turn(turn_number=0, playerid=playerid, gameid=gameid)
-            success = g.con.create_shot(turn=0, playerid=playerid, gameid=gameid, x=x, y=y, shot_type=shot_type) # If create_turn fails, this should fail too.
-            if success:
-                return Response(status=204)
-            else:
-                return create_error_response(500, "Problem with the database.",
-                    "Thousand thundering typhoons! Cannot access the database!")
+        envelope = MasonObject(
+            turn=outcome.turn_number,
+            player=playerid,
+            game=int(gameid),
+            x=x,
+            y=y,
+            shot_type=shot_type,
+            result=outcome.result,
+            hits=outcome.hits,
+            game_over=outcome.game_over,
+            winner=outcome.winner
+        )
+        envelope.add_namespace("battleship", LINK_RELATIONS_URL)
+        envelope.add_control("profile", href=BATTLESHIP_SHOT_PROFILE)
+        envelope.add_control("collection", href=api.url_for(Shots, gameid=gameid))
+        envelope.add_control("game", href=api.url_for(Game, gameid=gameid))
+
+        return mason_response(envelope, BATTLESHIP_SHOT_PROFILE)
+
+class State(Resource):
+    '''
+    Game state resource implementation.
+    '''
+    @game_etag
+    def get(self, gameid):
+        '''
+        Get everything a player needs to play one round of a game.
+
+        INPUT PARAMETERS:
+            :param int gameid: ID of the game.
+
+        QUERY PARAMETERS:
+            :param int player: ID of the player whose view of the game is returned.
+
+        RESPONSE ENTITY BODY:
+            * Media type: Mason
+                https://github.com/JornWildt/Mason
+            * Profile: Battleship_State
+                /profiles/state-profile
+            The game metadata, the players and whether they still have ships
+            afloat, the ships of the player, the shots fired by the player
+            with their results, the shots received by the player, and the
+            turn where the player can fire next.
+
+        RESPONSE STATUS CODE
+            * Return status code 200 if the state was retrieved succesfully.
+            * Return status code 400 if the player query parameter is missing.
+            * Return status code 404 if the game or the player were not found in the database.
+        '''
+        try:
+            playerid = int(request.args["player"])
+        except (KeyError, ValueError):
+            return create_error_response(400, "Wrong request format", "Include the player query parameter!")
+
+        state = hot_game(gameid)
+        if state is not None:
+            snapshot = state.get_game_snapshot()
         else:
-            latest_turn_number = latest_turn[0]['turn_number']
-
-            players_who_have_shot = []
-            for shot in g.con.get_shots_by_turn(gameid=gameid, turn=latest_turn_number):
-                players_who_have_shot.append(shot['player'])
-
-            players_in_game = []
-            for player in g.con.get_players(gameid=gameid):
-                players_in_game.append(player['id'])
-
-            if playerid not in players_who_have_shot: # This player has not fired this turn. Fire this turn.
-                success = g.con.create_turn(turn_number=latest_turn_number, playerid=playerid, gameid=gameid)
-                success = g.con.create_shot(turn=latest_turn_number, playerid=playerid, gameid=gameid, x=x, y=y, shot_type=shot_type)
-                if success:
-                    return Response(status=204)
-                else:
-                    return create_error_response(500, "Problem with the database.",
-                        "Thousand thundering typhoons! Cannot access the database!")
-            elif set(players_who_have_shot) == set(players_in_game): # All players have fired this turn. Create next turn and fire.
-                next_turn_number = latest_turn_number + 1
-                success = g.con.create_turn(turn_number=next_turn_number, playerid=playerid, gameid=gameid)
-                success = g.con.create_shot(turn=next_turn_number, playerid=playerid, gameid=gameid, x=x, y=y, shot_type=shot_type)
-                if success:
-                    return Response(status=204)
-                else:
-                    return create_error_response(500, "Problem with the database.",
-                        "Thousand thundering typhoons! Cannot access the database!")
-            else: # This player has fired but someone else has not. Wait.
-                return create_error_response(403, "Forbidden", "Not this player's turn.")
+            snapshot = g.con.get_game_snapshot(gameid)
+        if snapshot is None:
+            abort(404, message="There is no game with id %s" % gameid,
+                resource_type="Game",
+                resource_url=request.path,
+                resource_id=gameid)
+
+        players = [player["id"] for player in snapshot["players"]]
+        if playerid not in players:
+            abort(404, message="There is no player with id %s" % playerid,
+                resource_type="Player",
+                resource_url=request.path,
+                resource_id=playerid)
+
+        game = snapshot["game"]
+        turn = snapshot["turn"]
+        turn_number = database.next_turn(turn["turn_number"], turn["fired"], players, playerid)
+
+        envelope = MasonObject(
+            game=game,
+            players=[{"id": player["id"],
+                      "nickname": player["nickname"],
+                      "afloat": player["cells_left"] > 0}
+                     for player in snapshot["players"]],
+            ships=[{"id": ship["id"],
+                    "stern_x": ship["stern_x"],
+                    "stern_y": ship["stern_y"],
+                    "bow_x": ship["bow_x"],
+                    "bow_y": ship["bow_y"],
+                    "ship_type": ship["ship_type"]}
+                   for ship in snapshot["ships"] if ship["player"] == playerid],
+            shots=[{"turn": shot["turn"],
+                    "x": shot["x"],
+                    "y": shot["y"],
+                    "shot_type": shot["shot_type"],
+                    "result": shot["result"]}
+                   for shot in snapshot["shots"] if shot["player"] == playerid],
+            shots_received=[{"turn": shot["turn"],
+                             "player": shot["player"],
+                             "x": shot["x"],
+                             "y": shot["y"],
+                             "shot_type": shot["shot_type"]}
+                            for shot in snapshot["shots"] if shot["player"] != playerid],
+            turn={"turn_number": turn_number,
+                  "can_fire": game["end_time"] is None and turn_number is not None}
+        )
+        envelope.add_namespace("battleship", LINK_RELATIONS_URL)
+        envelope.add_control("self", href=api.url_for(State, gameid=gameid, player=playerid))
+        envelope.add_control("profile", href=BATTLESHIP_STATE_PROFILE)
+        envelope.add_control("game", href=api.url_for(Game, gameid=gameid))
+        envelope.add_control("player", href=api.url_for(Player, gameid=gameid, playerid=playerid))
+        if game["end_time"] is None:
+            envelope.add_control_fire_shot(gameid=gameid)
+
+        return mason_response(envelope, BATTLESHIP_STATE_PROFILE)
+
+class Turn(Resource):
+    '''
+    Turn resource implementation.
+    '''
+    def get(self, gameid):
+        '''
+        Get whether a player can fire. With the wait query parameter the
+        request is a long poll: it blocks until the player can fire, the game
+        ends, the timeout expires or the server stops. The waiting request is
+        woken up when a shot is fired or the players of the game change, so
+        the database is not polled while waiting. With several worker processes the turn is
+        read again every TURN_POLL_INTERVAL seconds instead.
+
+        INPUT PARAMETERS:
+            :param int gameid: ID of the game.
+
+        QUERY PARAMETERS:
+            :param int player: ID of the player.
+            :param int wait: Maximum time to wait in seconds, at most
+                MAX_TURN_WAIT. Defaults to 0, which returns immediately.
+
+        RESPONSE ENTITY BODY:
+            * Media type: Mason
+                https://github.com/JornWildt/Mason
+            * Profile: Battleship_Turn
+                /profiles/turn-profile
+            The turn where the player can fire next, whether the player can
+            fire now, and whether the game is over and who won it.
+
+        RESPONSE STATUS CODE
+            * Return status code 200 if the turn status was retrieved succesfully.
+            * Return status code 400 if player is missing or player or wait is not a finite number.
+            * Return status code 404 if the game or the player were not found in the database.
+        '''
+        try:
+            playerid = int(request.args["player"])
+        except (KeyError, ValueError):
+            return create_error_response(400, "Wrong request format", "Include the player query parameter!")
+        try:
+            wait = float(request.args.get("wait", 0))
+        except ValueError:
+            wait = None
+        #NaN passes any clamp, and would wait forever
+        if wait is None or not math.isfinite(wait):
+            return create_error_response(400, "Wrong request format", "wait must be a number of seconds!")
+        wait = min(max(wait, 0), MAX_TURN_WAIT)
+
+        if not g.con.get_player(playerid, gameid):
+            abort(404, message="There is no player with id %s in game %s" % (playerid, gameid),
+                resource_type="Player",
+                resource_url=request.path,
+                resource_id=playerid)
+
+        notifier = app.config["Engine"].notifier
+        poll = app.config["TURN_POLL_INTERVAL"]
+        deadline = time.monotonic() + wait
+        while True:
+            # Read the sequence first, so a shot fired after the read wakes us up
+            sequence = notifier.sequence(gameid)
+            state = hot_game(gameid)
+            if state is not None:
+                status = state.get_turn_status(playerid)
+            else:
+                status = g.con.get_turn_status(playerid, gameid)
+            if status is None:
+                abort(404, message="There is no game with id %s" % gameid,
+                    resource_type="Game",
+                    resource_url=request.path,
+                    resource_id=gameid)
+            remaining = deadline - time.monotonic()
+            if status["can_fire"] or status["end_time"] is not None or remaining <= 0:
+                break
+            if notifier.closed:
+                #The server is stopping
+                break
+            notifier.wait(gameid, sequence, min(remaining, poll) if poll else remaining)
+
+        envelope = MasonObject(
+            turn_number=status["turn_number"],
+            can_fire=status["can_fire"],
+            game_over=status["end_time"] is not None,
+            winner=status["winner"]
+        )
+        envelope.add_namespace("battleship", LINK_RELATIONS_URL)
+        envelope.add_control("self", href=api.url_for(Turn, gameid=gameid, player=playerid))
+        envelope.add_control("profile", href=BATTLESHIP_TURN_PROFILE)
+        envelope.add_control("game", href=api.url_for(Game, gameid=gameid))
+        envelope.add_control("state", href=api.url_for(State, gameid=gameid, player=playerid))
+        if status["can_fire"]:
+            envelope.add_control_fire_shot(gameid=gameid)
+
+        return mason_response(envelope, BATTLESHIP_TURN_PROFILE)
+
+class Events(Resource):
+    '''
+    Game events resource implementation.
+    '''
+    def get(self, gameid):
+        '''
+        Stream the events of a game as Server-Sent Events.
+
+        The events are read from the in-memory buffer of the game, so the
+        stream does not touch the database after the game has been found.
+        The stream ends after the game has ended or has been deleted.
+
+        INPUT PARAMETERS:
+            :param int gameid: ID of the game.
+
+        REQUEST HEADERS:
+            * Last-Event-ID: Resume after this event. Without it the stream
+                starts from the next event. The query parameter last_event_id
+                can be used instead.
+
+        RESPONSE ENTITY BODY:
+            * Media type: text/event-stream
+            Events player-joined, player-left, ships-placed, ship-removed,
+            shot-fired, turn-advanced, game-ended and game-deleted, with the
+            details as JSON data. The id of an event is its sequence number in
+            the game. The event reset is sent if the events after
+            Last-Event-ID are no longer available: the client should read the
+            state of the game again. With several worker processes every
+            resumed stream starts with reset, because the event ids of
+            another worker mean nothing to this one.
+
+        RESPONSE STATUS CODE
+            * Return status code 200 if the stream was opened succesfully.
+            * Return status code 400 if Last-Event-ID is not a number.
+            * Return status code 404 if the game was not found in the database.
+        '''
+        game_db = g.con.get_game(gameid)
+
+        if not game_db:
+            abort(404, message="There is no game with id %s" % gameid,
+                resource_type="Game",
+                resource_url=request.path,
+                resource_id=gameid)
+
+        notifier = app.config["Engine"].notifier
+        last_id = request.headers.get("Last-Event-ID", request.args.get("last_event_id"))
+        reset = last_id is not None and not app.config["EVENT_RESUME"]
+        try:
+            last_id = notifier.sequence(gameid) if last_id is None else int(last_id)
+        except ValueError:
+            return create_error_response(400, "Wrong request format", "Last-Event-ID must be a number!")
+        if reset:
+            #The id may have been given by another worker process
+            last_id = notifier.sequence(gameid)
+
+        stream = event_stream(notifier, gameid, last_id, ended=game_db["end_time"] is not None,
+                              reset=reset)
+        return Response(stream, 200, mimetype=EVENT_STREAM,
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def event_stream(notifier, gameid, last_id, ended=False, reset=False):
+    '''
+    Generates the Server-Sent Events of a game published after *last_id*.
+    A comment is sent every SSE_KEEPALIVE seconds without events. The
+    stream ends when the game ends or the notifier is closed. With *reset*
+    the stream starts with a reset event.
+    '''
+    if reset:
+        yield "id: %d\nevent: reset\ndata: {}\n\n" % last_id
+    while True:
+        game_events, complete = notifier.events_since(gameid, last_id)
+        if not complete:
+            # The client has missed events
+            last_id = game_events[0].id - 1 if game_events else notifier.sequence(gameid)
+            yield "id: %d\nevent: reset\ndata: {}\n\n" % last_id
+        for event in game_events:
+            yield "id: %d\nevent: %s\ndata: %s\n\n" % (event.id, event.type, json.dumps(event.data))
+            last_id = event.id
+            if event.type in (events.GAME_ENDED, events.GAME_DELETED):
+                return
+        if ended or notifier.closed:
+            # No more events will come
+            return
+        if notifier.wait(gameid, last_id, SSE_KEEPALIVE) == last_id and not notifier.closed:
+            yield ": keep-alive\n\n"
 
 # ROUTES
 app.url_map.converters["regex"] = RegexConverter
@@ -878,6 +1682,12 @@ api.add_resource(Ships, "/battleship/api/games/<gameid>/ships/",
     endpoint="ships")
 api.add_resource(Shots, "/battleship/api/games/<gameid>/shots/",
     endpoint="shots")
+api.add_resource(State, "/battleship/api/games/<gameid>/state/",
+    endpoint="state")
+api.add_resource(Turn, "/battleship/api/games/<gameid>/turn/",
+    endpoint="turn")
+api.add_resource(Events, "/battleship/api/games/<gameid>/events/",
+    endpoint="events")
 
 @app.route("/profiles/<profile_name>/")
 def redirect_to_profile(profile_name):
@@ -891,6 +1701,12 @@ def redirect_to_rels(rel_name):
 def send_json_schema(schema_name):
     return send_from_directory(app.static_folder, "schema/{}.json".format(schema_name))
 
+@app.route("/metrics")
+def send_metrics():
+    return Response(metrics.REGISTRY.render(), 200, content_type=metrics.CONTENT_TYPE)
+
+MasonObject.compile_url_templates(app.url_map)
+
 if __name__ == '__main__':
     # Debug true activates automatic code reloading and improved error messages
     app.run(debug=True)
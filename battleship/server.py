@@ -0,0 +1,201 @@
+'''
+Created on 17.10.2026
+
+Production server of the Battleship API: a pre-forked set of worker
+processes sharing one listening socket, each serving requests with a
+fixed pool of threads. Started with ``py -m main --mode production``.
+
+Programmable Web Project course work by:
+
+@author: arttu
+@author: niko
+@author: timo
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+import signal
+import socket
+import threading
+import time
+
+from werkzeug.serving import BaseWSGIServer
+
+# Threads serving requests in every worker process. An open event stream
+# or a waiting turn request keeps its thread for its whole duration.
+DEFAULT_THREADS = 16
+# Seconds the workers get to finish their requests on shutdown
+SHUTDOWN_TIMEOUT = 30
+# Seconds to wait before replacing a worker which exited unexpectedly
+RESPAWN_DELAY = 1
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    '''
+    A WSGI server which serves the requests with a fixed pool of threads.
+    When the server is closed, the requests already accepted are finished
+    before :py:meth:`server_close` returns.
+
+    Every request keeps a thread until its response has been sent, so at
+    most *threads* event streams and waiting turn requests are served at
+    the same time, and while they are open the other requests queue up.
+    *on_close* must make them finish, or closing the server waits for them.
+
+    :param str host: The address to listen on.
+    :param int port: The port to listen on.
+    :param app: The WSGI application.
+    :param int threads: Number of threads serving requests.
+    :param int fd: File descriptor of an already listening socket.
+    :param on_close: Called when the server is closed, before waiting for
+        the requests in progress, e.g. to end the open event streams.
+    '''
+    multithread = True
+
+    def __init__(self, host, port, app, threads=DEFAULT_THREADS, fd=None, on_close=None):
+        super(PooledWSGIServer, self).__init__(host, port, app, fd=fd)
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        self.on_close = on_close
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        # Same as socketserver.ThreadingMixIn, on a pooled thread
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super(PooledWSGIServer, self).server_close()
+        if self.on_close is not None:
+            self.on_close()
+        self.executor.shutdown(wait=True)
+
+
+class _ShutdownRequested(Exception):
+    pass
+
+def _request_shutdown(signum, frame):
+    raise _ShutdownRequested()
+
+def listen(host, port):
+    '''
+    Opens the listening socket shared by the workers.
+    '''
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(BaseWSGIServer.request_queue_size)
+    return sock
+
+def run_worker(app, host, sock, threads, interrupt=False, on_close=None):
+    '''
+    Serves requests from a listening socket until SIGTERM, then finishes
+    the requests in progress and returns.
+
+    :param bool interrupt: If ``True`` SIGINT stops the worker too,
+        otherwise it is ignored.
+    :param on_close: Passed to :py:class:`PooledWSGIServer`.
+    '''
+    server = PooledWSGIServer(host, 0, app, threads=threads, fd=sock.fileno(),
+                              on_close=on_close)
+
+    def stop(signum, frame):
+        # shutdown() blocks until serve_forever() returns, so not from here
+        threading.Thread(target=server.shutdown).start()
+    signal.signal(signal.SIGTERM, stop)
+    # Ctrl+C reaches the whole process group: the parent stops the workers
+    signal.signal(signal.SIGINT, stop if interrupt else signal.SIG_IGN)
+    server.serve_forever()
+
+def serve(app, host, port, workers, threads=DEFAULT_THREADS, on_fork=None, on_close=None):
+    '''
+    Runs the production server until SIGTERM or SIGINT.
+
+    The parent process opens the socket and forks *workers* processes,
+    replacing any worker which exits on its own. On shutdown the workers
+    get SIGTERM, stop accepting connections and finish their requests.
+    Workers still running after :py:data:`SHUTDOWN_TIMEOUT` seconds are
+    killed. Without os.fork, e.g. on Windows, a single process is run.
+
+    :param app: The WSGI application.
+    :param str host: The address to listen on.
+    :param int port: The port to listen on.
+    :param int workers: Number of worker processes.
+    :param int threads: Number of threads in every worker.
+    :param on_fork: Called in the parent before every fork, e.g. to close
+        database connections which must not be shared with the workers.
+    :param on_close: Called in every worker on shutdown, to end the
+        requests which would otherwise keep it running, e.g. event streams.
+    '''
+    sock = listen(host, port)
+    if workers <= 1 or not hasattr(os, "fork"):
+        print("Serving on %s:%d with %d threads" % (host, port, threads))
+        try:
+            run_worker(app, host, sock, threads, interrupt=True, on_close=on_close)
+        finally:
+            sock.close()
+        return
+
+    def spawn():
+        if on_fork is not None:
+            on_fork()
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                run_worker(app, host, sock, threads, on_close=on_close)
+            except BaseException:
+                status = 1
+            finally:
+                os._exit(status)
+        return pid
+
+    pids = set()
+    signal.signal(signal.SIGTERM, _request_shutdown)
+    signal.signal(signal.SIGINT, _request_shutdown)
+    try:
+        for _ in range(workers):
+            pids.add(spawn())
+        print("Serving on %s:%d with %d workers of %d threads" % (host, port, workers, threads))
+        while True:
+            pid, status = os.wait()
+            pids.discard(pid)
+            print("Worker %d exited with status %d, replacing it" % (pid, status))
+            time.sleep(RESPAWN_DELAY)
+            pids.add(spawn())
+    except _ShutdownRequested:
+        pass
+    finally:
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        stop_workers(pids)
+        sock.close()
+
+def stop_workers(pids):
+    '''
+    Stops the worker processes gracefully, killing the ones which do not
+    exit within :py:data:`SHUTDOWN_TIMEOUT` seconds.
+    '''
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+    while pids and time.monotonic() < deadline:
+        for pid in list(pids):
+            try:
+                done, _ = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                done = pid
+            if done:
+                pids.discard(pid)
+        time.sleep(0.1)
+    for pid in pids:
+        print("Worker %d did not stop in time, killing it" % pid)
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
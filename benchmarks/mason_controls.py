@@ -0,0 +1,60 @@
+'''
+Created on 17.10.2026
+
+Micro-benchmark of building the item controls of Mason collections.
+
+Compares the per item cost of api.url_for with add_control, which the
+collections used before, with the compiled url templates and the shared
+control blocks of MasonObject.
+
+Usage, from the root of the repository:
+    python -m benchmarks.mason_controls [number of items]
+'''
+
+import sys
+import timeit
+
+from battleship import resources
+from battleship.resources import MasonObject, api, app
+
+GAMEID = "0"
+
+
+def build_with_url_for(players):
+    items = []
+    for player in players:
+        item = MasonObject(id=player["id"], nickname=player["nickname"], game=player["game"])
+        item.add_control("self", href=api.url_for(resources.Player, playerid=player["id"], gameid=GAMEID))
+        item.add_control("profile", href=resources.BATTLESHIP_PLAYER_PROFILE)
+        item.add_control("game", href=api.url_for(resources.Game, gameid=GAMEID))
+        items.append(item)
+    return items
+
+
+def build_with_templates(players):
+    items = []
+    game_control = {"href": MasonObject.url("game", gameid=GAMEID)}
+    player_url = MasonObject.url_template("player", gameid=GAMEID)
+    for player in players:
+        item = MasonObject(id=player["id"], nickname=player["nickname"], game=player["game"])
+        item["@controls"] = {
+            "self": {"href": player_url.format(playerid=player["id"])},
+            "profile": resources.PLAYER_PROFILE_CONTROL,
+            "game": game_control
+        }
+        items.append(item)
+    return items
+
+
+def main(count=5000, repeat=5):
+    players = [{"id": i, "nickname": "Player %d" % i, "game": 0} for i in range(count)]
+    with app.test_request_context("/battleship/api/games/0/players/"):
+        assert build_with_url_for(players[:10]) == build_with_templates(players[:10])
+        for name, build in (("api.url_for", build_with_url_for),
+                            ("templates", build_with_templates)):
+            best = min(timeit.repeat(lambda: build(players), number=1, repeat=repeat))
+            print("%-12s %8.2f us per item" % (name, best / count * 1e6))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
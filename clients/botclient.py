@@ -202,76 +202,35 @@ def fire(host, game_url, player_url):
     except Exception as e:
         print(e)
 
-    if response.status_code == 204:
-        print('{} fired a shot!'.format(player_nickname))
+    if response.status_code == 200:
+        print('{} fired a shot: {}!'.format(player_nickname, response.json()['result']))
         shots_url = '{}{}'.format(host, shots_uri)
         return shots_url
     else:
         print(response.status_code)
         return None
 
-def all_ships_destroyed(host, shots_url, ships_url, player_url):
+def game_over(host, game_url):
     '''
-    Get all shots and ships.
-    Check if all ships have been shot.
-    Return True if yes, False if no.
+    Get the game.
+    The server ends the game when only one player has ships afloat.
+    Return the id of the winner if the game has ended, False if not.
     '''
 
-    # Get player id.
-    try:
-        response = requests.get(player_url)
-    except Exception as e:
-        print(e)
-        return None
-    if response.status_code == 200:
-        data = response.json()
-        playerid = data['id']
-    else:
-        print(response.status_code)
-        return None
-
-    # Get ships.
     try:
-        response = requests.get(ships_url)
-    except Exception as e:
-        print(e)
-        sys.exit(0)
-    if response.status_code == 200:
-        data = response.json()
-        ships = data['items']
-    else:
-        print(response.status_code)
-        sys.exit(0)
-
-    # Get shots.
-    try:
-        response = requests.get(shots_url)
+        response = requests.get(game_url)
     except Exception as e:
         print(e)
         sys.exit(0)
     if response.status_code == 200:
         data = response.json()
-        shots = data['items']
     else:
         print(response.status_code)
         sys.exit(0)
 
-    # Compare ships and shots.
-    player_shots = []
-    for shot in shots:
-        if shot['player'] == playerid:
-            player_shots.append(shot)
-
-    other_ships = []
-    for ship in ships:
-        if ship['player'] != playerid:
-            other_ships.append(ship)
-
-    whatever = True
-    if whatever:
-        return True
-    else:
+    if data['end_time'] is None:
         return False
+    return data['winner']
 
 def end_game(host, game_url):
     '''
@@ -317,6 +276,6 @@ if __name__ == '__main__':
     shots_url = fire(host, game_url, bot1_url)
     shots_url = fire(host, game_url, bot2_url)
 
-    if all_ships_destroyed(host, shots_url, ships_url, bot1_url):
-        if end_game(host, game_url):
-            print('Somebody won wohoo!')
+    winner = game_over(host, game_url)
+    if winner is not False:
+        print('Player {} won wohoo!'.format(winner))
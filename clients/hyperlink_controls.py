@@ -3,8 +3,18 @@ This file is for different HTTP requests,
 that can be used to access the server.
 '''
 
+import json
+
 import requests
 
+try:
+    import msgpack
+except ImportError:
+    # Without msgpack the responses are requested as JSON
+    msgpack = None
+
+MSGPACK = 'application/msgpack'
+
 
 def enter_games(url):
     response = requests.get('{0}/battleship/api/games/'.format(url))
@@ -13,22 +23,28 @@ def enter_games(url):
 
 def search_games(url):
     '''
-    Requests info for every game in the games list.
+    Requests info for every game in the games list, following the pages.
     '''
     response = enter_games(url)
-    if response.status_code != 200:
-        return
-    games = response.json().get('items')
     output = list()
-    for game in games:
-        info = use_link('self', game.get('@controls'), url)
-        output.append(info.json())
-    return output
+    while True:
+        if response.status_code != 200:
+            return output
+        body = response.json()
+        for game in body.get('items'):
+            info = use_link('self', game.get('@controls'), url)
+            output.append(info.json())
+        # The games are listed one page at a time
+        if 'next' not in body.get('@controls'):
+            return output
+        response = use_link('next', body.get('@controls'), url)
 
 
-def use_link(link_name, controls, url, kwargs={}):
+def use_link(link_name, controls, url, kwargs={}, binary=False):
     '''
     Makes a request to a link in a resource.
+    If binary is True, the response is requested in MessagePack when the
+    msgpack package is installed. Read the body with decode_body.
     '''
     link = controls.get(link_name)
     if link is None:
@@ -36,5 +52,21 @@ def use_link(link_name, controls, url, kwargs={}):
     href = link.get('href')
     link_url = '{0}{1}'.format(url, href)
     method = link.get('method', 'GET')  # Default to GET
+    if binary and msgpack is not None:
+        kwargs = dict(kwargs)
+        headers = dict(kwargs.get('headers', {}))
+        headers['Accept'] = '{0}, application/vnd.mason+json;q=0.5'.format(MSGPACK)
+        kwargs['headers'] = headers
     response = requests.request(method, link_url, **kwargs)
     return response
+
+
+def decode_body(response):
+    '''
+    Decodes the body of a response, MessagePack or JSON
+    depending on its Content-Type.
+    '''
+    content_type = response.headers.get('Content-Type', '')
+    if content_type.split(';')[0].strip() == MSGPACK:
+        return msgpack.unpackb(response.content, raw=False)
+    return json.loads(response.text)
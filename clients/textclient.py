@@ -5,8 +5,8 @@ It is designed to be extremely simple.
 
 from pprint import pprint
 import requests
-from logic import Ship, ship_squares, draw_map, all_ships_sunk
-from hyperlink_controls import enter_games, search_games, use_link
+from logic import Ship, ship_squares, draw_map
+from hyperlink_controls import enter_games, search_games, use_link, decode_body
 from random import randint, choice
 from itertools import chain
 from collections import namedtuple
@@ -340,21 +340,24 @@ class TextClient():
         player = response.json()
         map_size = (int(game.get('x_size')), int(game.get('y_size')))
         ships = randomize_ships(map_size, self.starting_ships)
+        json_args = list()
+        for ship in ships:
+            ship_dict = ship_as_dict(ship)
+            ship_dict['playerid'] = player.get('id')
+            json_args.append(ship_dict)
         try:
-            for ship in ships:
-                json_args = ship_as_dict(ship)
-                json_args['playerid'] = player.get('id')
-                response = use_link(
-                    'place-ship',
-                    player.get('@controls'),
-                    self.url,
-                    kwargs={'json': json_args},
-                )
-                if response.status_code != 204:
-                    print('Ship creation error!')
-                    print('Status code', response.status_code)
-                    print(response.text)
-                    return False
+            # All ships are placed with a single request
+            response = use_link(
+                'place-ship',
+                player.get('@controls'),
+                self.url,
+                kwargs={'json': json_args},
+            )
+            if response.status_code != 204:
+                print('Ship creation error!')
+                print('Status code', response.status_code)
+                print(response.text)
+                return False
         except Exception as e:
             print('Error while sending Post request:', e)
             return False
@@ -367,30 +370,27 @@ class TextClient():
         Handle the gameplay here.
         The players first choose where to shoot,
         and the shot is sent to server.
-        Between shots, data is fetched from the server to display the map.
+        Between shots, the game state is fetched from the server to display the map.
         '''
         while True:
             # 1) Update Map
-            hostile_shots = self._get_hostile_shots()
-            own_shots = self._get_own_shots()
-            hostile_ships = self._get_hostile_ships()
-            my_ships = self._get_my_ships()
-            #print('HOSTILE SHOTS')
-            #pprint(hostile_shots)
-            #print('MY SHIPS')
-            #pprint(my_ships)
+            state = self._get_state()
+            if not state:
+                return
 
             # Conversions for draw_map
-            hostile_shots_xy = shots_xy(hostile_shots)
-            hostile_ships_as_ship = [as_ship(ship) for ship in hostile_ships]
-            own_shots_xy = shots_xy(own_shots)
-            my_ships_as_ship = [as_ship(ship) for ship in my_ships]
+            hostile_shots_xy = shots_xy(state.get('shots_received'))
+            own_shots_xy = shots_xy(state.get('shots'))
+            # Hits are drawn as single square ships
+            hits_as_ship = [Ship((shot['x'], shot['y']), (shot['x'], shot['y']), shot['result'])
+                            for shot in state.get('shots') if shot.get('result') in ('hit', 'sunk')]
+            my_ships_as_ship = [as_ship(ship) for ship in state.get('ships')]
             print('OWN SHOTS')
             draw_map(
                 width=game.get('x_size'),
                 length=game.get('y_size'),
                 shots=own_shots_xy,
-                ships=hostile_ships_as_ship,
+                ships=hits_as_ship,
                 drawships=False,
             )
             print()
@@ -402,122 +402,66 @@ class TextClient():
                 ships=my_ships_as_ship,
                 drawships=True,
             )
-            # 2) Shoot
+            # 2) Check end state
+            winner = self._check_end_status(state)
+            if winner:
+                print('Winner:', winner)
+                break
+            # 3) Shoot
+            if not state.get('turn').get('can_fire'):
+                print('It is not your turn, waiting for other players...')
+                self._wait_for_turn()
             x, y = self._ask_for_coordinate()
             print('Shooting at:', (x, y))
             response = self._fire_shot(x, y)
             if response.status_code == 403:
                 print('It is not your turn, wait for other players!')
-            elif response.status_code != 204:
+            elif response.status_code != 200:
                 print('Failure when trying to send coordinates')
             else:
-                print('BOOM!')  # Possibly check hit/miss status here?
-            # 3) Check end state
-            print('checking end status...')
-            winner = self._check_end_status()
-            print('Winner:', winner)
-            if winner:
-                response = self._end_game()
-                break
+                result = response.json().get('result')
+                if result == 'sunk':
+                    print('BOOM! Ship sunk!')
+                elif result == 'hit':
+                    print('BOOM! Hit!')
+                else:
+                    print('Splash! Miss.')
 
-    def _get_shots(self):
+    def _wait_for_turn(self):
         '''
-        Get shots of a game.
+        Wait until the player can fire or the game ends.
+        The server holds the request until the turn changes.
         '''
-        if self.game is None:
-            print('No game in memory')
-            return False
-        try:
-            response = use_link('shots', self.game.get('@controls'), self.url)
-        except Exception as e:
-            print('Error while getting shots:', e)
-            return list()
-        if response.status_code != (200):
-            print('get shot error!')
-            print('status code', response.status_code)
-            print(response.text)
-            return list()
-        return response.json()
+        while True:
+            try:
+                response = use_link('turn', self.player.get('@controls'), self.url)
+            except Exception as e:
+                print('Error while waiting for turn:', e)
+                return
+            if response.status_code != 200:
+                print('wait for turn error!')
+                print('status code', response.status_code)
+                print(response.text)
+                return
+            turn = response.json()
+            if turn.get('can_fire') or turn.get('game_over'):
+                return
 
-    def _get_hostile_shots(self):
-        '''
-        Get the shots of opposing players in current game.
-        '''
-        response = self._get_shots()
-        if not response:
-            return False
-        shots = response.get('items')
-        hostile_shots = list()
-        for shot in shots:
-            if shot.get('player') != self.playerid:
-                hostile_shots.append(shot)
-        return hostile_shots
-
-    def _get_own_shots(self):
-        '''
-        Get own shots in current game.
-        '''
-        response = self._get_shots()
-        if not response:
-            return False
-        shots = response.get('items')
-        own_shots = list()
-        for shot in shots:
-            if shot.get('player') == self.playerid:
-                own_shots.append(shot)
-        return own_shots
-
-    def _get_ships(self):
+    def _get_state(self):
         '''
-        Get ships of a game made by player.
-        Default to the current ones in memory.
+        Get the state of the current game as seen by the player.
         '''
-        if self.game is None:
-            print('No game in memory')
-            return False
         try:
-            response = use_link(
-                link_name='ships',
-                controls=self.game.get('@controls'),
-                url=self.url,
-            )
+            response = use_link('state', self.player.get('@controls'), self.url, binary=True)
         except Exception as e:
-            print('Error while getting ships:', e)
-            return list()
+            print('Error while getting game state:', e)
+            return False
         if response.status_code != 200:
-            print('get ship error!')
+            print('get state error!')
             print('status code', response.status_code)
             print(response.text)
-            return list()
-        return response.json()
-
-    def _get_my_ships(self):
-        '''
-        Returns list of ships owned by the player
-        '''
-        ships_response = self._get_ships()
-        if not ships_response:
             return False
-        ships = ships_response.get('items')
-        my_ships = list()
-        for ship in ships:
-            if ship.get('player') == self.playerid:
-                my_ships.append(ship)
-        return my_ships
-
-    def _get_hostile_ships(self):
-        '''
-        Returns list of ships that are not owned by the player.
-        '''
-        ships_response = self._get_ships()
-        if not ships_response:
-            return False
-        ships = ships_response.get('items')
-        hostile_ships = list()
-        for ship in ships:
-            if ship.get('player') != self.playerid:
-                hostile_ships.append(ship)
-        return hostile_ships
+        return decode_body(response)
 
     def _ask_for_coordinate(self):
         '''
@@ -567,53 +511,22 @@ class TextClient():
         )
         return response
 
-    def _check_end_status(self):
+    def _check_end_status(self, state):
         '''
         Check wether a single player is still standing.
-        Return winner's ID if end status has been reached, else False.
+        The server ends the game and sets the winner, so only the state is read.
+        Return winner's nickname if end status has been reached, else False.
         '''
-        players_response = use_link(
-            link_name='players',
-            controls=self.game.get('@controls'),
-            url=self.url,
-        )
-        players = players_response.json().get('items')
-        ships = self._get_ships().get('items')
-        shots = self._get_shots().get('items')
-        destroyed_players = list()
-        id_to_nickname = {}
-        for player in players:
-            _id = player.get('id')
-            _nickname = player.get('nickname')
-            id_to_nickname[_id] = _nickname
-            own_ships = [s for s in ships if s['player'] == _id]
-            enemy_shots = [s for s in shots if s['player'] != _id]
-            enemy_shots_xy = shots_xy(enemy_shots)
-            as_ships = [as_ship(ship) for ship in own_ships]
-            sunk = all_ships_sunk(as_ships, enemy_shots_xy)
-            if sunk:
-                destroyed_players.append(_id)
-        ids = [player.get('id') for player in players]
-        alive = set(ids) - set(destroyed_players)
-        if len(alive) == 1:
-            return id_to_nickname[list(alive)[0]]
-        elif len(alive) > 1:
+        game = state.get('game')
+        if game.get('end_time') is None:
             return False
-        else:
-            print('Stalemate?')
-            print(alive)
-            return False
-
-    def _end_game(self):
-        '''
-        End current game.
-        '''
-        response = use_link(
-            link_name='end-game',
-            controls=self.game.get('@controls'),
-            url=self.url,
-            )
-        return response
+        winner = game.get('winner')
+        if winner is None:
+            return 'Nobody'
+        for player in state.get('players'):
+            if player.get('id') == winner:
+                return player.get('nickname')
+        return 'Player {}'.format(winner)
 
 
 if __name__ == '__main__':
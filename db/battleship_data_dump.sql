@@ -1,26 +1,46 @@
-INSERT INTO "game" VALUES(0,"2018-2-21 13:40:36.877952", "2018-2-25 13:40:36.877952", 10, 10, 5);
-INSERT INTO "game" VALUES(1,"2018-2-22 12:40:36.877952", null, 10, 10, 5);
-INSERT INTO "game" VALUES(2,"2018-2-23 12:40:36.877952", null, 12, 12, 10);
+INSERT INTO "game" VALUES(0,"2018-2-21 13:40:36.877952", "2018-2-25 13:40:36.877952", 10, 10, 5, null, 0);
+INSERT INTO "game" VALUES(1,"2018-2-22 12:40:36.877952", null, 10, 10, 5, null, 0);
+INSERT INTO "game" VALUES(2,"2018-2-23 12:40:36.877952", null, 12, 12, 10, null, 0);
 
-INSERT INTO "player" VALUES(0, "Fu1L_s41V0_n05CoP3_720", 0);
-INSERT INTO "player" VALUES(1, "Captain Haddock", 0);
-INSERT INTO "player" VALUES(2, "SUBMARINEGOD", 0);
-INSERT INTO "player" VALUES(0, "Delete me!", 1);
-INSERT INTO "player" VALUES(1, "Just another player", 1);
+INSERT INTO "player" VALUES(0, "Fu1L_s41V0_n05CoP3_720", 0, 0);
+INSERT INTO "player" VALUES(1, "Captain Haddock", 0, 0);
+INSERT INTO "player" VALUES(2, "SUBMARINEGOD", 0, 0);
+INSERT INTO "player" VALUES(0, "Delete me!", 1, 0);
+INSERT INTO "player" VALUES(1, "Just another player", 1, 0);
 
 INSERT INTO "ship" VALUES(0, 0, 0, 2, 3, 2, 6, "frigate");
 INSERT INTO "ship" VALUES(1, 0, 0, 3, 6, 6, 6, "submarine");
 INSERT INTO "ship" VALUES(2, 1, 0, 3, 6, 4, 4, "submarine");
 INSERT INTO "ship" VALUES(3, 1, 0, 9, 5, 9, 9, "carrier");
 
+INSERT INTO "ship_cell" VALUES(0, 2, 3, 0, 0, 1);
+INSERT INTO "ship_cell" VALUES(0, 2, 4, 0, 0, 0);
+INSERT INTO "ship_cell" VALUES(0, 2, 5, 0, 0, 0);
+INSERT INTO "ship_cell" VALUES(0, 2, 6, 0, 0, 0);
+INSERT INTO "ship_cell" VALUES(0, 3, 6, 0, 1, 0);
+INSERT INTO "ship_cell" VALUES(0, 4, 6, 0, 1, 0);
+INSERT INTO "ship_cell" VALUES(0, 5, 6, 0, 1, 0);
+INSERT INTO "ship_cell" VALUES(0, 6, 6, 0, 1, 0);
+INSERT INTO "ship_cell" VALUES(0, 3, 4, 1, 2, 0);
+INSERT INTO "ship_cell" VALUES(0, 3, 5, 1, 2, 0);
+INSERT INTO "ship_cell" VALUES(0, 3, 6, 1, 2, 0);
+INSERT INTO "ship_cell" VALUES(0, 4, 4, 1, 2, 1);
+INSERT INTO "ship_cell" VALUES(0, 4, 5, 1, 2, 0);
+INSERT INTO "ship_cell" VALUES(0, 4, 6, 1, 2, 0);
+INSERT INTO "ship_cell" VALUES(0, 9, 5, 1, 3, 0);
+INSERT INTO "ship_cell" VALUES(0, 9, 6, 1, 3, 0);
+INSERT INTO "ship_cell" VALUES(0, 9, 7, 1, 3, 0);
+INSERT INTO "ship_cell" VALUES(0, 9, 8, 1, 3, 0);
+INSERT INTO "ship_cell" VALUES(0, 9, 9, 1, 3, 0);
+
 INSERT INTO "turn" VALUES(0, 0, 0);
 INSERT INTO "turn" VALUES(0, 1, 0);
 INSERT INTO "turn" VALUES(0, 2, 0);
 INSERT INTO "turn" VALUES(1, 0, 0);
 INSERT INTO "turn" VALUES(0, 0, 1);
 
-INSERT INTO "shot" VALUES(0, 0, 0, 4, 4, "single");
-INSERT INTO "shot" VALUES(0, 1, 0, 3, 3, "single");
-INSERT INTO "shot" VALUES(0, 2, 0, 2, 3, "single");
-INSERT INTO "shot" VALUES(1, 0, 0, 5, 4, "single");
-INSERT INTO "shot" VALUES(0, 0, 1, 2, 2, "bomb");
+INSERT INTO "shot" VALUES(0, 0, 0, 4, 4, "single", "hit");
+INSERT INTO "shot" VALUES(0, 1, 0, 3, 3, "single", "miss");
+INSERT INTO "shot" VALUES(0, 2, 0, 2, 3, "single", "hit");
+INSERT INTO "shot" VALUES(1, 0, 0, 5, 4, "single", "miss");
+INSERT INTO "shot" VALUES(0, 0, 1, 2, 2, "bomb", "miss");
@@ -0,0 +1,12 @@
+-- Secondary indexes for the hot queries. The primary keys of shot, turn and
+-- player do not start with the game column, so without these indexes every
+-- query filtering on game scans the whole table.
+-- The shot and ship indexes hold every column, so SELECT * by game and
+-- player/turn is answered from the index alone. The shot indexes are rebuilt
+-- with the result column by migration 0006.
+CREATE INDEX IF NOT EXISTS shot_game_turn ON shot(game, turn, player, x, y, shot_type);
+CREATE INDEX IF NOT EXISTS shot_game_player ON shot(game, player, turn, x, y, shot_type);
+CREATE INDEX IF NOT EXISTS ship_game_player ON ship(game, player, id, stern_x, stern_y, bow_x, bow_y, ship_type);
+CREATE INDEX IF NOT EXISTS game_end_time ON game(end_time, id);
+CREATE INDEX IF NOT EXISTS turn_game ON turn(game, turn_number, player);
+CREATE INDEX IF NOT EXISTS player_game ON player(game, id);
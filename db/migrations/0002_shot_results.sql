@@ -0,0 +1,34 @@
+-- Server side hit evaluation. ship_cell indexes every cell covered by a ship
+-- by (game, x, y), so a shot is evaluated with one primary key lookup
+-- instead of scanning the ships of the game. The result of every shot is
+-- stored in shot.result.
+ALTER TABLE shot ADD COLUMN result TEXT;
+CREATE TABLE IF NOT EXISTS ship_cell(
+   game INTEGER,
+   x INTEGER,
+   y INTEGER,
+   player INTEGER,
+   ship INTEGER,
+   hit INTEGER DEFAULT 0,
+   PRIMARY KEY(game, x, y, player, ship),
+   FOREIGN KEY(ship, player, game) REFERENCES ship(id, player, game) ON DELETE CASCADE);
+CREATE INDEX IF NOT EXISTS ship_cell_ship ON ship_cell(game, player, ship, hit);
+
+-- Backfill the cells of the existing ships and the results of their shots.
+INSERT INTO ship_cell (game, x, y, player, ship, hit)
+WITH RECURSIVE coordinate(i) AS (
+    SELECT 0 UNION ALL SELECT i + 1 FROM coordinate
+    WHERE i < (SELECT MAX(MAX(stern_x), MAX(stern_y), MAX(bow_x), MAX(bow_y)) FROM ship))
+SELECT ship.game, cx.i, cy.i, ship.player, ship.id,
+       EXISTS (SELECT 1 FROM shot
+               WHERE shot.game = ship.game AND shot.x = cx.i AND shot.y = cy.i
+                 AND shot.player != ship.player)
+FROM ship
+JOIN coordinate AS cx ON cx.i BETWEEN MIN(ship.stern_x, ship.bow_x) AND MAX(ship.stern_x, ship.bow_x)
+JOIN coordinate AS cy ON cy.i BETWEEN MIN(ship.stern_y, ship.bow_y) AND MAX(ship.stern_y, ship.bow_y);
+
+UPDATE shot SET result = CASE
+    WHEN EXISTS (SELECT 1 FROM ship_cell
+                 WHERE ship_cell.game = shot.game AND ship_cell.x = shot.x
+                   AND ship_cell.y = shot.y AND ship_cell.player != shot.player)
+    THEN 'hit' ELSE 'miss' END;
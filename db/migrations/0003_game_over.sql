@@ -0,0 +1,33 @@
+-- Server side game over detection. player.cells_left counts the intact
+-- ship cells of each player and is kept up to date by triggers on
+-- ship_cell, so the players still afloat are found without reading ships
+-- or shots. game.winner stores the last player afloat.
+ALTER TABLE game ADD COLUMN winner INTEGER;
+ALTER TABLE player ADD COLUMN cells_left INTEGER DEFAULT 0;
+
+CREATE TRIGGER IF NOT EXISTS ship_cell_placed AFTER INSERT ON ship_cell
+WHEN NEW.hit = 0
+BEGIN
+    UPDATE player SET cells_left = cells_left + 1
+    WHERE id = NEW.player AND game = NEW.game;
+END;
+
+CREATE TRIGGER IF NOT EXISTS ship_cell_hit AFTER UPDATE OF hit ON ship_cell
+WHEN OLD.hit = 0 AND NEW.hit != 0
+BEGIN
+    UPDATE player SET cells_left = cells_left - 1
+    WHERE id = NEW.player AND game = NEW.game;
+END;
+
+CREATE TRIGGER IF NOT EXISTS ship_cell_removed AFTER DELETE ON ship_cell
+WHEN OLD.hit = 0
+BEGIN
+    UPDATE player SET cells_left = cells_left - 1
+    WHERE id = OLD.player AND game = OLD.game;
+END;
+
+-- Backfill the counters of the existing players.
+UPDATE player SET cells_left = (
+    SELECT COUNT(*) FROM ship_cell
+    WHERE ship_cell.game = player.game AND ship_cell.player = player.id
+      AND ship_cell.hit = 0);
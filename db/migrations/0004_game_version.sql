@@ -0,0 +1,40 @@
+-- Per game version counter for conditional requests. Every write to the
+-- players, ships and shots of a game, and ending the game, bumps
+-- game.version in the same transaction, so the version of a game changes
+-- whenever any of its game scoped resources changes.
+ALTER TABLE game ADD COLUMN version INTEGER NOT NULL DEFAULT 0;
+
+CREATE TRIGGER IF NOT EXISTS game_version_ended AFTER UPDATE OF end_time, winner ON game
+BEGIN
+    UPDATE game SET version = version + 1 WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS game_version_player_created AFTER INSERT ON player
+BEGIN
+    UPDATE game SET version = version + 1 WHERE id = NEW.game;
+END;
+
+CREATE TRIGGER IF NOT EXISTS game_version_player_deleted AFTER DELETE ON player
+BEGIN
+    UPDATE game SET version = version + 1 WHERE id = OLD.game;
+END;
+
+CREATE TRIGGER IF NOT EXISTS game_version_ship_created AFTER INSERT ON ship
+BEGIN
+    UPDATE game SET version = version + 1 WHERE id = NEW.game;
+END;
+
+CREATE TRIGGER IF NOT EXISTS game_version_ship_deleted AFTER DELETE ON ship
+BEGIN
+    UPDATE game SET version = version + 1 WHERE id = OLD.game;
+END;
+
+CREATE TRIGGER IF NOT EXISTS game_version_shot_created AFTER INSERT ON shot
+BEGIN
+    UPDATE game SET version = version + 1 WHERE id = NEW.game;
+END;
+
+CREATE TRIGGER IF NOT EXISTS game_version_shot_deleted AFTER DELETE ON shot
+BEGIN
+    UPDATE game SET version = version + 1 WHERE id = OLD.game;
+END;
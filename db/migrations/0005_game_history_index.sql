@@ -0,0 +1,4 @@
+-- Keyset pagination of the ended games. The game_end_time index serves the
+-- active games (end_time IS NULL AND id > ?) in id order, but the ended
+-- games have distinct end times, so they need their own index ordered by id.
+CREATE INDEX IF NOT EXISTS game_ended ON game(id) WHERE end_time IS NOT NULL;
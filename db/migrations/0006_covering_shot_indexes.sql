@@ -0,0 +1,7 @@
+-- Migration 0002 added shot.result, so the shot indexes of migration 0001 no
+-- longer hold every column and SELECT * by game and turn/player looks up
+-- every row in the table. Rebuild both indexes with the result included.
+DROP INDEX IF EXISTS shot_game_turn;
+DROP INDEX IF EXISTS shot_game_player;
+CREATE INDEX shot_game_turn ON shot(game, turn, player, x, y, shot_type, result);
+CREATE INDEX shot_game_player ON shot(game, player, turn, x, y, shot_type, result);
@@ -1,9 +1,138 @@
+'''
+Starts the Battleship API server.
+
+The development server (the default) runs one process with the debugger
+and the code reloader:
+
+    py -m main
+
+The production server runs several worker processes without debugging:
+
+    py -m main --mode production --workers 4 --threads 16
+
+See py -m main --help for all the options.
+'''
+
+import argparse
+import atexit
+import os
+import shutil
+import tempfile
+
 from werkzeug.serving import run_simple
 from werkzeug.wsgi import DispatcherMiddleware
+from battleship import cache
+from battleship import database
+from battleship import gamestate
+from battleship import metrics
+from battleship import server
+from battleship.middleware import CompressionMiddleware
 from battleship.resources import app as battleship
 
-application = DispatcherMiddleware(battleship)
+#Compress the responses of the API with gzip or deflate when the client accepts it
+application = DispatcherMiddleware(CompressionMiddleware(battleship))
+
+# Seconds between the database checks of a waiting turn request, and
+# lifetime of the cached rows, when several worker processes share the
+# database
+MULTIPROCESS_TURN_POLL = 1.0
+
+
+def prepare_database(engine):
+    '''
+    Creates the schema if the database does not exist yet, and otherwise
+    applies the pending migrations.
+    '''
+    if os.path.exists(engine.db_path):
+        engine.migrate()
+    else:
+        engine.create_tables()
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Runs the Battleship API server.")
+    parser.add_argument("--mode", choices=("dev", "production"), default="dev",
+                        help="dev runs a single debug process with the reloader (default), "
+                             "production runs worker processes without debugging")
+    parser.add_argument("--host", default="0.0.0.0", help="address to listen on")
+    parser.add_argument("--port", type=int, default=5000, help="port to listen on")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="production: number of worker processes (default: number of CPUs)")
+    parser.add_argument("--threads", type=int, default=server.DEFAULT_THREADS,
+                        help="production: threads in every worker (default: %(default)s). "
+                             "Every open event stream and waiting turn request holds a "
+                             "thread, so at most this many per worker are served at once "
+                             "and other requests wait while they are all taken")
+    parser.add_argument("--db", default=database.DEFAULT_DB_PATH,
+                        help="path of the database file (default: %(default)s)")
+    parser.add_argument("--slow-query-threshold", type=float, default=None, metavar="SECONDS",
+                        help="log the statements slower than this with their query plan")
+    parser.add_argument("--slow-query-sample-rate", type=float, default=1.0, metavar="RATE",
+                        help="fraction of the slow statements logged (default: %(default)s)")
+    parser.add_argument("--game-store", action="store_true",
+                        help="serve the active games from memory and write their shots in the "
+                             "background (needs a single process: not with --workers above 1)")
+    parser.add_argument("--max-write-lag", type=float, default=gamestate.DEFAULT_MAX_LAG,
+                        metavar="SECONDS",
+                        help="with --game-store, longest time before a shot is written "
+                             "(default: %(default)s)")
+    args = parser.parse_args(argv)
+    if args.game_store and args.mode == "production" and args.workers > 1:
+        parser.error("--game-store needs --workers 1: the games in memory are not shared between processes")
+    return args
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    production = args.mode == "production"
+    multiprocess = production and args.workers > 1
+    #Rows cached by a worker miss the changes made by the others until they expire
+    engine = database.Engine(args.db,
+                             pool_size=args.threads if production else database.DEFAULT_POOL_SIZE,
+                             slow_query_threshold=args.slow_query_threshold,
+                             slow_query_sample_rate=args.slow_query_sample_rate,
+                             row_cache_ttl=MULTIPROCESS_TURN_POLL if multiprocess
+                                           else cache.DEFAULT_CACHE_TTL)
+    battleship.config["Engine"] = engine
+    #The schema is created once, before any worker starts
+    prepare_database(engine)
+    store = None
+    if args.game_store:
+        store = gamestate.GameStateStore(engine, max_lag=args.max_write_lag)
+        battleship.config["GameStore"] = store
+
+    if not production:
+        if store is not None:
+            #Write the pending shots when the server stops
+            atexit.register(store.close)
+        battleship.debug = True
+        run_simple(args.host, args.port, application,
+                   use_reloader=True, use_debugger=True, use_evalex=True,
+                   threaded=True)
+        return
+
+    battleship.debug = False
+    metrics_dir = None
+    if multiprocess:
+        battleship.config["TURN_POLL_INTERVAL"] = MULTIPROCESS_TURN_POLL
+        #The event ids of one worker mean nothing to the others
+        battleship.config["EVENT_RESUME"] = False
+        #/metrics adds up the metrics of all the workers
+        metrics_dir = tempfile.mkdtemp(prefix="battleship-metrics-")
+        metrics.REGISTRY.enable_multiprocess(metrics_dir)
+
+    def close_worker():
+        #The event streams and waiting turn requests end at once
+        engine.notifier.close()
+        metrics.REGISTRY.write()
+    try:
+        #Connections opened in the parent must not be shared with the workers
+        server.serve(application, args.host, args.port, args.workers, args.threads,
+                     on_fork=engine.pool.dispose, on_close=close_worker)
+    finally:
+        if store is not None:
+            #Write the pending shots after the last request
+            store.close()
+        if metrics_dir is not None:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
 
 if __name__ == '__main__':
-    run_simple('0.0.0.0', 5000, application,
-               use_reloader=True, use_debugger=True, use_evalex=True)
\ No newline at end of file
+    main()
@@ -0,0 +1,287 @@
+'''
+Created on 17.10.2026
+
+Tests for the cache of the game and player rows.
+
+Programmable Web Project course work by:
+
+@author: arttu
+@author: niko
+@author: timo
+
+Based on course exercises code by:
+
+@author: ivan
+@author: mika oja
+'''
+
+
+import unittest
+import time
+
+from battleship import cache
+from battleship import database
+from battleship import metrics
+
+
+ENGINE = database.Engine('db/battleship_test.db')
+
+GAME1_ID = 0
+GAME2_ID = 1
+PLAYER1_ID = 0
+
+
+class RowCacheTestCase(unittest.TestCase):
+    '''
+    Tests for RowCache without a database.
+    '''
+    def print_test_info(function):
+        def wrapped_function(self):
+            print('(' + function.__name__ + ')', function.__doc__)
+            function(self)
+        return wrapped_function
+
+    @print_test_info
+    def test_hits_and_misses(self):
+        '''
+        Test that lookups are counted as hits and misses.
+        '''
+        row_cache = cache.RowCache()
+        key = cache.RowCache.key('game', 1)
+        self.assertEqual(key, cache.RowCache.key('game', '1'))
+        misses = metrics.CACHE_LOOKUPS.value(cache='game', result='miss')
+        self.assertIs(row_cache.get(key), cache.MISSING)
+        row_cache.put(key, {'id': 1}, row_cache.generation)
+        self.assertEqual(row_cache.get(key), {'id': 1})
+        self.assertEqual((row_cache.hits, row_cache.misses), (1, 1))
+        self.assertEqual(metrics.CACHE_LOOKUPS.value(cache='game', result='miss'), misses + 1)
+
+    @print_test_info
+    def test_least_recently_used_evicted(self):
+        '''
+        Test that the least recently used row is dropped when the cache is full.
+        '''
+        row_cache = cache.RowCache(size=2)
+        keys = [cache.RowCache.key('game', gameid) for gameid in range(3)]
+        row_cache.put(keys[0], {}, row_cache.generation)
+        row_cache.put(keys[1], {}, row_cache.generation)
+        row_cache.get(keys[0])
+        row_cache.put(keys[2], {}, row_cache.generation)
+        self.assertEqual(len(row_cache), 2)
+        self.assertIs(row_cache.get(keys[1]), cache.MISSING)
+        self.assertIsNot(row_cache.get(keys[0]), cache.MISSING)
+
+    @print_test_info
+    def test_ttl(self):
+        '''
+        Test that rows expire after the TTL.
+        '''
+        row_cache = cache.RowCache(ttl=0.05)
+        key = cache.RowCache.key('game', 1)
+        row_cache.put(key, {}, row_cache.generation)
+        self.assertIsNot(row_cache.get(key), cache.MISSING)
+        time.sleep(0.1)
+        self.assertIs(row_cache.get(key), cache.MISSING)
+        self.assertEqual(len(row_cache), 0)
+
+    @print_test_info
+    def test_version(self):
+        '''
+        Test that a row stored at another version of the game is not served.
+        '''
+        row_cache = cache.RowCache()
+        key = cache.RowCache.key('players', 1)
+        row_cache.put(key, [{'id': 0}], row_cache.generation, version=3)
+        self.assertEqual(row_cache.get(key, 3), [{'id': 0}])
+        self.assertEqual(row_cache.get(key), [{'id': 0}])
+        self.assertIs(row_cache.get(key, 4), cache.MISSING)
+        self.assertEqual(len(row_cache), 0)
+
+    @print_test_info
+    def test_invalidate_game(self):
+        '''
+        Test that invalidating a game drops its rows and stale reads in progress.
+        '''
+        row_cache = cache.RowCache()
+        game = cache.RowCache.key('game', 1)
+        player = cache.RowCache.key('player', 1, 0)
+        other = cache.RowCache.key('game', 2)
+        for key in (game, player, other):
+            row_cache.put(key, {}, row_cache.generation)
+        generation = row_cache.generation
+        row_cache.invalidate_game('1')
+        self.assertIs(row_cache.get(game), cache.MISSING)
+        self.assertIs(row_cache.get(player), cache.MISSING)
+        self.assertIsNot(row_cache.get(other), cache.MISSING)
+        #A value read before the invalidation is not stored
+        row_cache.put(game, {}, generation)
+        self.assertIs(row_cache.get(game), cache.MISSING)
+
+
+class CacheDBTestCase(unittest.TestCase):
+    '''
+    Tests for the cached reads of Connection.
+    '''
+    @classmethod
+    def setUpClass(cls):
+        ''' Creates the database structure. Removes first any preexisting
+            database file
+        '''
+        print("Testing ", cls.__name__)
+        ENGINE.remove_database()
+        ENGINE.create_tables()
+
+    @classmethod
+    def tearDownClass(cls):
+        '''Remove the testing database'''
+        print("Testing ENDED for ", cls.__name__)
+        ENGINE.remove_database()
+
+    def setUp(self):
+        '''
+        Populates the database
+        '''
+        try:
+            ENGINE.populate_tables()
+            self.connection = ENGINE.connect()
+            self.row_cache = ENGINE.row_cache
+        except Exception as e:
+            print("error at setUp:", e)
+            ENGINE.clear()
+
+    def tearDown(self):
+        '''
+        Close underlying connection and remove all records from database
+        '''
+        self.connection.close()
+        ENGINE.clear()
+
+    def print_test_info(function):
+        def wrapped_function(self):
+            print('(' + function.__name__ + ')', function.__doc__)
+            function(self)
+        return wrapped_function
+
+    @print_test_info
+    def test_get_game_cached(self):
+        '''
+        Test that a game is read once and then served from the cache.
+        '''
+        game = self.connection.get_game(GAME2_ID)
+        statements = self.connection.stats.statements
+        hits = self.row_cache.hits
+        self.assertEqual(self.connection.get_game(str(GAME2_ID)), game)
+        self.assertEqual(self.connection.stats.statements, statements)
+        self.assertEqual(self.row_cache.hits, hits + 1)
+        #The cached row cannot be modified through a returned copy
+        game['winner'] = 5
+        self.assertIsNone(self.connection.get_game(GAME2_ID)['winner'])
+
+    @print_test_info
+    def test_shared_between_engines(self):
+        '''
+        Test that the engines of the same file share the cache.
+        '''
+        engine = database.Engine('db/battleship_test.db')
+        self.assertIs(engine.row_cache, ENGINE.row_cache)
+        self.assertIsNone(database.Engine('db/battleship_test.db', row_cache_size=0).row_cache)
+
+    @print_test_info
+    def test_insert_game_end_time_invalidates(self):
+        '''
+        Test that ending a game invalidates the cached game.
+        '''
+        self.assertIsNone(self.connection.get_game(GAME2_ID)['end_time'])
+        self.connection.insert_game_end_time(GAME2_ID, PLAYER1_ID)
+        game = self.connection.get_game(GAME2_ID)
+        self.assertIsNotNone(game['end_time'])
+        self.assertEqual(game['winner'], PLAYER1_ID)
+
+    @print_test_info
+    def test_delete_game_invalidates(self):
+        '''
+        Test that deleting a game invalidates the cached game and players.
+        '''
+        self.assertIsNotNone(self.connection.get_game(GAME2_ID))
+        self.assertIsNotNone(self.connection.get_players(GAME2_ID))
+        self.assertTrue(self.connection.delete_game(GAME2_ID))
+        self.assertIsNone(self.connection.get_game(GAME2_ID))
+        self.assertIsNone(self.connection.get_players(GAME2_ID))
+
+    @print_test_info
+    def test_create_player_invalidates(self):
+        '''
+        Test that a new player shows up in the cached players of the game.
+        '''
+        count = len(self.connection.get_players(GAME2_ID))
+        playerid = self.connection.create_player("Newcomer", GAME2_ID)
+        players = self.connection.get_players(GAME2_ID)
+        self.assertEqual(len(players), count + 1)
+        self.assertIn(playerid, [player['id'] for player in players])
+
+    @print_test_info
+    def test_delete_player_invalidates(self):
+        '''
+        Test that a deleted player is dropped from the cache.
+        '''
+        self.assertIsNotNone(self.connection.get_player(PLAYER1_ID, GAME2_ID))
+        count = len(self.connection.get_players(GAME2_ID))
+        self.assertTrue(self.connection.delete_player(PLAYER1_ID, GAME2_ID))
+        self.assertIsNone(self.connection.get_player(PLAYER1_ID, GAME2_ID))
+        self.assertEqual(len(self.connection.get_players(GAME2_ID)), count - 1)
+
+    @print_test_info
+    def test_deleted_game_remembered(self):
+        '''
+        Test that a deleted game is known to be missing without reading the database.
+        '''
+        self.assertTrue(self.connection.delete_game(GAME2_ID))
+        statements = self.connection.stats.statements
+        self.assertFalse(self.connection.exists_game(GAME2_ID))
+        self.assertIsNone(self.connection.get_game(GAME2_ID))
+        self.assertIsNone(self.connection.get_players(GAME2_ID))
+        self.assertIsNone(self.connection.get_game_version(GAME2_ID))
+        self.assertEqual(self.connection.stats.statements, statements)
+
+    @print_test_info
+    def test_unknown_game_remembered(self):
+        '''
+        Test that an unknown game is looked up once until the negative TTL expires.
+        '''
+        self.row_cache.negative_ttl = 0.05
+        try:
+            self.assertFalse(self.connection.exists_game(200))
+            statements = self.connection.stats.statements
+            self.assertFalse(self.connection.exists_game(200))
+            self.assertEqual(self.connection.stats.statements, statements)
+            time.sleep(0.1)
+            self.assertFalse(self.connection.exists_game(200))
+            self.assertEqual(self.connection.stats.statements, statements + 1)
+        finally:
+            self.row_cache.negative_ttl = cache.DEFAULT_NEGATIVE_TTL
+
+    @print_test_info
+    def test_create_game_invalidates_missing(self):
+        '''
+        Test that a created game is found even if its id was remembered as missing.
+        '''
+        self.assertTrue(self.connection.delete_game(GAME2_ID))
+        self.assertTrue(self.connection.delete_game(GAME1_ID))
+        # The ids of the deleted games are given out again
+        gameid = self.connection.create_game(10, 10, 60)
+        self.assertTrue(self.connection.exists_game(gameid))
+        self.assertIsNotNone(self.connection.get_game(gameid))
+
+    @print_test_info
+    def test_clear_invalidates(self):
+        '''
+        Test that clearing the database empties the cache.
+        '''
+        self.assertIsNotNone(self.connection.get_game(GAME1_ID))
+        ENGINE.clear()
+        self.assertIsNone(self.connection.get_game(GAME1_ID))
+
+
+if __name__ == '__main__':
+    print('Start running tests')
+    unittest.main()
@@ -36,6 +36,7 @@ GAME1 = {
     'x_size': 10,
     'y_size': 10,
     'turn_length': 5,
+    'winner': None,
 }
 GAME2 = {
     'id': 1,
@@ -44,6 +45,7 @@ GAME2 = {
     'x_size': 10,
     'y_size': 10,
     'turn_length': 5,
+    'winner': None,
 }
 GAME3 = {
     'id': 2,
@@ -52,6 +54,7 @@ GAME3 = {
     'x_size': 12,
     'y_size': 12,
     'turn_length': 10,
+    'winner': None,
 }
 
 GAMES = [GAME1, GAME2, GAME3]
@@ -62,6 +65,7 @@ NEW_GAME = {
     'x_size': 10,
     'y_size': 10,
     'turn_length': 5,
+    'winner': None,
 }
 
 class GameDBTestCase(unittest.TestCase):
@@ -126,6 +130,22 @@ class GameDBTestCase(unittest.TestCase):
         for game in games:
             self.assertIn(game, GAMES)
 
+    @print_test_info
+    def test_get_active_and_ended_games(self):
+        '''
+        Test get_active_games and get_ended_games with keyset pagination.
+        '''
+        self.assertEqual(self.connection.get_active_games(), [GAME2, GAME3])
+        self.assertEqual(self.connection.get_active_games(limit=1), [GAME2])
+        self.assertEqual(self.connection.get_active_games(limit=1, after_id=GAME2_ID), [GAME3])
+        self.assertEqual(self.connection.get_active_games(after_id=2), [])
+        self.assertEqual(self.connection.get_ended_games(), [GAME1])
+        self.assertEqual(self.connection.get_ended_games(after_id=GAME1_ID), [])
+        # No games at all
+        ENGINE.clear()
+        self.assertEqual(self.connection.get_active_games(), [])
+        self.assertEqual(self.connection.get_ended_games(), [])
+
     @print_test_info
     def test_get_game_wrong_id(self):
         '''
@@ -134,6 +154,16 @@ class GameDBTestCase(unittest.TestCase):
         game = self.connection.get_game('NONEXISTENT')
         self.assertIsNone(game)
 
+    @print_test_info
+    def test_exists_game(self):
+        '''
+        Test exists_game.
+        '''
+        self.assertTrue(self.connection.exists_game(GAME1_ID))
+        self.assertTrue(self.connection.exists_game(str(GAME2_ID)))
+        self.assertFalse(self.connection.exists_game(200))
+        self.assertFalse(self.connection.exists_game('NONEXISTENT'))
+
     @print_test_info
     def test_delete_game(self):
         '''
@@ -160,6 +190,7 @@ class GameDBTestCase(unittest.TestCase):
         kwargs = NEW_GAME.copy()
         kwargs.pop('id')
         kwargs.pop('end_time')
+        kwargs.pop('winner')
         new_id = self.connection.create_game(**kwargs)
         game = self.connection.get_game(new_id)
         for key, value in NEW_GAME.items():
@@ -199,6 +230,44 @@ class GameDBTestCase(unittest.TestCase):
         end_time = self.connection.insert_game_end_time(GAME1_ID)
         self.assertFalse(end_time)
 
+    @print_test_info
+    def test_get_game_version(self):
+        '''
+        Test that get_game_version grows on every write to the game.
+        '''
+        version = self.connection.get_game_version(GAME2_ID)
+        other_version = self.connection.get_game_version(GAME1_ID)
+        self.assertIsInstance(version, int)
+        self.connection.create_player('Tintin', GAME2_ID)
+        version2 = self.connection.get_game_version(GAME2_ID)
+        self.assertGreater(version2, version)
+        self.connection.insert_game_end_time(GAME2_ID)
+        self.assertGreater(self.connection.get_game_version(GAME2_ID), version2)
+        # Other games are not affected
+        self.assertEqual(self.connection.get_game_version(GAME1_ID), other_version)
+        self.assertIsNone(self.connection.get_game_version(200))
+
+    @print_test_info
+    def test_get_game_snapshot(self):
+        '''
+        Test get_game_snapshot.
+        '''
+        snapshot = self.connection.get_game_snapshot(GAME1_ID)
+        self.assertEqual(snapshot['game'], GAME1)
+        self.assertEqual([player['id'] for player in snapshot['players']], [0, 1, 2])
+        self.assertEqual(snapshot['players'][0]['cells_left'], 7)
+        self.assertEqual(len(snapshot['ships']), 4)
+        self.assertEqual(len(snapshot['shots']), 4)
+        self.assertEqual(snapshot['turn'], {'turn_number': 1, 'fired': [0]})
+        self.assertFalse(self.connection.con.in_transaction)
+
+    @print_test_info
+    def test_get_game_snapshot_wrong_id(self):
+        '''
+        Test get_game_snapshot with id that does not exist.
+        '''
+        self.assertIsNone(self.connection.get_game_snapshot(200))
+
 
 if __name__ == "__main__":
     print("Starting database game tests...")
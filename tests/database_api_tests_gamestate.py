@@ -0,0 +1,321 @@
+'''
+Created on 17.10.2026
+
+Tests for the in-memory game states and their write-behind persistence.
+
+Programmable Web Project course work by:
+
+@author: arttu
+@author: niko
+@author: timo
+
+Based on course exercises code by:
+
+@author: ivan
+@author: mika oja
+'''
+
+
+import unittest
+import time
+
+from battleship import database
+from battleship import gamestate
+from battleship import metrics
+
+
+ENGINE = database.Engine('db/battleship_test.db')
+
+# Game 1 is active: player 0 has fired the first shot of turn 0
+GAME_ID = 1
+PLAYER1_ID = 0
+PLAYER2_ID = 1
+
+# A two cell ship of player 1 at (0, 0) - (0, 1), a boat of player 2 at (5, 0)
+PLAYER1_SHIPS = [{'stern_x': 0, 'stern_y': 0, 'bow_x': 0, 'bow_y': 1, 'ship_type': 'destroyer'}]
+PLAYER2_SHIPS = [{'stern_x': 5, 'stern_y': 0, 'bow_x': 5, 'bow_y': 0, 'ship_type': 'boat'}]
+
+
+class GameStateTestCase(unittest.TestCase):
+    '''
+    Tests for GameStateStore.
+    '''
+    @classmethod
+    def setUpClass(cls):
+        ''' Creates the database structure. Removes first any preexisting
+            database file
+        '''
+        print("Testing ", cls.__name__)
+        ENGINE.remove_database()
+        ENGINE.create_tables()
+
+    @classmethod
+    def tearDownClass(cls):
+        '''Remove the testing database'''
+        print("Testing ENDED for ", cls.__name__)
+        ENGINE.remove_database()
+
+    def setUp(self):
+        '''
+        Populates the database, places the ships and creates the store
+        '''
+        try:
+            ENGINE.populate_tables()
+            self.connection = ENGINE.connect(check_same_thread=False)
+            self.connection.create_ships(PLAYER1_ID, GAME_ID, PLAYER1_SHIPS)
+            self.connection.create_ships(PLAYER2_ID, GAME_ID, PLAYER2_SHIPS)
+            self.store = gamestate.GameStateStore(ENGINE, max_lag=60)
+        except Exception as e:
+            print("error at setUp:", e)
+            ENGINE.clear()
+
+    def tearDown(self):
+        '''
+        Close the store and the connection and remove all records from database
+        '''
+        self.store.close()
+        self.connection.close()
+        ENGINE.clear()
+
+    def print_test_info(function):
+        def wrapped_function(self):
+            print('(' + function.__name__ + ')', function.__doc__)
+            function(self)
+        return wrapped_function
+
+    def stored_shots(self):
+        return self.connection.get_shots(GAME_ID) or []
+
+    @print_test_info
+    def test_get_matches_database(self):
+        '''
+        Test that a game read into memory answers like the database.
+        '''
+        state = self.store.get(GAME_ID, self.connection)
+        self.assertIsNotNone(state)
+        snapshot = self.connection.get_game_snapshot(GAME_ID)
+        self.assertEqual(state.get_game_snapshot(), snapshot)
+        self.assertEqual(state.get_shots(), self.connection.get_shots(GAME_ID))
+        for playerid in (PLAYER1_ID, PLAYER2_ID):
+            self.assertEqual(state.get_player(playerid),
+                             self.connection.get_player(playerid, GAME_ID))
+            self.assertEqual(state.get_turn_status(playerid),
+                             self.connection.get_turn_status(playerid, GAME_ID))
+        self.assertIs(self.store.get(GAME_ID, self.connection), state)
+        self.assertIs(self.store.peek(GAME_ID), state)
+
+    @print_test_info
+    def test_get_unknown_game(self):
+        '''
+        Test that games which do not exist or have ended are not kept in memory.
+        '''
+        self.assertIsNone(self.store.get(200, self.connection))
+        self.assertIsNone(self.store.get(0, self.connection))
+        self.assertIsNone(self.store.peek(0))
+
+    @print_test_info
+    def test_fire_shot_write_behind(self):
+        '''
+        Test that a shot is answered from memory and written on flush.
+        '''
+        before = self.stored_shots()
+        outcome = self.store.fire_shot(PLAYER2_ID, GAME_ID, 0, 0, 'single', self.connection)
+        self.assertEqual(outcome.status, database.SHOT_ACCEPTED)
+        self.assertEqual(outcome.turn_number, 0)
+        self.assertEqual(outcome.result, database.RESULT_HIT)
+        self.assertEqual(outcome.hits, [{'player': PLAYER1_ID, 'ship': 0, 'sunk': False}])
+        state = self.store.peek(GAME_ID)
+        self.assertEqual(len(state.get_shots()), len(before) + 1)
+        self.assertEqual(state.players[PLAYER1_ID]['cells_left'], 1)
+        self.assertEqual(state.get_turn_status(PLAYER1_ID)['turn_number'], 1)
+        #Nothing written yet
+        self.assertEqual(self.stored_shots(), before)
+
+        self.store.flush()
+        self.assertEqual(self.stored_shots(), state.get_shots())
+        players = self.connection.get_game_snapshot(GAME_ID)['players']
+        self.assertEqual(players[PLAYER1_ID]['cells_left'], 1)
+        self.assertEqual(self.connection.get_turn_status(PLAYER1_ID, GAME_ID),
+                         state.get_turn_status(PLAYER1_ID))
+
+    @print_test_info
+    def test_fire_shot_queued_under_lock(self):
+        '''
+        Test that an accepted shot is queued before the game can be released.
+        '''
+        state = self.store.get(GAME_ID, self.connection)
+        locked = []
+        def enqueue(record):
+            locked.append(state.lock.locked())
+            self.store._enqueue(record)
+        outcome, record, _ = state.fire_shot(PLAYER2_ID, 3, 3, 'single', enqueue=enqueue)
+        self.assertEqual(outcome.status, database.SHOT_ACCEPTED)
+        self.assertEqual(locked, [True])
+        self.store.release(GAME_ID)
+        self.assertEqual(len(self.stored_shots()), 2)
+
+    @print_test_info
+    def test_fire_shot_string_ids(self):
+        '''
+        Test that ids sent as strings find the players like the database does.
+        '''
+        state = self.store.get(GAME_ID, self.connection)
+        self.assertEqual(state.get_player(str(PLAYER2_ID)),
+                         self.connection.get_player(str(PLAYER2_ID), GAME_ID))
+        outcome = self.store.fire_shot(str(PLAYER2_ID), GAME_ID, 3, 3, 'single', self.connection)
+        self.assertEqual(outcome.status, database.SHOT_ACCEPTED)
+        self.assertEqual(len(state.get_shots(playerid=str(PLAYER2_ID))), 1)
+        self.store.flush()
+        self.assertEqual(self.stored_shots(), state.get_shots())
+
+    @print_test_info
+    def test_fire_shot_not_your_turn(self):
+        '''
+        Test that the turn order is enforced in memory.
+        '''
+        outcome = self.store.fire_shot(PLAYER1_ID, GAME_ID, 3, 3, 'single', self.connection)
+        self.assertEqual(outcome.status, database.SHOT_NOT_YOUR_TURN)
+        self.store.flush()
+        self.assertEqual(len(self.stored_shots()), 1)
+
+    @print_test_info
+    def test_background_write(self):
+        '''
+        Test that the background thread writes the shots within max_lag.
+        '''
+        self.store.close()
+        self.store = gamestate.GameStateStore(ENGINE, max_lag=0.05)
+        self.store.fire_shot(PLAYER2_ID, GAME_ID, 3, 3, 'single', self.connection)
+        deadline = time.monotonic() + 5
+        while len(self.stored_shots()) < 2 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(len(self.stored_shots()), 2)
+
+    def block_turn(self, playerid, turn_number):
+        '''
+        Stores a turn row which makes writing the shot of that turn fail
+        '''
+        self.connection.con.execute('INSERT INTO turn (turn_number, player, game) VALUES (?, ?, ?)',
+                                    (turn_number, playerid, GAME_ID))
+        self.connection.con.commit()
+
+    @print_test_info
+    def test_failed_write_retried(self):
+        '''
+        Test that a shot which cannot be written is kept and written later.
+        '''
+        retried = metrics.GAMESTATE_WRITE_FAILURES.value(result="retried")
+        self.block_turn(PLAYER2_ID, 0)
+        outcome = self.store.fire_shot(PLAYER2_ID, GAME_ID, 3, 3, 'single', self.connection)
+        self.assertEqual(outcome.status, database.SHOT_ACCEPTED)
+        self.store.flush()
+        self.assertEqual(len(self.stored_shots()), 1)
+        self.assertGreater(metrics.GAMESTATE_WRITE_FAILURES.value(result="retried"), retried)
+        #The game stays in memory with the shot
+        state = self.store.peek(GAME_ID)
+        self.assertEqual(len(state.get_shots()), 2)
+
+        self.connection.con.execute('DELETE FROM turn WHERE turn_number = 0 AND player = ? AND game = ?',
+                                    (PLAYER2_ID, GAME_ID))
+        self.connection.con.commit()
+        self.store.flush()
+        self.assertEqual(self.stored_shots(), state.get_shots())
+        self.assertIs(self.store.peek(GAME_ID), state)
+
+    @print_test_info
+    def test_failed_write_lost(self):
+        '''
+        Test that a shot which keeps failing is logged and its game read again.
+        '''
+        lost = metrics.GAMESTATE_WRITE_FAILURES.value(result="lost")
+        self.block_turn(PLAYER2_ID, 0)
+        state = self.store.get(GAME_ID, self.connection)
+        self.store.fire_shot(PLAYER2_ID, GAME_ID, 3, 3, 'single', self.connection)
+        with self.assertLogs('battleship.gamestate', level='ERROR'):
+            for _ in range(gamestate.MAX_WRITE_ATTEMPTS):
+                self.store.flush()
+        self.assertEqual(metrics.GAMESTATE_WRITE_FAILURES.value(result="lost"), lost + 1)
+        self.assertTrue(state.released)
+        self.assertIsNone(self.store.peek(GAME_ID))
+        #The game read again agrees with the database
+        state = self.store.get(GAME_ID, self.connection)
+        self.assertEqual(state.get_shots(), self.stored_shots())
+
+    @print_test_info
+    def test_release(self):
+        '''
+        Test that releasing a game writes its shots and drops it from memory.
+        '''
+        state = self.store.get(GAME_ID, self.connection)
+        self.store.fire_shot(PLAYER2_ID, GAME_ID, 3, 3, 'single', self.connection)
+        self.store.release(GAME_ID)
+        self.assertIsNone(self.store.peek(GAME_ID))
+        self.assertEqual(len(self.stored_shots()), 2)
+        #A released state refuses shots, the store reads the game again
+        self.assertEqual(state.fire_shot(PLAYER1_ID, 3, 4, 'single'), (None, None, False))
+        outcome = self.store.fire_shot(PLAYER1_ID, GAME_ID, 3, 4, 'single', self.connection)
+        self.assertEqual(outcome.turn_number, 1)
+        self.assertIsNot(self.store.peek(GAME_ID), state)
+
+    @print_test_info
+    def test_game_over(self):
+        '''
+        Test that the shot ending a game is written at once and the game dropped.
+        '''
+        targets = [(PLAYER2_ID, 0, 0), (PLAYER1_ID, 9, 9), (PLAYER2_ID, 0, 1)]
+        for playerid, x, y in targets:
+            outcome = self.store.fire_shot(playerid, GAME_ID, x, y, 'single', self.connection)
+            self.assertEqual(outcome.status, database.SHOT_ACCEPTED)
+        self.assertTrue(outcome.game_over)
+        self.assertEqual(outcome.winner, PLAYER2_ID)
+        self.assertIsNone(self.store.peek(GAME_ID))
+        self.assertIsNone(self.store.get(GAME_ID, self.connection))
+        game = self.connection.get_game(GAME_ID)
+        self.assertIsNotNone(game['end_time'])
+        self.assertEqual(game['winner'], PLAYER2_ID)
+        self.assertEqual(len(self.stored_shots()), 4)
+
+    @print_test_info
+    def test_not_game_over_before_ships_placed(self):
+        '''
+        Test that a player without ships keeps the game going in memory.
+        '''
+        self.connection.create_player("Newcomer", GAME_ID)
+        targets = [(PLAYER2_ID, 0, 0), (PLAYER1_ID, 9, 9), (PLAYER2_ID, 0, 1)]
+        for playerid, x, y in targets:
+            outcome = self.store.fire_shot(playerid, GAME_ID, x, y, 'single', self.connection)
+        self.assertEqual(outcome.status, database.SHOT_NOT_YOUR_TURN)
+        newcomer = max(player['id'] for player in self.connection.get_players(GAME_ID))
+        outcome = self.store.fire_shot(newcomer, GAME_ID, 9, 8, 'single', self.connection)
+        self.assertEqual(outcome.status, database.SHOT_ACCEPTED)
+        outcome = self.store.fire_shot(PLAYER2_ID, GAME_ID, 0, 1, 'single', self.connection)
+        self.assertEqual(outcome.result, database.RESULT_SUNK)
+        self.assertFalse(outcome.game_over)
+        self.assertIsNotNone(self.store.peek(GAME_ID))
+
+    @print_test_info
+    def test_close_flushes(self):
+        '''
+        Test that closing the store writes the pending shots.
+        '''
+        self.store.fire_shot(PLAYER2_ID, GAME_ID, 3, 3, 'single', self.connection)
+        self.store.close()
+        self.assertEqual(len(self.stored_shots()), 2)
+
+    @print_test_info
+    def test_capacity(self):
+        '''
+        Test that the least recently used game is dropped when the store is full.
+        '''
+        self.store.close()
+        self.store = gamestate.GameStateStore(ENGINE, max_lag=60, capacity=1)
+        state = self.store.get(GAME_ID, self.connection)
+        game_id = self.connection.create_game(10, 10, 60)
+        self.assertIsNotNone(self.store.get(game_id, self.connection))
+        self.assertIsNone(self.store.peek(GAME_ID))
+        self.assertTrue(state.released)
+
+
+if __name__ == '__main__':
+    print('Start running tests')
+    unittest.main()
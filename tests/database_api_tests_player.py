@@ -18,8 +18,10 @@ Based on course exercises code by:
 '''
 
 
+from concurrent.futures import ThreadPoolExecutor
 import unittest
 import sqlite3
+import threading
 
 from battleship import database
 
@@ -56,6 +58,11 @@ NEW_PLAYER = {
     'game': 0,
 }
 
+# Players joining GAME2_ID at the same time in the concurrency test
+GAME2_ID = 2
+CONCURRENT_JOINS = 100
+JOIN_THREADS = 16
+
 NEW_PLAYER_INCORRECT_GAME = {
     'id': 1,
     'nickname': 'Im_new',
@@ -191,6 +198,31 @@ class PlayerDBTestCase(unittest.TestCase):
         self.assertIsNone(player)
 
 
+    @print_test_info
+    def test_create_player_concurrently(self):
+        '''
+        Test that players joining a game at the same time get different ids.
+        '''
+        local = threading.local()
+        connections = []
+
+        def join(number):
+            if not hasattr(local, 'connection'):
+                local.connection = ENGINE.connect(check_same_thread=False)
+                connections.append(local.connection)
+            return local.connection.create_player('Joiner %d' % number, GAME2_ID)
+
+        try:
+            with ThreadPoolExecutor(max_workers=JOIN_THREADS) as executor:
+                playerids = list(executor.map(join, range(CONCURRENT_JOINS)))
+        finally:
+            for connection in connections:
+                connection.close()
+        self.assertNotIn(None, playerids)
+        self.assertEqual(sorted(playerids), list(range(CONCURRENT_JOINS)))
+        players = self.connection.get_players(GAME2_ID)
+        self.assertEqual(sorted(player['id'] for player in players), list(range(CONCURRENT_JOINS)))
+
 if __name__ == "__main__":
     print("Starting database player tests...")
     unittest.main()
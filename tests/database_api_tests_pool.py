@@ -0,0 +1,242 @@
+'''
+Created on 17.10.2026
+
+Tests for the connection pool of the database engine.
+
+Programmable Web Project course work by:
+
+@author: arttu
+@author: niko
+@author: timo
+
+Based on course exercises code by:
+
+@author: ivan
+@author: mika oja
+'''
+
+
+import unittest
+import logging
+import sqlite3
+
+from battleship import database
+
+
+ENGINE = database.Engine('db/battleship_test.db', pool_size=2)
+
+GAME1_ID = 0
+
+
+class PoolDBTestCase(unittest.TestCase):
+    '''
+    Tests for borrowing and returning pooled connections.
+    '''
+    @classmethod
+    def setUpClass(cls):
+        ''' Creates the database structure. Removes first any preexisting
+            database file
+        '''
+        print("Testing ", cls.__name__)
+        ENGINE.remove_database()
+        ENGINE.create_tables()
+
+    @classmethod
+    def tearDownClass(cls):
+        '''Remove the testing database'''
+        print("Testing ENDED for ", cls.__name__)
+        ENGINE.remove_database()
+
+    def setUp(self):
+        '''
+        Populates the database
+        '''
+        try:
+            ENGINE.populate_tables()
+        except Exception as e:
+            print("error at setUp:", e)
+            ENGINE.clear()
+
+    def tearDown(self):
+        '''
+        Close pooled connections and remove all records from database
+        '''
+        ENGINE.pool.dispose()
+        ENGINE.clear()
+
+    def print_test_info(function):
+        def wrapped_function(self):
+            print('(' + function.__name__ + ')', function.__doc__)
+            function(self)
+        return wrapped_function
+
+    @print_test_info
+    def test_released_connection_is_reused(self):
+        '''
+        Test that a released connection is handed out again.
+        '''
+        connection = ENGINE.acquire()
+        ENGINE.release(connection)
+        connection2 = ENGINE.acquire()
+        self.assertIs(connection, connection2)
+        self.assertIsNotNone(connection2.get_game(GAME1_ID))
+        ENGINE.release(connection2)
+
+    @print_test_info
+    def test_pool_is_bounded(self):
+        '''
+        Test that at most pool_size idle connections are kept open.
+        '''
+        connections = [ENGINE.acquire() for _ in range(3)]
+        self.assertEqual(len(set(map(id, connections))), 3)
+        for connection in connections:
+            ENGINE.release(connection)
+        self.assertEqual(ENGINE.pool._idle.qsize(), 2)
+        # The extra connection has been closed.
+        with self.assertRaises(sqlite3.ProgrammingError):
+            connections[2].con.execute('SELECT 1')
+
+    @print_test_info
+    def test_release_commits(self):
+        '''
+        Test that the changes are commited when a connection is released.
+        '''
+        connection = ENGINE.acquire()
+        connection.con.execute('DELETE FROM shot WHERE game = ?', (GAME1_ID,))
+        ENGINE.release(connection)
+        other = ENGINE.connect()
+        self.assertIsNone(other.get_shots(GAME1_ID))
+        other.close()
+
+    @print_test_info
+    def test_checkout_resets_transaction(self):
+        '''
+        Test that a transaction left open is rolled back on checkout.
+        '''
+        connection = ENGINE.acquire()
+        ENGINE.release(connection)
+        connection.con.execute('DELETE FROM shot WHERE game = ?', (GAME1_ID,))
+        self.assertTrue(connection.con.in_transaction)
+        connection2 = ENGINE.acquire()
+        self.assertIs(connection, connection2)
+        self.assertFalse(connection2.con.in_transaction)
+        self.assertIsNotNone(connection2.get_shots(GAME1_ID))
+        ENGINE.release(connection2)
+
+    @print_test_info
+    def test_broken_connection_is_discarded(self):
+        '''
+        Test that a connection failing the health check is replaced.
+        '''
+        connection = ENGINE.acquire()
+        ENGINE.release(connection)
+        connection.con.close()
+        connection2 = ENGINE.acquire()
+        self.assertIsNot(connection, connection2)
+        self.assertIsNotNone(connection2.get_game(GAME1_ID))
+        ENGINE.release(connection2)
+
+    @print_test_info
+    def test_pragmas_applied_on_connect(self):
+        '''
+        Test that the PRAGMAs of the engine are applied to new connections.
+        '''
+        connection = ENGINE.acquire()
+        cur = connection.con.cursor()
+        self.assertEqual(cur.execute('PRAGMA foreign_keys').fetchone()[0], 1)
+        self.assertEqual(cur.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+        self.assertEqual(cur.execute('PRAGMA temp_store').fetchone()[0], 2)
+        self.assertIs(connection.con.row_factory, sqlite3.Row)
+        ENGINE.release(connection)
+
+    @print_test_info
+    def test_pragmas_configurable(self):
+        '''
+        Test that PRAGMAs can be overridden through Engine keyword arguments.
+        '''
+        engine = database.Engine('db/battleship_test.db',
+                                 synchronous='FULL', cache_size=-1000)
+        connection = engine.connect()
+        cur = connection.con.cursor()
+        self.assertEqual(cur.execute('PRAGMA synchronous').fetchone()[0], 2)
+        self.assertEqual(cur.execute('PRAGMA cache_size').fetchone()[0], -1000)
+        connection.close()
+        with self.assertRaises(TypeError):
+            database.Engine('db/battleship_test.db', no_such_pragma=1)
+
+    @print_test_info
+    def test_query_stats(self):
+        '''
+        Test that the statements, commits and sqlite time are counted.
+        '''
+        connection = ENGINE.acquire()
+        connection.stats.reset()
+        self.assertEqual(connection.stats.statements, 0)
+        connection.get_game(GAME1_ID)
+        self.assertEqual(connection.stats.statements, 1)
+        self.assertEqual(connection.stats.commits, 0)
+        self.assertTrue(connection.delete_ship(0, 0, GAME1_ID))
+        self.assertGreaterEqual(connection.stats.commits, 1)
+        self.assertGreater(connection.stats.statements, 2)
+        self.assertGreater(connection.stats.seconds, 0)
+        ENGINE.release(connection)
+
+    @print_test_info
+    def test_slow_query_log(self):
+        '''
+        Test that slow statements are logged with their parameters and plan.
+        '''
+        engine = database.Engine('db/battleship_test.db', slow_query_threshold=0)
+        connection = engine.connect()
+        connection.stats.reset()
+        with self.assertLogs('battleship.database.slow', level='WARNING') as logs:
+            connection.get_shots(GAME1_ID, since_turn=1)
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('turn >= ?', logs.output[0])
+        self.assertIn('parameters: [0, 1]', logs.output[0])
+        self.assertIn('plan: SEARCH shot USING COVERING INDEX shot_game_turn', logs.output[0])
+        # The plan query is not counted
+        self.assertEqual(connection.stats.statements, 1)
+        connection.close()
+
+    @print_test_info
+    def test_slow_query_log_sampling(self):
+        '''
+        Test that only the sampled slow statements are logged, and that
+        nothing is logged by default.
+        '''
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        logger = logging.getLogger('battleship.database.slow')
+        logger.addHandler(handler)
+        try:
+            engine = database.Engine('db/battleship_test.db', slow_query_threshold=0,
+                                     slow_query_sample_rate=0)
+            connection = engine.connect()
+            connection.get_shots(GAME1_ID)
+            connection.close()
+            connection = ENGINE.connect()
+            connection.get_shots(GAME1_ID)
+            connection.close()
+        finally:
+            logger.removeHandler(handler)
+        self.assertEqual(records, [])
+        with self.assertRaises(ValueError):
+            database.SlowQueryLog(0.1, sample_rate=2)
+
+    @print_test_info
+    def test_remove_database_disposes_pool(self):
+        '''
+        Test that removing the database closes the pooled connections.
+        '''
+        connection = ENGINE.acquire()
+        ENGINE.release(connection)
+        ENGINE.remove_database()
+        self.assertEqual(ENGINE.pool._idle.qsize(), 0)
+        ENGINE.create_tables()
+
+
+if __name__ == "__main__":
+    print("Starting database pool tests...")
+    unittest.main()
@@ -18,8 +18,10 @@ Based on course exercises code by:
 '''
 
 
+from concurrent.futures import ThreadPoolExecutor
 import unittest
 import sqlite3
+import threading
 
 from battleship import database
 
@@ -90,6 +92,10 @@ NEW_SHIP = {
     "ship_type": "default"
 }
 
+# Ships placed by PLAYER1_ID at the same time in the concurrency test
+CONCURRENT_SHIPS = 20
+SHIP_THREADS = 8
+
 NEW_SHIP_INCORRECT_GAME = {
     'id': 5,
     'player': 0,
@@ -281,6 +287,57 @@ class ShipDBTestCase(unittest.TestCase):
         ship = self.connection.get_ship(NEW_SHIP_INCORRECT_GAME['id'], NEW_SHIP_INCORRECT_GAME['player'], NEW_SHIP_INCORRECT_GAME['game'])
         self.assertIsNone(ship)
 
+    @print_test_info
+    def test_create_ships(self):
+        '''
+        Test create_ships with several ships.
+        '''
+        ships = [NEW_SHIP, dict(NEW_SHIP, stern_x=5, bow_x=5, ship_type='carrier')]
+        shipids = self.connection.create_ships(PLAYER2_ID, GAME1_ID, ships)
+        # Player 2 already has ships 2 and 3.
+        self.assertEqual(shipids, [4, 5])
+        created = self.connection.get_ships_by_player(GAME1_ID, PLAYER2_ID)
+        self.assertEqual(len(created), 4)
+        ship = self.connection.get_ship(5, PLAYER2_ID, GAME1_ID)
+        self.assertEqual(ship['ship_type'], 'carrier')
+
+    @print_test_info
+    def test_create_ships_all_or_nothing(self):
+        '''
+        Test that create_ships creates no ships if one of them is invalid.
+        '''
+        invalid = dict(NEW_SHIP)
+        del invalid['bow_y']
+        shipids = self.connection.create_ships(PLAYER1_ID, GAME1_ID, [NEW_SHIP, invalid])
+        self.assertIsNone(shipids)
+        self.assertEqual(len(self.connection.get_ships_by_player(GAME1_ID, PLAYER1_ID)), 2)
+        shipids = self.connection.create_ships(PLAYER1_ID, 'NONEXISTENT', [NEW_SHIP])
+        self.assertIsNone(shipids)
+
+    @print_test_info
+    def test_create_ship_concurrently(self):
+        '''
+        Test that ships placed by a player at the same time get different ids.
+        '''
+        local = threading.local()
+        connections = []
+
+        def place(number):
+            if not hasattr(local, 'connection'):
+                local.connection = ENGINE.connect(check_same_thread=False)
+                connections.append(local.connection)
+            return local.connection.create_ship(PLAYER1_ID, GAME1_ID, number, 9, number, 9, "boat")
+
+        try:
+            with ThreadPoolExecutor(max_workers=SHIP_THREADS) as executor:
+                results = list(executor.map(place, range(CONCURRENT_SHIPS)))
+        finally:
+            for connection in connections:
+                connection.close()
+        self.assertEqual(results, [True] * CONCURRENT_SHIPS)
+        ships = self.connection.get_ships_by_player(GAME1_ID, PLAYER1_ID)
+        shipids = sorted(ship['id'] for ship in ships)
+        self.assertEqual(shipids, list(range(len(PLAYER1_SHIPS) + CONCURRENT_SHIPS)))
 
 if __name__ == "__main__":
     print("Starting database ship tests...")
@@ -38,6 +38,7 @@ SHOT1P1 = {
     'x': 4,
     'y': 4,
     'shot_type': 'single',
+    'result': 'hit',
 }
 SHOT1P2 = {
     'turn': 0,
@@ -46,6 +47,7 @@ SHOT1P2 = {
     'x': 3,
     'y': 3,
     'shot_type': 'single',
+    'result': 'miss',
 }
 SHOT1P3 = {
     'turn': 0,
@@ -54,6 +56,7 @@ SHOT1P3 = {
     'x': 2,
     'y': 3,
     'shot_type': 'single',
+    'result': 'hit',
 }
 SHOT2P1 = {
     'turn': 1,
@@ -62,6 +65,7 @@ SHOT2P1 = {
     'x': 5,
     'y': 4,
     'shot_type': 'single',
+    'result': 'miss',
 }
 NEW_SHOT = {
     'turn': 1,
@@ -70,6 +74,7 @@ NEW_SHOT = {
     'x': 6,
     'y': 7,
     'shot_type': 'single',
+    'result': None,
 }
 
 GAME1_SHOTS = [SHOT1P1, SHOT1P2, SHOT1P3, SHOT2P1]
@@ -106,6 +111,9 @@ class ShotDBTestCase(unittest.TestCase):
         try:
             ENGINE.populate_tables()
             self.connection = ENGINE.connect()
+            # Game 1 has ended in the test data. Reopen it to fire shots.
+            self.connection.con.execute('UPDATE game SET end_time = NULL WHERE id = ?', (GAME1_ID,))
+            self.connection.con.commit()
         except Exception as e:
             print("error at setUp:", e)
             ENGINE.clear()
@@ -132,6 +140,29 @@ class ShotDBTestCase(unittest.TestCase):
         for shot in shots:
             self.assertIn(shot, GAME1_SHOTS)
 
+    @print_test_info
+    def test_get_shots_since_turn(self):
+        '''
+        Test get_shots with the turn and player filters.
+        '''
+        shots = self.connection.get_shots(GAME1_ID, since_turn=1)
+        self.assertEqual([(shot['turn'], shot['player']) for shot in shots], [(1, 0)])
+        shots = self.connection.get_shots(GAME1_ID, since_turn=0, playerid=0)
+        self.assertEqual([(shot['turn'], shot['player']) for shot in shots], [(0, 0), (1, 0)])
+        self.assertIsNone(self.connection.get_shots(GAME1_ID, since_turn=2))
+
+    @print_test_info
+    def test_iter_shots(self):
+        '''
+        Test that iter_shots yields the same shots as get_shots in batches.
+        '''
+        shots = self.connection.iter_shots(GAME1_ID, batch_size=1)
+        self.assertNotIsInstance(shots, list)
+        self.assertEqual(list(shots), self.connection.get_shots(GAME1_ID))
+        shots = self.connection.iter_shots(GAME1_ID, since_turn=1)
+        self.assertEqual([(shot['turn'], shot['player']) for shot in shots], [(1, 0)])
+        self.assertEqual(list(self.connection.iter_shots(GAME1_ID, since_turn=2)), [])
+
     @print_test_info
     def test_get_shots_wrong_id(self):
         '''
@@ -272,6 +303,154 @@ class ShotDBTestCase(unittest.TestCase):
         )
         self.assertFalse(success)
 
+    @print_test_info
+    def test_fire_shot(self):
+        '''
+        Test fire_shot in the current turn.
+        '''
+        outcome = self.connection.fire_shot(PLAYER2_ID, GAME1_ID, 6, 7, 'single')
+        self.assertEqual(outcome.status, database.SHOT_ACCEPTED)
+        self.assertEqual(outcome.turn_number, 1)
+        self.assertEqual(outcome.result, database.RESULT_MISS)
+        self.assertEqual(outcome.hits, [])
+        new_shot = dict(NEW_SHOT, result=database.RESULT_MISS)
+        self.assertIn(new_shot, self.connection.get_shots_by_turn(GAME1_ID, 1))
+        turns = self.connection.get_turns_by_player(PLAYER2_ID, GAME1_ID)
+        self.assertIn(1, [turn['turn_number'] for turn in turns])
+
+    @print_test_info
+    def test_fire_shot_not_your_turn(self):
+        '''
+        Test fire_shot twice in the same turn.
+        '''
+        outcome = self.connection.fire_shot(PLAYER1_ID, GAME1_ID, 6, 7, 'single')
+        self.assertEqual(outcome.status, database.SHOT_NOT_YOUR_TURN)
+        self.assertEqual(outcome.turn_number, 1)
+        self.assertEqual(self.connection.get_shots_by_turn(GAME1_ID, 1), TURN2_SHOTS)
+
+    @print_test_info
+    def test_fire_shot_next_turn(self):
+        '''
+        Test that fire_shot opens the next turn when every player has fired.
+        '''
+        self.connection.fire_shot(PLAYER2_ID, GAME1_ID, 6, 7, 'single')
+        self.connection.fire_shot(PLAYER3_ID, GAME1_ID, 6, 8, 'single')
+        outcome = self.connection.fire_shot(PLAYER1_ID, GAME1_ID, 6, 9, 'single')
+        self.assertEqual(outcome.status, database.SHOT_ACCEPTED)
+        self.assertEqual(outcome.turn_number, 2)
+
+    @print_test_info
+    def test_fire_shot_first_turn(self):
+        '''
+        Test fire_shot into a game without turns.
+        '''
+        self.connection.con.execute('DELETE FROM turn WHERE game = ?', (GAME1_ID,))
+        outcome = self.connection.fire_shot(PLAYER1_ID, GAME1_ID, 1, 1, 'single')
+        self.assertEqual(outcome.status, database.SHOT_ACCEPTED)
+        self.assertEqual(outcome.turn_number, 0)
+
+    @print_test_info
+    def test_fire_shot_hit(self):
+        '''
+        Test that fire_shot reports a hit and stores the result.
+        '''
+        # Player 2 fires at the frigate of player 1
+        outcome = self.connection.fire_shot(PLAYER2_ID, GAME1_ID, 2, 4, 'single')
+        self.assertEqual(outcome.result, database.RESULT_HIT)
+        self.assertEqual(outcome.hits, [{'player': PLAYER1_ID, 'ship': 0, 'sunk': False}])
+        shots = self.connection.get_shots_by_player(PLAYER2_ID, GAME1_ID)
+        self.assertIn(database.RESULT_HIT, [shot['result'] for shot in shots])
+
+    @print_test_info
+    def test_fire_shot_own_ship(self):
+        '''
+        Test that a player cannot hit own ships.
+        '''
+        outcome = self.connection.fire_shot(PLAYER2_ID, GAME1_ID, 9, 5, 'single')
+        self.assertEqual(outcome.result, database.RESULT_MISS)
+
+    @print_test_info
+    def test_fire_shot_sunk(self):
+        '''
+        Test that hitting the last intact cell of a ship sinks it.
+        '''
+        # (2, 3) of the frigate of player 1 has been hit already
+        targets = [(PLAYER2_ID, 2, 4), (PLAYER3_ID, 2, 5), (PLAYER1_ID, 0, 0), (PLAYER2_ID, 2, 6)]
+        for playerid, x, y in targets:
+            outcome = self.connection.fire_shot(playerid, GAME1_ID, x, y, 'single')
+            self.assertEqual(outcome.status, database.SHOT_ACCEPTED)
+        self.assertEqual(outcome.result, database.RESULT_SUNK)
+        self.assertEqual(outcome.hits, [{'player': PLAYER1_ID, 'ship': 0, 'sunk': True}])
+
+    @print_test_info
+    def test_fire_shot_game_over(self):
+        '''
+        Test that sinking the last ship of the last but one player ends the game.
+        '''
+        game2_id = 1
+        single_cell = {'stern_x': 0, 'stern_y': 0, 'bow_x': 0, 'bow_y': 0, 'ship_type': 'boat'}
+        self.connection.create_ships(PLAYER1_ID, game2_id, [single_cell])
+        self.connection.create_ships(PLAYER2_ID, game2_id, [dict(single_cell, stern_x=5, bow_x=5)])
+        cur = self.connection.con.cursor()
+        cur.execute('SELECT cells_left FROM player WHERE game = ? ORDER BY id', (game2_id,))
+        self.assertEqual([row[0] for row in cur.fetchall()], [1, 1])
+        outcome = self.connection.fire_shot(PLAYER2_ID, game2_id, 0, 0, 'single')
+        self.assertEqual(outcome.result, database.RESULT_SUNK)
+        self.assertTrue(outcome.game_over)
+        self.assertEqual(outcome.winner, PLAYER2_ID)
+        game = self.connection.get_game(game2_id)
+        self.assertIsNotNone(game['end_time'])
+        self.assertEqual(game['winner'], PLAYER2_ID)
+        # No more shots are accepted.
+        outcome = self.connection.fire_shot(PLAYER1_ID, game2_id, 5, 0, 'single')
+        self.assertEqual(outcome.status, database.SHOT_GAME_ENDED)
+
+    @print_test_info
+    def test_fire_shot_sunk_not_game_over(self):
+        '''
+        Test that the game goes on while two players have ships afloat.
+        '''
+        targets = [(PLAYER2_ID, 2, 4), (PLAYER3_ID, 2, 5), (PLAYER1_ID, 0, 0), (PLAYER2_ID, 2, 6)]
+        for playerid, x, y in targets:
+            outcome = self.connection.fire_shot(playerid, GAME1_ID, x, y, 'single')
+        self.assertEqual(outcome.result, database.RESULT_SUNK)
+        self.assertFalse(outcome.game_over)
+        self.assertIsNone(outcome.winner)
+
+    @print_test_info
+    def test_fire_shot_sunk_ships_not_placed(self):
+        '''
+        Test that a player who has not placed ships yet keeps the game going.
+        '''
+        game2_id = 1
+        newcomer = self.connection.create_player("Newcomer", game2_id)
+        single_cell = {'stern_x': 0, 'stern_y': 0, 'bow_x': 0, 'bow_y': 0, 'ship_type': 'boat'}
+        self.connection.create_ships(PLAYER1_ID, game2_id, [single_cell])
+        self.connection.create_ships(PLAYER2_ID, game2_id, [dict(single_cell, stern_x=5, bow_x=5)])
+        # Three players, the fleet of player 1 is sunk and the newcomer has no ships
+        outcome = self.connection.fire_shot(PLAYER2_ID, game2_id, 0, 0, 'single')
+        self.assertEqual(outcome.result, database.RESULT_SUNK)
+        self.assertFalse(outcome.game_over)
+        self.assertIsNone(outcome.winner)
+        self.assertIsNone(self.connection.get_game(game2_id)['end_time'])
+        # Once the newcomer has placed a ship and lost it, player 2 wins
+        self.connection.create_ships(newcomer, game2_id, [dict(single_cell, stern_x=7, bow_x=7)])
+        for playerid, x, y in ((newcomer, 9, 9), (PLAYER1_ID, 9, 8), (newcomer, 9, 7)):
+            outcome = self.connection.fire_shot(playerid, game2_id, x, y, 'single')
+            self.assertEqual(outcome.status, database.SHOT_ACCEPTED)
+        outcome = self.connection.fire_shot(PLAYER2_ID, game2_id, 7, 0, 'single')
+        self.assertTrue(outcome.game_over)
+        self.assertEqual(outcome.winner, PLAYER2_ID)
+
+    @print_test_info
+    def test_fire_shot_wrong_ids(self):
+        '''
+        Test fire_shot with nonexistent player.
+        '''
+        outcome = self.connection.fire_shot('NONEXISTENT', GAME1_ID, 1, 1, 'single')
+        self.assertEqual(outcome.status, database.SHOT_FAILED)
+        self.assertFalse(self.connection.con.in_transaction)
+
 
 if __name__ == "__main__":
     print("Starting database shot tests...")
@@ -185,6 +185,53 @@ class TestTableSchemas(unittest.TestCase):
         ]
         self._test_table_schema(table_name, real_results, foreign_keys)
 
+    @print_test_info
+    def test_schema_version(self):
+        '''
+        Checks that create_tables applies all the migrations.
+        '''
+        version = ENGINE.get_schema_version()
+        self.assertGreaterEqual(version, 1)
+        # Running the migrations again changes nothing.
+        self.assertEqual(ENGINE.migrate(), version)
+
+    @print_test_info
+    def test_secondary_indexes(self):
+        '''
+        Checks that the hot queries use the secondary indexes.
+        '''
+        queries = [
+            ('SELECT * FROM shot WHERE game = ? AND turn = ?', 'shot_game_turn'),
+            ('SELECT * FROM shot WHERE game = ? AND player = ?', 'shot_game_player'),
+            ('SELECT * FROM ship WHERE game = ? AND player = ?', 'ship_game_player'),
+            ('SELECT id FROM game WHERE end_time IS NULL', 'game_end_time'),
+            ('SELECT * FROM game WHERE end_time IS NOT NULL AND id > ? ORDER BY id LIMIT ?',
+             'game_ended'),
+        ]
+        cur = self.connection.con.cursor()
+        for query, index in queries:
+            params = (0,) * query.count('?')
+            cur.execute('EXPLAIN QUERY PLAN ' + query, params)
+            plan = ' '.join(row[-1] for row in cur.fetchall())
+            self.assertIn(index, plan)
+
+    @print_test_info
+    def test_covering_shot_indexes(self):
+        '''
+        Checks that the shots are read from the shot indexes alone.
+        '''
+        queries = [
+            'SELECT * FROM shot WHERE game = ? AND turn = ?',
+            'SELECT * FROM shot WHERE game = ? AND player = ?',
+            'SELECT * FROM shot WHERE game = ? ORDER BY turn, player',
+        ]
+        cur = self.connection.con.cursor()
+        for query in queries:
+            params = (0,) * query.count('?')
+            cur.execute('EXPLAIN QUERY PLAN ' + query, params)
+            plan = ' '.join(row[-1] for row in cur.fetchall())
+            self.assertIn('COVERING INDEX', plan)
+
 
 if __name__ == "__main__":
     print("Starting database table tests...")
@@ -187,6 +187,26 @@ class TurnDBTestCase(unittest.TestCase):
         )
         self.assertFalse(success)
 
+    @print_test_info
+    def test_get_turn_status(self):
+        '''
+        Test get_turn_status and that the notifier is told about shots.
+        '''
+        status = self.connection.get_turn_status(1, 1)
+        self.assertEqual(status['turn_number'], 0)
+        self.assertTrue(status['can_fire'])
+        status = self.connection.get_turn_status(0, 1)
+        self.assertIsNone(status['turn_number'])
+        self.assertFalse(status['can_fire'])
+        # Game 0 has ended
+        self.assertFalse(self.connection.get_turn_status(1, GAME1_ID)['can_fire'])
+        self.assertIsNone(self.connection.get_turn_status(0, 200))
+
+        sequence = ENGINE.notifier.sequence(1)
+        self.connection.fire_shot(1, 1, 0, 0, 'single')
+        self.assertGreater(ENGINE.notifier.wait(1, sequence, 0), sequence)
+        self.assertTrue(self.connection.get_turn_status(0, 1)['can_fire'])
+
 
 if __name__ == "__main__":
     print("Starting database turn tests...")
@@ -0,0 +1,166 @@
+'''
+Created on 17.10.2026
+
+Tests for the response compression middleware.
+
+Programmable Web Project course work by:
+
+@author: arttu
+@author: niko
+@author: timo
+
+Based on course exercises code by:
+
+@author: ivan
+@author: mika oja
+'''
+
+import unittest
+import flask
+import gzip
+import json
+import zlib
+from werkzeug.test import Client
+from werkzeug.wrappers import BaseResponse
+from battleship import database
+from battleship import resources
+from battleship.middleware import CompressionMiddleware
+
+ENGINE = database.Engine('db/battleship_test.db')
+
+resources.app.config["TESTING"] = True
+resources.app.config["SERVER_NAME"] = "localhost:5000"
+resources.app.config.update({"Engine": ENGINE})
+
+BASE_URL = "http://localhost:5000"
+
+def path_for(endpoint, **values):
+    '''
+    Builds the path of an endpoint for the werkzeug test client.
+    '''
+    return flask.url_for(endpoint, _external=False, **values)
+
+class CompressionTestCase(unittest.TestCase):
+    '''
+    Tests for the responses of the API through CompressionMiddleware.
+    '''
+    @classmethod
+    def setUpClass(cls):
+        ''' Creates the database structure. Removes first any preexisting
+            database file
+        '''
+        print("Testing ", cls.__name__)
+        ENGINE.remove_database()
+        ENGINE.create_tables()
+
+    @classmethod
+    def tearDownClass(cls):
+        '''Remove the testing database'''
+        print("\nTesting ENDED for ", cls.__name__)
+        ENGINE.remove_database()
+
+    def setUp(self):
+        '''
+        Populates the database
+        '''
+        try:
+            ENGINE.populate_tables()
+            self.app_context = resources.app.app_context()
+            self.app_context.push()
+            self.client = Client(CompressionMiddleware(resources.app, min_size=100), BaseResponse)
+        except Exception as e:
+            print("error at setUp:", e)
+            ENGINE.clear()
+
+    def tearDown(self):
+        '''
+        Remove all records from database
+        '''
+        ENGINE.clear()
+        self.app_context.pop()
+
+    def print_test_info(function):
+        def wrapped_function(self):
+            print('\n(' + function.__name__ + ')', function.__doc__)
+            function(self)
+        return wrapped_function
+
+    @print_test_info
+    def test_gzip(self):
+        """
+        Checks that a collection is compressed with gzip when the client accepts it
+        """
+        url = path_for("shots", gameid="0")
+        plain = self.client.get(url, base_url=BASE_URL)
+        self.assertIsNone(plain.headers.get("Content-Encoding"))
+
+        resp = self.client.get(url, base_url=BASE_URL, headers={"Accept-Encoding": "gzip, deflate"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.headers.get("Content-Encoding"), "gzip")
+        self.assertIn("Accept-Encoding", resp.headers.get("Vary"))
+        self.assertIn("Accept", resp.headers.get("Vary"))
+        self.assertEqual(int(resp.headers.get("Content-Length")), len(resp.data))
+        self.assertLess(len(resp.data), len(plain.data))
+        self.assertEqual(gzip.decompress(resp.data), plain.data)
+        self.assertEqual(resp.headers.get("ETag"), plain.headers.get("ETag")[:-1] + '-gzip"')
+
+    @print_test_info
+    def test_deflate(self):
+        """
+        Checks that deflate is used when gzip is not acceptable
+        """
+        url = path_for("ships", gameid="0")
+        plain = self.client.get(url, base_url=BASE_URL)
+        resp = self.client.get(url, base_url=BASE_URL, headers={"Accept-Encoding": "gzip;q=0, deflate"})
+        self.assertEqual(resp.headers.get("Content-Encoding"), "deflate")
+        self.assertEqual(zlib.decompress(resp.data), plain.data)
+
+        resp = self.client.get(url, base_url=BASE_URL, headers={"Accept-Encoding": "br"})
+        self.assertIsNone(resp.headers.get("Content-Encoding"))
+        self.assertEqual(resp.data, plain.data)
+
+    @print_test_info
+    def test_min_size(self):
+        """
+        Checks that bodies below the threshold are sent uncompressed
+        """
+        client = Client(CompressionMiddleware(resources.app, min_size=10 ** 6), BaseResponse)
+        resp = client.get(path_for("shots", gameid="0"), base_url=BASE_URL, headers={"Accept-Encoding": "gzip"})
+        self.assertIsNone(resp.headers.get("Content-Encoding"))
+        self.assertIn("Accept-Encoding", resp.headers.get("Vary"))
+        json.loads(resp.data.decode("utf-8"))
+        with self.assertRaises(ValueError):
+            CompressionMiddleware(resources.app, level=10)
+
+    @print_test_info
+    def test_not_modified(self):
+        """
+        Checks that the compressed ETag revalidates to 304 Not Modified
+        """
+        url = path_for("shots", gameid="0")
+        headers = {"Accept-Encoding": "gzip"}
+        etag = self.client.get(url, base_url=BASE_URL, headers=headers).headers.get("ETag")
+        headers["If-None-Match"] = etag
+        resp = self.client.get(url, base_url=BASE_URL, headers=headers)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.headers.get("ETag"), etag)
+
+        # The gzip representation does not validate a deflate request
+        resp = self.client.get(url, base_url=BASE_URL, headers={"Accept-Encoding": "deflate", "If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
+
+    @print_test_info
+    def test_streamed(self):
+        """
+        Checks that a streamed collection is compressed chunk by chunk
+        """
+        plain = self.client.get(path_for("shots", gameid="0", stream=1), base_url=BASE_URL)
+        resp = self.client.get(path_for("shots", gameid="0", stream=1), base_url=BASE_URL,
+                               headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(resp.headers.get("Content-Encoding"), "gzip")
+        self.assertIsNone(resp.headers.get("Content-Length"))
+        self.assertEqual(gzip.decompress(resp.data), plain.data)
+
+if __name__ == "__main__":
+    print("Starting compression tests...")
+    unittest.main()
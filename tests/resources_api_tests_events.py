@@ -0,0 +1,271 @@
+'''
+Created on 17.10.2026
+
+Tests for the Server-Sent Events stream of a game.
+
+Programmable Web Project course work by:
+
+@author: arttu
+@author: niko
+@author: timo
+
+Based on course exercises code by:
+
+@author: ivan
+@author: mika oja
+'''
+
+import unittest
+import threading
+import time
+import flask
+import json
+from battleship import database
+from battleship import events
+from battleship import resources
+
+ENGINE = database.Engine('db/battleship_test.db')
+
+JSON = "application/json"
+EVENT_STREAM = "text/event-stream"
+
+resources.app.config["TESTING"] = True
+resources.app.config["SERVER_NAME"] = "localhost:5000"
+resources.app.config.update({"Engine": ENGINE})
+
+
+def parse_events(body):
+    '''
+    Returns the events of a stream as (id, event, data) tuples.
+    '''
+    parsed = []
+    for block in body.decode("utf-8").split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines()
+                      if not line.startswith(":"))
+        if fields:
+            parsed.append((int(fields["id"]), fields["event"], json.loads(fields["data"])))
+    return parsed
+
+
+class EventsResourceTestCase(unittest.TestCase):
+    '''
+    Tests for methods that access the Events resource.
+    '''
+    @classmethod
+    def setUpClass(cls):
+        ''' Creates the database structure. Removes first any preexisting
+            database file
+        '''
+        print("Testing ", cls.__name__)
+        ENGINE.remove_database()
+        ENGINE.create_tables()
+
+    @classmethod
+    def tearDownClass(cls):
+        '''Remove the testing database'''
+        print("\nTesting ENDED for ", cls.__name__)
+        ENGINE.remove_database()
+
+    def setUp(self):
+        '''
+        Populates the database
+        '''
+        try:
+            ENGINE.populate_tables()
+            self.app_context = resources.app.app_context()
+            self.app_context.push()
+            self.client = resources.app.test_client()
+        except Exception as e:
+            print("error at setUp:", e)
+            ENGINE.clear()
+
+    def tearDown(self):
+        '''
+        Remove all records from database
+        '''
+        ENGINE.clear()
+        self.app_context.pop()
+
+    def print_test_info(function):
+        def wrapped_function(self):
+            print('\n(' + function.__name__ + ')', function.__doc__)
+            function(self)
+        return wrapped_function
+
+    def fire(self, playerid, x, y):
+        resp = self.client.post(flask.url_for("shots", gameid="1"),
+            headers={"Content-Type": JSON},
+            data=json.dumps({"playerid": playerid, "x": x, "y": y, "shot_type": "single"}))
+        self.assertEqual(resp.status_code, 200)
+
+    @print_test_info
+    def test_events_url(self):
+        """
+        Checks that the URL points to the right resource
+        """
+        url = "/battleship/api/games/1/events/"
+        with resources.app.test_request_context(url):
+            rule = flask.request.url_rule
+            view_point = resources.app.view_functions[rule.endpoint].view_class
+            self.assertEqual(view_point, resources.Events)
+
+    @print_test_info
+    def test_get_events_resume(self):
+        """
+        Checks that the stream resumes after Last-Event-ID and ends with the game
+        """
+        last_id = resources.app.config["Engine"].notifier.sequence(1)
+        self.fire(1, 2, 5)
+        self.assertEqual(self.client.patch(flask.url_for("game", gameid="1")).status_code, 204)
+
+        resp = self.client.get(flask.url_for("events", gameid="1"),
+            headers={"Last-Event-ID": str(last_id)})
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.headers["Content-Type"].startswith(EVENT_STREAM))
+        stream = parse_events(resp.get_data())
+        self.assertEqual([event for _, event, _ in stream],
+                         ["shot-fired", "turn-advanced", "game-ended"])
+        self.assertEqual([event_id for event_id, _, _ in stream],
+                         [last_id + 1, last_id + 2, last_id + 3])
+        self.assertEqual(stream[0][2]["player"], 1)
+        self.assertEqual(stream[0][2]["result"], "miss")
+        self.assertEqual(stream[1][2], {"turn": 1})
+
+        # Resuming from the middle returns only the rest
+        resp = self.client.get(flask.url_for("events", gameid="1", last_event_id=last_id + 2))
+        self.assertEqual([event for _, event, _ in parse_events(resp.get_data())], ["game-ended"])
+
+    @print_test_info
+    def test_get_events_live(self):
+        """
+        Checks that a watcher receives the events published while it waits
+        """
+        bodies = []
+        def watch():
+            client = resources.app.test_client()
+            with resources.app.app_context():
+                url = flask.url_for("events", gameid="1")
+            bodies.append(client.get(url).get_data())
+
+        watcher = threading.Thread(target=watch)
+        watcher.start()
+        time.sleep(0.2)
+        resp = self.client.post(flask.url_for("players", gameid="1"),
+            headers={"Content-Type": JSON},
+            data=json.dumps({"nickname": "Tintin"}))
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(self.client.patch(flask.url_for("game", gameid="1")).status_code, 204)
+        watcher.join(10)
+        stream = parse_events(bodies[0])
+        self.assertEqual([event for _, event, _ in stream], ["player-joined", "game-ended"])
+        self.assertEqual(stream[0][2], {"player": 2, "nickname": "Tintin"})
+
+    @print_test_info
+    def test_get_events_reset(self):
+        """
+        Checks that an unknown Last-Event-ID makes the stream send reset
+        """
+        resp = self.client.get(flask.url_for("events", gameid="0"),
+            headers={"Last-Event-ID": "100000"})
+        stream = parse_events(resp.get_data())
+        self.assertEqual([event for _, event, _ in stream], ["reset"])
+
+    @print_test_info
+    def test_get_events_several_workers(self):
+        """
+        Checks that a resumed stream starts with reset when ids cannot be trusted
+        """
+        self.fire(1, 2, 5)
+        self.assertEqual(self.client.patch(flask.url_for("game", gameid="1")).status_code, 204)
+        resources.app.config["EVENT_RESUME"] = False
+        try:
+            resp = self.client.get(flask.url_for("events", gameid="1"),
+                headers={"Last-Event-ID": "0"})
+        finally:
+            resources.app.config["EVENT_RESUME"] = True
+        stream = parse_events(resp.get_data())
+        self.assertEqual([event for _, event, _ in stream], ["reset"])
+        self.assertEqual(stream[0][0], resources.app.config["Engine"].notifier.sequence(1))
+
+    @print_test_info
+    def test_get_events_errors(self):
+        """
+        Checks that GET Events returns 400 and 404 for bad requests
+        """
+        resp = self.client.get(flask.url_for("events", gameid="200"))
+        self.assertEqual(resp.status_code, 404)
+        resp = self.client.get(flask.url_for("events", gameid="1"),
+            headers={"Last-Event-ID": "x"})
+        self.assertEqual(resp.status_code, 400)
+
+
+class GameNotifierTestCase(unittest.TestCase):
+    '''
+    Tests that GameNotifier forgets the games it no longer needs.
+    '''
+    def print_test_info(function):
+        def wrapped_function(self):
+            print("(" + function.__name__ + ")", function.__doc__)
+            function(self)
+        return wrapped_function
+
+    @print_test_info
+    def test_finished_game_forgotten(self):
+        """
+        Checks that an ended or deleted game is dropped after the TTL
+        """
+        notifier = events.GameNotifier(finished_ttl=0.05)
+        notifier.publish(1, events.SHOT_FIRED)
+        notifier.publish(1, events.GAME_ENDED)
+        notifier.publish(2, events.GAME_DELETED)
+        notifier.publish(3, events.SHOT_FIRED)
+        # The final event can still be read by the streams
+        game_events, complete = notifier.events_since(1, 1)
+        self.assertTrue(complete)
+        self.assertEqual([event.type for event in game_events], [events.GAME_ENDED])
+        time.sleep(0.1)
+        notifier.publish(3, events.TURN_ADVANCED)
+        self.assertEqual(len(notifier), 1)
+        self.assertEqual(notifier.sequence(1), 0)
+        self.assertEqual(notifier.sequence(2), 0)
+        self.assertEqual(notifier.sequence(3), 2)
+
+    @print_test_info
+    def test_finished_game_kept_while_waited(self):
+        """
+        Checks that a game is kept until its last waiter leaves
+        """
+        notifier = events.GameNotifier(finished_ttl=0.05)
+        notifier.publish(1, events.SHOT_FIRED)
+        sequence = notifier.publish(1, events.GAME_ENDED)
+        waiter = threading.Thread(target=notifier.wait, args=(1, sequence, 0.3))
+        waiter.start()
+        time.sleep(0.1)
+        notifier.publish(2, events.SHOT_FIRED)
+        self.assertEqual(notifier.sequence(1), sequence)
+        waiter.join(10)
+        self.assertEqual(notifier.sequence(1), 0)
+        self.assertEqual(len(notifier), 1)
+
+    @print_test_info
+    def test_max_games(self):
+        """
+        Checks that the least recently changed games are dropped
+        """
+        notifier = events.GameNotifier(max_games=2)
+        for gameid in range(3):
+            notifier.publish(gameid, events.PLAYER_JOINED)
+        notifier.publish(1, events.PLAYER_JOINED)
+        notifier.publish(3, events.PLAYER_JOINED)
+        self.assertEqual(len(notifier), 2)
+        self.assertEqual(notifier.sequence(0), 0)
+        self.assertEqual(notifier.sequence(2), 0)
+        self.assertEqual(notifier.sequence(1), 2)
+        game_events, complete = notifier.events_since(0, 1)
+        self.assertEqual(game_events, [])
+        self.assertFalse(complete)
+
+
+if __name__ == "__main__":
+    print("Starting events resource tests...")
+    unittest.main()
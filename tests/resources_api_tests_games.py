@@ -156,6 +156,73 @@ class GamesResourceTestCase(unittest.TestCase):
             self.assertIn("href", item["@controls"]["self"])
             self.assertIn("profile", item["@controls"])
 
+    @print_test_info
+    def test_get_games_pages(self):
+        """
+        Checks that GET Games returns pages linked with next controls
+        """
+        resp = self.client.get(flask.url_for("games", limit=1))
+        data = json.loads(resp.data.decode("utf-8"))
+        self.assertEqual([item["id"] for item in data["items"]], [1])
+        next_url = data["@controls"]["next"]["href"]
+
+        resp = self.client.get(next_url)
+        data = json.loads(resp.data.decode("utf-8"))
+        self.assertEqual([item["id"] for item in data["items"]], [2])
+        self.assertNotIn("next", data["@controls"])
+
+        resp = self.client.get(flask.url_for("games", limit=0))
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.get(flask.url_for("games", after="x"))
+        self.assertEqual(resp.status_code, 400)
+
+    @print_test_info
+    def test_get_game_lean(self):
+        """
+        Checks that the lean representations leave out the hypermedia
+        """
+        resp = self.client.get(flask.url_for("game", gameid="1", lean=1))
+        data = json.loads(resp.data.decode("utf-8"))
+        self.assertEqual(data["id"], 1)
+        self.assertNotIn("@controls", data)
+        self.assertNotIn("@namespaces", data)
+        lean_etag = resp.headers.get("ETag")
+        resp = self.client.get(flask.url_for("game", gameid="1"))
+        self.assertNotEqual(resp.headers.get("ETag"), lean_etag)
+        self.assertIn("Accept", resp.headers.get("Vary"))
+
+        resp = self.client.get(flask.url_for("games", limit=1),
+            headers={"Accept": "application/json; profile=lean"})
+        data = json.loads(resp.data.decode("utf-8"))
+        self.assertEqual(data["fields"][0], "id")
+        self.assertEqual([item[0] for item in data["items"]], [1])
+        self.assertEqual(data["after"], 1)
+
+    @print_test_info
+    def test_url_templates(self):
+        """
+        Checks that the compiled url templates give the same urls as url_for
+        """
+        with resources.app.test_request_context("/"):
+            self.assertEqual(resources.MasonObject.url("game", gameid=3),
+                             flask.url_for("game", gameid=3))
+            self.assertEqual(resources.MasonObject.url("player", gameid="1", playerid=2),
+                             flask.url_for("player", gameid="1", playerid=2))
+            player_url = resources.MasonObject.url_template("player", gameid=1)
+            self.assertEqual(player_url.format(playerid=5),
+                             flask.url_for("player", gameid=1, playerid=5))
+
+    @print_test_info
+    def test_get_games_empty(self):
+        """
+        Checks that GET Games works when there are no games
+        """
+        ENGINE.clear()
+        resp = self.client.get(flask.url_for("games"))
+        self.assertEqual(resp.status_code, 200)
+        data = json.loads(resp.data.decode("utf-8"))
+        self.assertEqual(data["items"], [])
+
     @print_test_info
     def test_post_games_success_status(self):
         """
@@ -228,6 +295,7 @@ class GamesResourceTestCase(unittest.TestCase):
         self.assertIn("x_size", data)
         self.assertIn("y_size", data)
         self.assertIn("turn_length", data)
+        self.assertIn("winner", data)
 
     @print_test_info
     def test_delete_game(self):
@@ -265,6 +333,36 @@ class GamesResourceTestCase(unittest.TestCase):
         resp = self.client.patch(flask.url_for("game", gameid='0'))
         self.assertEqual(resp.status_code, 409)
 
+    @print_test_info
+    def test_get_game_etag(self):
+        """
+        Checks that GET Game returns an ETag and 304 if nothing has changed
+        """
+        game_url = flask.url_for("game", gameid='1')
+        resp = self.client.get(game_url)
+        etag = resp.headers.get("ETag")
+        self.assertIsNotNone(etag)
+        self.assertFalse(etag.startswith("W/"))
+
+        resp = self.client.get(game_url, headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.data, b"")
+        self.assertEqual(resp.headers.get("ETag"), etag)
+
+        # The other game scoped resources share the version of the game
+        players_url = flask.url_for("players", gameid='1')
+        resp = self.client.get(players_url, headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 304)
+
+        # A new player changes the version
+        resp = self.client.post(players_url,
+            headers={"Content-Type": JSON},
+            data=json.dumps({"nickname": "Tintin"}))
+        self.assertEqual(resp.status_code, 201)
+        resp = self.client.get(game_url, headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp.headers.get("ETag"), etag)
+
 if __name__ == "__main__":
     print("Starting resources games tests...")
     unittest.main()
@@ -146,6 +146,41 @@ class HistoryResourceTestCase(unittest.TestCase):
             self.assertIn("href", item["@controls"]["self"])
             self.assertIn("profile", item["@controls"])
 
+    @print_test_info
+    def test_get_history_pages(self):
+        """
+        Checks that GET History returns the ended games a page at a time
+        """
+        self.client.patch(flask.url_for("game", gameid="2"))
+        resp = self.client.get(flask.url_for("history", limit=1))
+        data = json.loads(resp.data.decode("utf-8"))
+        self.assertEqual([item["id"] for item in data["items"]], [0])
+
+        resp = self.client.get(data["@controls"]["next"]["href"])
+        data = json.loads(resp.data.decode("utf-8"))
+        self.assertEqual([item["id"] for item in data["items"]], [2])
+        self.assertNotIn("next", data["@controls"])
+
+    @print_test_info
+    def test_get_history_stream(self):
+        """
+        Checks that a streamed GET History returns every ended game after the cursor
+        """
+        self.client.patch(flask.url_for("game", gameid="2"))
+        resp = self.client.get(flask.url_for("history", limit=1, stream=1))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.data.startswith(b'{"items": ['))
+        data = json.loads(resp.data.decode("utf-8"))
+        self.assertEqual([item["id"] for item in data["items"]], [0, 2])
+        self.assertNotIn("next", data["@controls"])
+        self.assertIn("battleship", data["@namespaces"])
+        for item in data["items"]:
+            self.assertIn("self", item["@controls"])
+
+        resp = self.client.get(flask.url_for("history", after=0, stream=1))
+        data = json.loads(resp.data.decode("utf-8"))
+        self.assertEqual([item["id"] for item in data["items"]], [2])
+
 if __name__ == "__main__":
     print("Starting resources games tests...")
     unittest.main()
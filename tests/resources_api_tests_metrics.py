@@ -0,0 +1,174 @@
+'''
+Created on 17.10.2026
+
+Tests for the request metrics and the /metrics resource.
+
+Programmable Web Project course work by:
+
+@author: arttu
+@author: niko
+@author: timo
+
+Based on course exercises code by:
+
+@author: ivan
+@author: mika oja
+'''
+
+import unittest
+import flask
+import json
+import os
+import shutil
+import tempfile
+from battleship import database
+from battleship import metrics
+from battleship import resources
+
+ENGINE = database.Engine('db/battleship_test.db')
+
+resources.app.config["TESTING"] = True
+resources.app.config["SERVER_NAME"] = "localhost:5000"
+resources.app.config.update({"Engine": ENGINE})
+
+class MetricsResourceTestCase(unittest.TestCase):
+    '''
+    Tests for the instrumentation of the requests.
+    '''
+    @classmethod
+    def setUpClass(cls):
+        ''' Creates the database structure. Removes first any preexisting
+            database file
+        '''
+        print("Testing ", cls.__name__)
+        ENGINE.remove_database()
+        ENGINE.create_tables()
+
+    @classmethod
+    def tearDownClass(cls):
+        '''Remove the testing database'''
+        print("\nTesting ENDED for ", cls.__name__)
+        ENGINE.remove_database()
+
+    def setUp(self):
+        '''
+        Populates the database
+        '''
+        try:
+            ENGINE.populate_tables()
+            self.app_context = resources.app.app_context()
+            self.app_context.push()
+            self.client = resources.app.test_client()
+        except Exception as e:
+            print("error at setUp:", e)
+            ENGINE.clear()
+
+    def tearDown(self):
+        '''
+        Remove all records from database
+        '''
+        ENGINE.clear()
+        self.app_context.pop()
+
+    def print_test_info(function):
+        def wrapped_function(self):
+            print('\n(' + function.__name__ + ')', function.__doc__)
+            function(self)
+        return wrapped_function
+
+    @print_test_info
+    def test_request_counted(self):
+        """
+        Checks that a request is counted with its endpoint, method and status
+        """
+        labels = {"endpoint": "shots", "method": "POST"}
+        requests = metrics.REQUESTS.value(status=200, **labels)
+        statements = metrics.REQUEST_STATEMENTS.total(**labels)
+        commits = metrics.REQUEST_COMMITS.total(**labels)
+        latency = metrics.REQUEST_LATENCY.count(**labels)
+
+        resp = self.client.post(flask.url_for("shots", gameid="1"),
+            data=json.dumps({"playerid": 1, "x": 2, "y": 5, "shot_type": "nuclear"}),
+            headers={"Content-Type": "application/json"})
+        self.assertEqual(resp.status_code, 200)
+
+        self.assertEqual(metrics.REQUESTS.value(status=200, **labels), requests + 1)
+        self.assertEqual(metrics.REQUEST_LATENCY.count(**labels), latency + 1)
+        # Firing a shot reads the turn, inserts the shot and commits
+        self.assertGreater(metrics.REQUEST_STATEMENTS.total(**labels), statements + 3)
+        self.assertEqual(metrics.REQUEST_COMMITS.total(**labels), commits + 1)
+
+    @print_test_info
+    def test_get_metrics(self):
+        """
+        Checks that /metrics returns the metrics in the Prometheus text format
+        """
+        self.client.get(flask.url_for("shots", gameid="0"))
+        self.client.get("/no/such/resource/")
+        resp = self.client.get("/metrics")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.headers.get("Content-Type"), metrics.CONTENT_TYPE)
+        text = resp.data.decode("utf-8")
+        self.assertIn("# TYPE battleship_request_duration_seconds histogram", text)
+        self.assertIn('battleship_request_duration_seconds_bucket{endpoint="shots",method="GET",le="+Inf"}', text)
+        self.assertIn('battleship_requests_total{endpoint="unmatched",method="GET",status="404"}', text)
+        self.assertIn('battleship_request_sql_statements_count{endpoint="shots",method="GET"}', text)
+        self.assertIn('battleship_cache_lookups_total{cache="game",result="miss"}', text)
+
+    @print_test_info
+    def test_histogram_buckets(self):
+        """
+        Checks that the histogram buckets are cumulative
+        """
+        histogram = metrics.Histogram("test_seconds", "Test.", ("name",), buckets=(1, 2))
+        histogram.observe(0.5, name="a")
+        histogram.observe(2, name="a")
+        histogram.observe(3, name="a")
+        self.assertEqual(histogram.samples(), [
+            'test_seconds_bucket{name="a",le="1"} 1',
+            'test_seconds_bucket{name="a",le="2"} 2',
+            'test_seconds_bucket{name="a",le="+Inf"} 3',
+            'test_seconds_sum{name="a"} 5.5',
+            'test_seconds_count{name="a"} 3',
+        ])
+    @unittest.skipUnless(hasattr(os, "fork"), "needs os.fork")
+    @print_test_info
+    def test_multiprocess(self):
+        """
+        Checks that the metrics of the forked workers are added up
+        """
+        registry = metrics.Registry()
+        counter = registry.register(metrics.Counter("test_total", "Test.", ("name",)))
+        histogram = registry.register(metrics.Histogram("test_seconds", "Test.", buckets=(1,)))
+        directory = tempfile.mkdtemp()
+        try:
+            registry.enable_multiprocess(directory)
+            counter.inc(name="a")
+            histogram.observe(0.5)
+            pid = os.fork()
+            if pid == 0:
+                # A worker which serves two more requests and exits
+                counter.inc(2, name="a")
+                histogram.observe(2)
+                registry.write()
+                os._exit(0)
+            os.waitpid(pid, 0)
+            text = registry.render()
+            # The first request was counted before the fork, in both processes
+            self.assertIn('test_total{name="a"} 4', text)
+            self.assertIn('test_seconds_bucket{le="1"} 2', text)
+            self.assertIn('test_seconds_count 3', text)
+            self.assertEqual(sorted(os.listdir(directory)),
+                             sorted(["%d.json" % os.getpid(), "%d.json" % pid]))
+            # The exited worker is still counted
+            counter.inc(name="b")
+            text = registry.render()
+            self.assertIn('test_total{name="a"} 4', text)
+            self.assertIn('test_total{name="b"} 1', text)
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    print("Starting resources metrics tests...")
+    unittest.main()
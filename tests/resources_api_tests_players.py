@@ -129,6 +129,33 @@ class PlayersResourceTestCase(unittest.TestCase):
             self.assertIn("href", item["@controls"]["self"])
             self.assertIn("profile", item["@controls"])
 
+    @print_test_info
+    def test_get_players_changed_by_other_process(self):
+        """
+        Checks that the body is as new as the ETag after another process adds a player
+        """
+        resp = self.client.get(flask.url_for("players", gameid='1'))
+        etag = resp.headers["ETag"]
+        count = len(json.loads(resp.data.decode("utf-8"))["items"])
+
+        # A worker process has its own cache, which this one does not see
+        other = database.Engine('db/battleship_test.db', row_cache_size=0).connect()
+        try:
+            self.assertIsNotNone(other.create_player("Newcomer", 1))
+        finally:
+            other.close()
+
+        resp = self.client.get(flask.url_for("players", gameid='1'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp.headers["ETag"], etag)
+        items = json.loads(resp.data.decode("utf-8"))["items"]
+        self.assertEqual(len(items), count + 1)
+        self.assertIn("Newcomer", [item["nickname"] for item in items])
+
+        resp = self.client.get(flask.url_for("players", gameid='1'),
+                               headers={"If-None-Match": resp.headers["ETag"]})
+        self.assertEqual(resp.status_code, 304)
+
     @print_test_info
     def test_get_players_none_game(self):
         """
@@ -0,0 +1,132 @@
+'''
+Created on 17.10.2026
+
+Tests for the threaded worker of the production server.
+
+Programmable Web Project course work by:
+
+@author: arttu
+@author: niko
+@author: timo
+'''
+
+import unittest
+import threading
+import time
+import urllib.request
+
+from battleship import events
+from battleship import resources
+from battleship import server
+
+
+def slow_app(environ, start_response):
+    '''A WSGI application which takes a while to answer.'''
+    time.sleep(0.3)
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [b"done"]
+
+
+class ServerTestCase(unittest.TestCase):
+    '''
+    Tests for PooledWSGIServer.
+    '''
+    @classmethod
+    def setUpClass(cls):
+        print("Testing ", cls.__name__)
+
+    @classmethod
+    def tearDownClass(cls):
+        print("\nTesting ENDED for ", cls.__name__)
+
+    def setUp(self):
+        '''
+        Starts a server with two threads on a free port
+        '''
+        self.sock = server.listen("127.0.0.1", 0)
+        self.server = server.PooledWSGIServer("127.0.0.1", 0, slow_app, threads=2,
+                                              fd=self.sock.fileno())
+        self.url = "http://127.0.0.1:%d/" % self.sock.getsockname()[1]
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        '''
+        Stops the server
+        '''
+        self.server.shutdown()
+        self.thread.join()
+        self.sock.close()
+
+    def print_test_info(function):
+        def wrapped_function(self):
+            print('\n(' + function.__name__ + ')', function.__doc__)
+            function(self)
+        return wrapped_function
+
+    def fetch(self, results):
+        results.append(urllib.request.urlopen(self.url).read())
+
+    @print_test_info
+    def test_concurrent_requests(self):
+        """
+        Checks that the requests are served by the threads of the pool in parallel
+        """
+        results = []
+        threads = [threading.Thread(target=self.fetch, args=(results,)) for _ in range(2)]
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [b"done", b"done"])
+        self.assertLess(time.monotonic() - start, 0.55)
+
+    @print_test_info
+    def test_graceful_shutdown(self):
+        """
+        Checks that a request in progress is finished when the server stops
+        """
+        results = []
+        client = threading.Thread(target=self.fetch, args=(results,))
+        client.start()
+        time.sleep(0.1)
+        self.server.shutdown()
+        self.thread.join()
+        client.join()
+        self.assertEqual(results, [b"done"])
+
+    @print_test_info
+    def test_shutdown_ends_streams(self):
+        """
+        Checks that closing the server ends the open event streams at once
+        """
+        notifier = events.GameNotifier()
+        def stream_app(environ, start_response):
+            start_response("200 OK", [("Content-Type", "text/event-stream")])
+            stream = resources.event_stream(notifier, 1, notifier.sequence(1))
+            return (chunk.encode("utf-8") for chunk in stream)
+
+        self.server.shutdown()
+        self.thread.join()
+        self.server = server.PooledWSGIServer("127.0.0.1", 0, stream_app, threads=2,
+                                              fd=self.sock.fileno(), on_close=notifier.close)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+        results = []
+        client = threading.Thread(target=self.fetch, args=(results,))
+        client.start()
+        time.sleep(0.2)
+        notifier.publish(1, events.SHOT_FIRED, {"x": 1})
+        time.sleep(0.1)
+        start = time.monotonic()
+        self.server.shutdown()
+        self.thread.join()
+        client.join()
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertEqual(results, [b'id: 1\nevent: shot-fired\ndata: {"x": 1}\n\n'])
+
+if __name__ == "__main__":
+    print("Starting server tests...")
+    unittest.main()
@@ -146,6 +146,31 @@ class ShipsResourceTestCase(unittest.TestCase):
             data=json.dumps(self.place_ships_request))
         self.assertEqual(resp.status_code, 204)
 
+    @print_test_info
+    def test_post_ships_array(self):
+        """
+        Checks that POST Ships places an array of ships at once
+        """
+        ships = [self.place_ships_request, dict(self.place_ships_request, stern_x=4, bow_x=4)]
+        resp = self.client.post(flask.url_for("ships", gameid="1"),
+            headers={"Content-Type": JSON,
+                "Accept": MASONJSON},
+            data=json.dumps(ships))
+        self.assertEqual(resp.status_code, 204)
+        self.assertEqual(len(self.connection.get_ships_by_player(1, 0)), 2)
+
+    @print_test_info
+    def test_post_ships_array_many_players(self):
+        """
+        Checks that POST Ships rejects an array with ships of different players
+        """
+        ships = [self.place_ships_request, dict(self.place_ships_request, playerid=1)]
+        resp = self.client.post(flask.url_for("ships", gameid="1"),
+            headers={"Content-Type": JSON,
+                "Accept": MASONJSON},
+            data=json.dumps(ships))
+        self.assertEqual(resp.status_code, 400)
+
     @print_test_info
     def test_post_ships_game_ended(self):
         """
@@ -157,6 +182,29 @@ class ShipsResourceTestCase(unittest.TestCase):
             data=json.dumps(self.place_ships_request))
         self.assertEqual(resp.status_code, 400)
 
+    @print_test_info
+    def test_post_ships_invalid_position(self):
+        """
+        Checks that POST Ships rejects ships which are off the board, too long,
+        not straight or have coordinates which are not integers
+        """
+        invalid = [
+            dict(self.place_ships_request, bow_y=2000),
+            dict(self.place_ships_request, stern_x=-1, bow_x=-1),
+            dict(self.place_ships_request, stern_y=0, bow_y=9),
+            dict(self.place_ships_request, bow_x=3),
+            dict(self.place_ships_request, stern_x="a"),
+            dict(self.place_ships_request, stern_x=1.5),
+            dict(self.place_ships_request, stern_x=True),
+        ]
+        for ship in invalid:
+            resp = self.client.post(flask.url_for("ships", gameid="1"),
+                headers={"Content-Type": JSON,
+                    "Accept": MASONJSON},
+                data=json.dumps(ship))
+            self.assertEqual(resp.status_code, 400, ship)
+        self.assertIsNone(self.connection.get_ships_by_player(1, 0))
+
 if __name__ == "__main__":
     print("Starting resources ships tests...")
     unittest.main()
@@ -18,7 +18,12 @@ Based on course exercises code by:
 import unittest
 import flask
 import json
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 from battleship import database
+from battleship import gamestate
 from battleship import resources
 
 ENGINE = database.Engine('db/battleship_test.db')
@@ -159,11 +164,125 @@ class ShotsResourceTestCase(unittest.TestCase):
         items = data["items"]
         for item in items:
             self.assertIn("player", item)
+            self.assertIn("result", item)
             self.assertIn("@controls", item)
             self.assertIn("self", item["@controls"])
             self.assertIn("href", item["@controls"]["self"])
             self.assertIn("profile", item["@controls"])
 
+    @print_test_info
+    def test_get_shots_since_turn(self):
+        """
+        Checks that GET Shots filters by turn and player and returns the next cursor
+        """
+        resp = self.client.get(flask.url_for("shots", gameid="0"))
+        data = json.loads(resp.data.decode("utf-8"))
+        self.assertEqual([(item["turn"], item["player"]) for item in data["items"]],
+                         [(0, 0), (0, 1), (0, 2), (1, 0)])
+        next_url = data["@controls"]["next"]["href"]
+        self.assertIn("since_turn=1", next_url)
+
+        # Following the cursor returns only the latest turn
+        resp = self.client.get(next_url)
+        data = json.loads(resp.data.decode("utf-8"))
+        self.assertEqual([(item["turn"], item["player"]) for item in data["items"]], [(1, 0)])
+
+        resp = self.client.get(flask.url_for("shots", gameid="0", since_turn=0, player=2))
+        data = json.loads(resp.data.decode("utf-8"))
+        self.assertEqual([(item["turn"], item["player"]) for item in data["items"]], [(0, 2)])
+        next_url = data["@controls"]["next"]["href"]
+        self.assertIn("since_turn=0", next_url)
+        self.assertIn("player=2", next_url)
+
+        # Nothing new keeps the cursor where it was
+        resp = self.client.get(flask.url_for("shots", gameid="0", since_turn=5))
+        data = json.loads(resp.data.decode("utf-8"))
+        self.assertEqual(data["items"], [])
+        self.assertIn("since_turn=5", data["@controls"]["next"]["href"])
+
+    @print_test_info
+    def test_get_shots_lean(self):
+        """
+        Checks that GET Shots returns compact records without hypermedia
+        """
+        resp = self.client.get(flask.url_for("shots", gameid="0"),
+            headers={"Accept": "application/json; profile=lean"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.headers.get("Content-Type"), "application/json;profile=lean")
+        data = json.loads(resp.data.decode("utf-8"))
+        self.assertNotIn("@controls", data)
+        self.assertEqual(data["fields"], ["turn", "player", "x", "y", "shot_type", "result"])
+        self.assertEqual(data["items"][0], [0, 0, 4, 4, "single", "hit"])
+        self.assertEqual(len(data["items"]), 4)
+        self.assertEqual(data["since_turn"], 1)
+
+        resp = self.client.get(flask.url_for("shots", gameid="0", lean=1))
+        self.assertEqual(json.loads(resp.data.decode("utf-8")), data)
+
+    @unittest.skipIf(msgpack is None, "msgpack is not installed")
+    @print_test_info
+    def test_get_shots_msgpack(self):
+        """
+        Checks that GET Shots is encoded with MessagePack when preferred
+        """
+        resp = self.client.get(flask.url_for("shots", gameid="0"),
+            headers={"Accept": "application/msgpack, application/vnd.mason+json;q=0.5"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.headers.get("Content-Type"),
+                         "application/msgpack;" + BATTLESHIP_SHOT_PROFILE)
+        data = msgpack.unpackb(resp.data, raw=False)
+        json_data = json.loads(self.client.get(flask.url_for("shots", gameid="0")).data.decode("utf-8"))
+        self.assertEqual(data, json_data)
+
+        # JSON is still the default for */*
+        resp = self.client.get(flask.url_for("shots", gameid="0"), headers={"Accept": "*/*"})
+        self.assertTrue(resp.headers.get("Content-Type").startswith(MASONJSON))
+
+    @unittest.skipIf(msgpack is not None, "msgpack is installed")
+    @print_test_info
+    def test_get_shots_msgpack_fallback(self):
+        """
+        Checks that GET Shots falls back to JSON without the msgpack package
+        """
+        resp = self.client.get(flask.url_for("shots", gameid="0"),
+            headers={"Accept": "application/msgpack, application/vnd.mason+json;q=0.5"})
+        self.assertEqual(resp.headers.get("Content-Type"),
+                         "{};{}".format(MASONJSON, BATTLESHIP_SHOT_PROFILE))
+
+    @print_test_info
+    def test_get_shots_stream(self):
+        """
+        Checks that a streamed GET Shots carries the same envelope as the buffered one
+        """
+        url = flask.url_for("shots", gameid="0", since_turn=0)
+        resp = self.client.get(flask.url_for("shots", gameid="0", since_turn=0, stream=1))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.headers.get("Content-Type"),
+                         "{};{}".format(MASONJSON, BATTLESHIP_SHOT_PROFILE))
+        self.assertTrue(resp.get_etag()[0].endswith("-stream"))
+        self.assertTrue(resp.data.startswith(b'{"items": ['))
+        data = json.loads(resp.data.decode("utf-8"))
+        self.assertEqual(data, json.loads(self.client.get(url).data.decode("utf-8")))
+
+        # An empty collection keeps its cursor
+        resp = self.client.get(flask.url_for("shots", gameid="0", since_turn=5, stream=1))
+        data = json.loads(resp.data.decode("utf-8"))
+        self.assertEqual(data["items"], [])
+        self.assertIn("since_turn=5", data["@controls"]["next"]["href"])
+
+        # The lean representation is never streamed
+        resp = self.client.get(flask.url_for("shots", gameid="0", stream=1, lean=1))
+        self.assertEqual(resp.headers.get("Content-Type"), "application/json;profile=lean")
+        self.assertIn("fields", json.loads(resp.data.decode("utf-8")))
+
+    @print_test_info
+    def test_get_shots_bad_filter(self):
+        """
+        Checks that GET Shots returns 400 if the filters are not numbers
+        """
+        resp = self.client.get(flask.url_for("shots", gameid="0", since_turn="x"))
+        self.assertEqual(resp.status_code, 400)
+
     @print_test_info
     def test_post_shots(self):
         """
@@ -173,7 +292,35 @@ class ShotsResourceTestCase(unittest.TestCase):
             headers={"Content-Type": JSON,
                 "Accept": MASONJSON},
             data=json.dumps(self.shot_request_game_1a))
-        self.assertEqual(resp.status_code, 204)
+        self.assertEqual(resp.status_code, 200)
+        data = json.loads(resp.data.decode("utf-8"))
+        self.assertEqual(data["turn"], 0)
+        self.assertEqual(data["result"], "miss")
+        self.assertEqual(data["hits"], [])
+        self.assertIn("collection", data["@controls"])
+
+    @print_test_info
+    def test_post_shots_invalid_position(self):
+        """
+        Checks that POST Shots rejects targets which are off the board or not integers
+        """
+        game = self.connection.get_game(1)
+        positions = [("2", 5), (2.5, 5), (True, 5), (None, 5), (-1, 5),
+                     (game["x_size"], 5), (2, game["y_size"])]
+        for x, y in positions:
+            resp = self.client.post(flask.url_for("shots", gameid="1"),
+                headers={"Content-Type": JSON,
+                    "Accept": MASONJSON},
+                data=json.dumps(dict(self.shot_request_game_1a, x=x, y=y)))
+            self.assertEqual(resp.status_code, 400)
+        self.assertEqual(len(self.connection.get_shots(1)), 1)
+
+        # The turn of the player has not been used up
+        resp = self.client.post(flask.url_for("shots", gameid="1"),
+            headers={"Content-Type": JSON,
+                "Accept": MASONJSON},
+            data=json.dumps(self.shot_request_game_1a))
+        self.assertEqual(resp.status_code, 200)
 
     @print_test_info
     def test_post_shots_not_my_turn(self):
@@ -197,6 +344,34 @@ class ShotsResourceTestCase(unittest.TestCase):
             data=json.dumps(self.shot_request_not_my_turn))
         self.assertEqual(resp.status_code, 400)
 
+    @print_test_info
+    def test_post_shots_game_store(self):
+        """
+        Checks that a shot fired into a game in memory is served and written to the database
+        """
+        store = gamestate.GameStateStore(ENGINE, max_lag=60)
+        resources.app.config["GameStore"] = store
+        try:
+            resp = self.client.post(flask.url_for("shots", gameid="1"),
+                headers={"Content-Type": JSON,
+                    "Accept": MASONJSON},
+                data=json.dumps(self.shot_request_game_1a))
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(json.loads(resp.data.decode("utf-8"))["result"], "miss")
+            resp = self.client.get(flask.url_for("shots", gameid="1"))
+            data = json.loads(resp.data.decode("utf-8"))
+            self.assertEqual(len(data["items"]), 2)
+            self.assertEqual(len(self.connection.get_shots(1)), 1)
+            resp = self.client.post(flask.url_for("shots", gameid="1"),
+                headers={"Content-Type": JSON,
+                    "Accept": MASONJSON},
+                data=json.dumps(self.shot_request_game_1a))
+            self.assertEqual(json.loads(resp.data.decode("utf-8"))["turn"], 1)
+        finally:
+            resources.app.config["GameStore"] = None
+            store.close()
+        self.assertEqual(len(self.connection.get_shots(1)), 3)
+
 if __name__ == "__main__":
     print("Starting resources ships tests...")
     unittest.main()
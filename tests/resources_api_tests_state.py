@@ -0,0 +1,149 @@
+'''
+Created on 17.10.2026
+
+Tests for the API access to the game state.
+
+Programmable Web Project course work by:
+
+@author: arttu
+@author: niko
+@author: timo
+
+Based on course exercises code by:
+
+@author: ivan
+@author: mika oja
+'''
+
+import unittest
+import flask
+import json
+from battleship import database
+from battleship import resources
+
+ENGINE = database.Engine('db/battleship_test.db')
+
+MASONJSON = "application/vnd.mason+json"
+JSON = "application/json"
+BATTLESHIP_STATE_PROFILE = "/profiles/state-profile/"
+
+resources.app.config["TESTING"] = True
+resources.app.config["SERVER_NAME"] = "localhost:5000"
+resources.app.config.update({"Engine": ENGINE})
+
+class StateResourceTestCase(unittest.TestCase):
+    '''
+    Tests for methods that access the State resource.
+    '''
+    @classmethod
+    def setUpClass(cls):
+        ''' Creates the database structure. Removes first any preexisting
+            database file
+        '''
+        print("Testing ", cls.__name__)
+        ENGINE.remove_database()
+        ENGINE.create_tables()
+
+    @classmethod
+    def tearDownClass(cls):
+        '''Remove the testing database'''
+        print("\nTesting ENDED for ", cls.__name__)
+        ENGINE.remove_database()
+
+    def setUp(self):
+        '''
+        Populates the database
+        '''
+        try:
+            ENGINE.populate_tables()
+            self.app_context = resources.app.app_context()
+            self.app_context.push()
+            self.client = resources.app.test_client()
+        except Exception as e:
+            print("error at setUp:", e)
+            ENGINE.clear()
+
+    def tearDown(self):
+        '''
+        Remove all records from database
+        '''
+        ENGINE.clear()
+        self.app_context.pop()
+
+    def print_test_info(function):
+        def wrapped_function(self):
+            print('\n(' + function.__name__ + ')', function.__doc__)
+            function(self)
+        return wrapped_function
+
+    @print_test_info
+    def test_state_url(self):
+        """
+        Checks that the URL points to the right resource
+        """
+        url = "/battleship/api/games/0/state/"
+        with resources.app.test_request_context(url):
+            rule = flask.request.url_rule
+            view_point = resources.app.view_functions[rule.endpoint].view_class
+            self.assertEqual(view_point, resources.State)
+
+    @print_test_info
+    def test_get_state(self):
+        """
+        Checks that GET State returns the view of the player
+        """
+        resp = self.client.get(flask.url_for("state", gameid="0", player=1))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.headers.get("Content-Type", None),
+                         "{};{}".format(MASONJSON, BATTLESHIP_STATE_PROFILE))
+        data = json.loads(resp.data.decode("utf-8"))
+
+        self.assertEqual(data["game"]["id"], 0)
+        self.assertEqual([player["id"] for player in data["players"]], [0, 1, 2])
+        self.assertTrue(data["players"][1]["afloat"])
+        self.assertFalse(data["players"][2]["afloat"])
+        self.assertEqual([ship["id"] for ship in data["ships"]], [2, 3])
+        self.assertEqual(data["shots"], [
+            {"turn": 0, "x": 3, "y": 3, "shot_type": "single", "result": "miss"}])
+        self.assertEqual([shot["player"] for shot in data["shots_received"]], [0, 2, 0])
+        # Game 0 has ended, so nobody can fire.
+        self.assertEqual(data["turn"], {"turn_number": 1, "can_fire": False})
+        self.assertNotIn("battleship:fire-shot", data["@controls"])
+        self.assertIn("game", data["@controls"])
+
+    @print_test_info
+    def test_get_state_turn(self):
+        """
+        Checks that the turn status follows the shots of the players
+        """
+        resp = self.client.get(flask.url_for("state", gameid="1", player=1))
+        data = json.loads(resp.data.decode("utf-8"))
+        self.assertEqual(data["turn"], {"turn_number": 0, "can_fire": True})
+        self.assertIn("fire-shot", data["@controls"])
+
+        resp = self.client.get(flask.url_for("state", gameid="1", player=0))
+        data = json.loads(resp.data.decode("utf-8"))
+        self.assertEqual(data["turn"], {"turn_number": None, "can_fire": False})
+
+    @print_test_info
+    def test_get_state_missing_player(self):
+        """
+        Checks that GET State without the player returns 400
+        """
+        resp = self.client.get(flask.url_for("state", gameid="0"))
+        self.assertEqual(resp.status_code, 400)
+
+    @print_test_info
+    def test_get_state_nonexisting(self):
+        """
+        Checks that GET State returns 404 for unknown game or player
+        """
+        resp = self.client.get(flask.url_for("state", gameid="200", player=0))
+        self.assertEqual(resp.status_code, 404)
+        resp = self.client.get(flask.url_for("state", gameid="0", player=200))
+        self.assertEqual(resp.status_code, 404)
+
+
+if __name__ == "__main__":
+    print("Starting state resource tests...")
+    unittest.main()
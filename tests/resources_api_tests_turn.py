@@ -0,0 +1,163 @@
+'''
+Created on 17.10.2026
+
+Tests for the API access to the turn status.
+
+Programmable Web Project course work by:
+
+@author: arttu
+@author: niko
+@author: timo
+
+Based on course exercises code by:
+
+@author: ivan
+@author: mika oja
+'''
+
+import unittest
+import threading
+import time
+import flask
+import json
+from battleship import database
+from battleship import resources
+
+ENGINE = database.Engine('db/battleship_test.db')
+
+MASONJSON = "application/vnd.mason+json"
+JSON = "application/json"
+BATTLESHIP_TURN_PROFILE = "/profiles/turn-profile/"
+
+resources.app.config["TESTING"] = True
+resources.app.config["SERVER_NAME"] = "localhost:5000"
+resources.app.config.update({"Engine": ENGINE})
+
+class TurnResourceTestCase(unittest.TestCase):
+    '''
+    Tests for methods that access the Turn resource.
+    '''
+    @classmethod
+    def setUpClass(cls):
+        ''' Creates the database structure. Removes first any preexisting
+            database file
+        '''
+        print("Testing ", cls.__name__)
+        ENGINE.remove_database()
+        ENGINE.create_tables()
+
+    @classmethod
+    def tearDownClass(cls):
+        '''Remove the testing database'''
+        print("\nTesting ENDED for ", cls.__name__)
+        ENGINE.remove_database()
+
+    def setUp(self):
+        '''
+        Populates the database
+        '''
+        try:
+            ENGINE.populate_tables()
+            self.app_context = resources.app.app_context()
+            self.app_context.push()
+            self.client = resources.app.test_client()
+        except Exception as e:
+            print("error at setUp:", e)
+            ENGINE.clear()
+
+    def tearDown(self):
+        '''
+        Remove all records from database
+        '''
+        ENGINE.clear()
+        self.app_context.pop()
+
+    def print_test_info(function):
+        def wrapped_function(self):
+            print('\n(' + function.__name__ + ')', function.__doc__)
+            function(self)
+        return wrapped_function
+
+    @print_test_info
+    def test_turn_url(self):
+        """
+        Checks that the URL points to the right resource
+        """
+        url = "/battleship/api/games/1/turn/"
+        with resources.app.test_request_context(url):
+            rule = flask.request.url_rule
+            view_point = resources.app.view_functions[rule.endpoint].view_class
+            self.assertEqual(view_point, resources.Turn)
+
+    @print_test_info
+    def test_get_turn(self):
+        """
+        Checks that GET Turn returns the turn status without waiting
+        """
+        resp = self.client.get(flask.url_for("turn", gameid="1", player=1))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.headers.get("Content-Type", None),
+                         "{};{}".format(MASONJSON, BATTLESHIP_TURN_PROFILE))
+        data = json.loads(resp.data.decode("utf-8"))
+        self.assertEqual(data["turn_number"], 0)
+        self.assertTrue(data["can_fire"])
+        self.assertFalse(data["game_over"])
+        self.assertIn("fire-shot", data["@controls"])
+
+    @print_test_info
+    def test_get_turn_timeout(self):
+        """
+        Checks that GET Turn returns when the wait expires
+        """
+        start = time.monotonic()
+        resp = self.client.get(flask.url_for("turn", gameid="1", player=0, wait=0.2))
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+        data = json.loads(resp.data.decode("utf-8"))
+        self.assertFalse(data["can_fire"])
+        self.assertIsNone(data["turn_number"])
+
+    @print_test_info
+    def test_get_turn_woken_by_shot(self):
+        """
+        Checks that a waiting GET Turn returns once the other player fires
+        """
+        responses = []
+        def wait_for_turn():
+            client = resources.app.test_client()
+            with resources.app.app_context():
+                url = flask.url_for("turn", gameid="1", player=0, wait=10)
+            responses.append(client.get(url))
+
+        waiter = threading.Thread(target=wait_for_turn)
+        start = time.monotonic()
+        waiter.start()
+        time.sleep(0.1)
+        resp = self.client.post(flask.url_for("shots", gameid="1"),
+            headers={"Content-Type": JSON},
+            data=json.dumps({"playerid": 1, "x": 2, "y": 5, "shot_type": "single"}))
+        self.assertEqual(resp.status_code, 200)
+        waiter.join(10)
+        self.assertLess(time.monotonic() - start, 5)
+        data = json.loads(responses[0].data.decode("utf-8"))
+        self.assertTrue(data["can_fire"])
+        self.assertEqual(data["turn_number"], 1)
+
+    @print_test_info
+    def test_get_turn_errors(self):
+        """
+        Checks that GET Turn returns 400 and 404 for bad requests
+        """
+        resp = self.client.get(flask.url_for("turn", gameid="1"))
+        self.assertEqual(resp.status_code, 400)
+        for wait in ("x", "nan", "inf", "-inf"):
+            resp = self.client.get(flask.url_for("turn", gameid="1", player=0, wait=wait))
+            self.assertEqual(resp.status_code, 400)
+        resp = self.client.get(flask.url_for("turn", gameid="1", player=200))
+        self.assertEqual(resp.status_code, 404)
+        resp = self.client.get(flask.url_for("turn", gameid="200", player=0))
+        self.assertEqual(resp.status_code, 404)
+
+
+if __name__ == "__main__":
+    print("Starting turn resource tests...")
+    unittest.main()